@@ -10,6 +10,14 @@ class Settings(BaseSettings):
     ENVIRONMENT: str = "development"
     PORT: int = 8001
     
+    # Server Settings (production entry point, see gunicorn.conf.py)
+    # 0 starts one worker per CPU
+    SERVER_WORKERS: int = 0
+    SERVER_PRELOAD_MODELS: bool = True
+    SERVER_WORKER_TIMEOUT: int = 120
+    # Where workers' metric files are merged for scrapes; cleared on server start
+    PROMETHEUS_MULTIPROC_DIR: str = "data/prometheus"
+    
     # API Keys
     OPENAI_API_KEY: Optional[str] = None
     ANTHROPIC_API_KEY: Optional[str] = None
@@ -25,12 +33,140 @@ class Settings(BaseSettings):
     
     # LLM Settings
     DEFAULT_MODEL: str = "gpt-4"
+    ANTHROPIC_MODEL: str = "claude-3-sonnet-20240229"
+    # Override provider endpoints, e.g. to point at the benchmark fake provider
+    OPENAI_BASE_URL: Optional[str] = None
+    ANTHROPIC_BASE_URL: Optional[str] = None
     MAX_TOKENS: int = 2000
     TEMPERATURE: float = 0.7
     
+    # Input token budget per prompt before context is compressed
+    PROMPT_TOKEN_BUDGET: int = 3000
+    
+    # LLM Connection Settings
+    LLM_MAX_CONNECTIONS: int = 100
+    LLM_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    LLM_KEEPALIVE_EXPIRY: float = 30.0
+    LLM_CONNECT_TIMEOUT: float = 5.0
+    LLM_REQUEST_TIMEOUT: float = 60.0
+    LLM_MAX_RETRIES: int = 2
+    SHUTDOWN_DRAIN_TIMEOUT: float = 30.0
+    
+    # LLM Routing Settings
+    LLM_PROVIDER_ORDER: str = "openai,anthropic"
+    LLM_CALL_DEADLINE: float = 30.0
+    LLM_HEDGING_ENABLED: bool = False
+    LLM_HEDGE_MIN_DELAY: float = 2.0
+    LLM_BREAKER_WINDOW_SIZE: int = 50
+    LLM_BREAKER_MIN_CALLS: int = 10
+    LLM_BREAKER_ERROR_RATE: float = 0.5
+    LLM_BREAKER_P95_LATENCY: float = 20.0
+    LLM_BREAKER_COOLDOWN: float = 30.0
+    
+    # Rate Limiting Settings
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_USER_PER_MINUTE: float = 60.0
+    RATE_LIMIT_USER_BURST: float = 20.0
+    RATE_LIMIT_QUEUE_TIMEOUT: float = 10.0
+    RATE_LIMIT_SLOT_LEASE: float = 120.0
+    # Required with more than one server worker, or each would grant the full limit
+    RATE_LIMIT_REDIS_ENABLED: bool = True
+    LLM_CONCURRENCY_INITIAL: int = 16
+    LLM_CONCURRENCY_MIN: int = 1
+    LLM_CONCURRENCY_MAX: int = 64
+    LLM_CONCURRENCY_DECREASE_COOLDOWN: float = 5.0
+    
+    # LLM Cache Settings
+    LLM_CACHE_ENABLED: bool = True
+    LLM_CACHE_MAX_ENTRIES: int = 10000
+    LLM_CACHE_TTL_SECONDS: int = 86400
+    LLM_CACHE_REDIS_ENABLED: bool = False
+    
+    # Conversation Memory Settings
+    CONVERSATION_MEMORY_ENABLED: bool = True
+    CONVERSATION_TOKEN_BUDGET: int = 1000
+    CONVERSATION_SUMMARY_MAX_TOKENS: int = 200
+    CONVERSATION_MAX_SESSIONS: int = 10000
+    CONVERSATION_MAX_TOTAL_TOKENS: int = 5000000
+    CONVERSATION_TTL_SECONDS: int = 86400
+    CONVERSATION_REDIS_ENABLED: bool = False
+    
+    # Chat Router Settings
+    CHAT_ROUTER_ENABLED: bool = True
+    
+    # Semantic Cache Settings
+    SEMANTIC_CACHE_ENABLED: bool = True
+    SEMANTIC_CACHE_THRESHOLD: float = 0.9
+    SEMANTIC_CACHE_MAX_ENTRIES_PER_USER: int = 50
+    SEMANTIC_CACHE_MAX_USERS: int = 10000
+    SEMANTIC_CACHE_TTL_SECONDS: int = 3600
+    
+    # Single-Flight Settings
+    SINGLE_FLIGHT_ENABLED: bool = True
+    SINGLE_FLIGHT_REDIS_ENABLED: bool = False
+    SINGLE_FLIGHT_LEASE_SECONDS: float = 60.0
+    SINGLE_FLIGHT_WAIT_TIMEOUT: float = 60.0
+    SINGLE_FLIGHT_RESULT_TTL: float = 2.0
+    
+    # Categorization Settings
+    CATEGORIZATION_BATCH_SIZE: int = 25
+    CATEGORIZATION_MAX_CONCURRENCY: int = 8
+    CATEGORIZATION_CONFIDENCE_THRESHOLD: float = 0.8
+    CATEGORIZATION_MAX_RETRIES: int = 1
+    CATEGORIZATION_LOCAL_MODEL: Optional[str] = None
+    
+    # Transaction Index Settings
+    DEDUP_DATE_WINDOW_DAYS: int = 3
+    DEDUP_MAX_USERS: int = 10000
+    
+    # Statement Import Settings
+    IMPORT_CHUNK_ROWS: int = 200
+    IMPORT_MAX_PENDING_CHUNKS: int = 2
+    IMPORT_MAX_RECORD_BYTES: int = 65536
+    
+    # Budget Optimizer Settings
+    BUDGET_TARGET_SAVINGS_RATE: float = 0.2
+    BUDGET_EMERGENCY_FUND_MONTHS: float = 6.0
+    BUDGET_EMERGENCY_FUND_HORIZON_MONTHS: float = 12.0
+    BUDGET_EXPLANATION_MAX_TOKENS: int = 400
+    
+    # Goal Projection Settings
+    GOAL_PROJECTION_SIMULATIONS: int = 2000
+    GOAL_PROJECTION_HORIZON_MONTHS: int = 120
+    GOAL_PROJECTION_SEED: int = 0
+    GOAL_PROJECTION_CACHE_SIZE: int = 10000
+    
+    # Transaction Store Settings
+    TRANSACTION_STORE_PATH: str = "data/transactions"
+    TRANSACTION_STORE_MAX_SEGMENTS: int = 16
+    
+    # Insights Store Settings
+    INSIGHTS_DB_PATH: str = "data/insights.db"
+    INSIGHTS_NARRATIVE_THRESHOLD: float = 0.15
+    
+    # Observability Settings
+    TRACING_ENABLED: bool = False
+    READINESS_PROBE_TIMEOUT: float = 2.0
+    READINESS_CACHE_SECONDS: float = 10.0
+    
+    # Job Queue Settings
+    JOB_DB_PATH: str = "data/jobs.db"
+    JOB_WORKERS: int = 4
+    JOB_RESULT_TTL_SECONDS: int = 3600
+    JOB_LEASE_SECONDS: int = 600
+    
     # Embedding Settings
-    EMBEDDING_MODEL: str = "text-embedding-ada-002"
-    EMBEDDING_DIMENSION: int = 1536
+    EMBEDDING_MODEL: str = "all-MiniLM-L6-v2"
+    EMBEDDING_DIMENSION: int = 384
+    EMBEDDING_BATCH_SIZE: int = 64
+    EMBEDDING_MAX_WAIT_MS: float = 5.0
+    EMBEDDING_WORKERS: int = 2
+    
+    # Vector Index Settings
+    VECTOR_INDEX_PATH: str = "data/vector_index"
+    VECTOR_INDEX_NLIST: int = 256
+    VECTOR_INDEX_NPROBE: int = 8
+    VECTOR_INDEX_TRAIN_THRESHOLD: int = 4096
     
     class Config:
         env_file = ".env"
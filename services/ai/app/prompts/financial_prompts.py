@@ -1,55 +1,51 @@
 """Structured prompts for financial AI interactions"""
 
-from typing import Dict, Any, List
+from collections import defaultdict
+from typing import Dict, Any, List, Optional, Tuple, TYPE_CHECKING
 
+from .prompt_compiler import CompiledPrompt, prompt_compiler
+
+if TYPE_CHECKING:
+    from ..services.conversation_memory import Conversation
+    from ..services.spending_analytics import SpendingAnalytics
 
-class FinancialPrompts:
-    """Collection of structured prompts for financial analysis and insights"""
 
-    def get_categorization_prompt(self, description: str, amount: float) -> str:
-        """Generate prompt for transaction categorization"""
-        return f"""
-Analyze this financial transaction and categorize it appropriately.
+INCOME_CATEGORIES = ["salary", "freelance", "investment", "business", "other_income"]
+EXPENSE_CATEGORIES = [
+    "food", "transport", "housing", "utilities", "healthcare",
+    "entertainment", "shopping", "education", "savings", "other_expense"
+]
 
-Transaction Details:
-- Description: {description}
-- Amount: ${amount:.2f}
+SYSTEM_PREAMBLE = "You are a helpful financial advisor AI."
+
+# Items kept verbatim before a prompt falls back to bucketed context
+COMPACT_TOP_K = 3
+# Description length kept per transaction in compressed categorization prompts
+COMPACT_DESCRIPTION_CHARS = 40
+
+# Static prefixes are identical on every call, so they are compiled once here
+# and sent ahead of the per-call content where provider prompt caching can reuse them
+BATCH_CATEGORIZATION_PREFIX = prompt_compiler.register("batch_categorization", f"""
+{SYSTEM_PREAMBLE}
+Analyze each of the financial transactions and categorize them appropriately.
 
 Available Categories:
-Income: salary, freelance, investment, business, other_income
-Expenses: food, transport, housing, utilities, healthcare, entertainment, shopping, education, savings, other_expense
+Income: {', '.join(INCOME_CATEGORIES)}
+Expenses: {', '.join(EXPENSE_CATEGORIES)}
 
 Instructions:
-1. Analyze the transaction description and amount
-2. Choose the most appropriate category
+1. Analyze each transaction description and amount independently
+2. Choose the most appropriate category for each one
 3. Provide a confidence score (0.0 to 1.0)
 4. Give a brief reasoning
 
-Response Format:
-Category: [category_name]
-Confidence: [0.0-1.0]
-Reasoning: [brief explanation]
-
-Example:
-Category: food
-Confidence: 0.95
-Reasoning: "McDonald's" clearly indicates a food purchase at a restaurant.
-"""
+Respond with JSON only, one result per transaction using its [number] as the index:
+{{"results": [{{"index": 1, "category": "food", "confidence": 0.95, "reasoning": "McDonald's clearly indicates a food purchase at a restaurant."}}]}}
+""")
 
-    def get_analysis_prompt(self, transactions: List[Dict], user_profile: Dict) -> str:
-        """Generate prompt for spending analysis"""
-        transaction_summary = self._summarize_transactions(transactions)
-        
-        return f"""
-Analyze the following spending patterns and provide financial insights.
-
-User Profile:
-- Monthly Income: ${user_profile.get('monthly_income', 0):.2f}
-- Financial Goals: {user_profile.get('goals', 'Not specified')}
-- Risk Tolerance: {user_profile.get('risk_tolerance', 'Medium')}
-
-Recent Transactions Summary:
-{transaction_summary}
+ANALYSIS_PREFIX = prompt_compiler.register("analysis", f"""
+{SYSTEM_PREAMBLE}
+Analyze the user's spending patterns and provide financial insights.
 
 Provide insights on:
 1. Spending patterns and trends
@@ -59,19 +55,14 @@ Provide insights on:
 5. Financial health assessment
 
 Keep responses practical and actionable. Focus on specific, measurable advice.
-"""
 
-    def get_chat_prompt(self, user_message: str, context: Dict[str, Any]) -> str:
-        """Generate prompt for chat interactions"""
-        context_str = self._format_context(context)
-        
-        return f"""
-You are a helpful financial advisor AI. Answer the user's question using their financial data context.
+Respond with JSON only, one entry per insight:
+{{"insights": [{{"type": "spending_pattern", "title": "Brief title", "description": "Specific, actionable detail", "confidence": 0.8}}]}}
+""")
 
-User Question: {user_message}
-
-Available Context:
-{context_str}
+CHAT_PREFIX = prompt_compiler.register("chat", f"""
+{SYSTEM_PREAMBLE}
+Answer the user's question using their financial data context.
 
 Guidelines:
 - Provide specific, actionable advice
@@ -81,22 +72,21 @@ Guidelines:
 - If you don't have enough context, ask clarifying questions
 
 Keep your response concise but helpful.
-"""
+""")
 
-    def get_recommendation_prompt(self, user_data: Dict[str, Any]) -> str:
-        """Generate prompt for financial recommendations"""
-        return f"""
-Based on the user's financial data, generate 3-5 personalized recommendations.
+CONVERSATION_SUMMARY_PREFIX = prompt_compiler.register("conversation_summary", f"""
+{SYSTEM_PREAMBLE}
+Condense the earlier part of a conversation with a user into a short summary
+that lets you continue the conversation without the full transcript.
 
-Financial Summary:
-- Total Balance: ${user_data.get('total_balance', 0):.2f}
-- Monthly Income: ${user_data.get('monthly_income', 0):.2f}
-- Monthly Expenses: ${user_data.get('monthly_expenses', 0):.2f}
-- Savings Rate: {user_data.get('savings_rate', 0):.1%}
-- Top Spending Categories: {', '.join(user_data.get('top_categories', []))}
+Keep figures, goals, decisions and questions still open; drop greetings and
+repetition. Fold the previous summary, if any, into the new one. Write plain
+prose in the third person, a few sentences at most.
+""")
 
-Current Goals:
-{self._format_goals(user_data.get('goals', []))}
+RECOMMENDATION_PREFIX = prompt_compiler.register("recommendation", f"""
+{SYSTEM_PREAMBLE}
+Based on the user's financial data, generate 3-5 personalized recommendations.
 
 Generate recommendations that are:
 1. Specific and actionable
@@ -109,107 +99,304 @@ Format each recommendation with:
 - Description: Detailed explanation
 - Impact: Expected benefit
 - Timeline: When to implement
+""")
+
+BUDGET_OPTIMIZATION_PREFIX = prompt_compiler.register("budget_optimization", f"""
+{SYSTEM_PREAMBLE}
+Explain the recommended budget reallocation to the user.
+
+The recommended amounts have already been computed to meet the savings target
+and build the emergency fund while cutting as little as possible. Use those
+figures as given; do not recalculate or change them.
+
+Cover briefly:
+1. Which categories change and by how much
+2. Why those categories were chosen
+3. How the plan reaches the savings and emergency fund targets
+4. One or two practical ways to stick to the new amounts
+""")
+
+
+class FinancialPrompts:
+    """Collection of structured prompts for financial analysis and insights"""
+
+    def get_batch_categorization_prompt(self, transactions: List[Dict[str, Any]]) -> CompiledPrompt:
+        """Generate prompt for categorizing several transactions in one call"""
+        def rows(limit: Optional[int] = None) -> str:
+            return '\n'.join(
+                f"[{i}] Description: {t['description'][:limit]} | Amount: ${t['amount']:.2f}"
+                for i, t in enumerate(transactions, start=1)
+            )
+
+        return prompt_compiler.compile("batch_categorization", [
+            lambda: f"\nTransactions:\n{rows()}\n",
+            lambda: f"\nTransactions:\n{rows(COMPACT_DESCRIPTION_CHARS)}\n"
+        ])
+
+    def get_analysis_prompt(
+        self,
+        transactions: List[Dict],
+        user_profile: Dict,
+        analytics: Optional["SpendingAnalytics"] = None,
+        transaction_summary: Optional[str] = None
+    ) -> CompiledPrompt:
+        """Generate prompt for spending analysis"""
+        def body(summary: str) -> str:
+            return f"""
+User Profile:
+- Monthly Income: ${user_profile.get('monthly_income', 0):.2f}
+- Financial Goals: {user_profile.get('goals', 'Not specified')}
+- Risk Tolerance: {user_profile.get('risk_tolerance', 'Medium')}
+
+Recent Transactions Summary:
+{summary}
 """
 
-    def get_budget_optimization_prompt(self, budget_data: Dict[str, Any]) -> str:
-        """Generate prompt for budget optimization suggestions"""
-        return f"""
-Analyze the current budget allocation and suggest optimizations.
+        if transaction_summary is not None:
+            return prompt_compiler.compile("analysis", [lambda: body(transaction_summary)])
+
+        analytics = self._analytics(transactions, analytics)
+        return prompt_compiler.compile("analysis", [
+            lambda: body(analytics.summary()),
+            lambda: body(analytics.summary(compact=True))
+        ])
+
+    def get_chat_prompt(
+        self,
+        user_message: str,
+        context: Dict[str, Any],
+        conversation: Optional["Conversation"] = None
+    ) -> CompiledPrompt:
+        """Generate prompt for chat interactions"""
+        def body(context_str: str, history: str) -> str:
+            return f"""{history}
+User Question: {user_message}
 
-Current Budget:
-{self._format_budget_data(budget_data)}
+Available Context:
+{context_str}
+"""
 
-Spending vs Budget:
-{self._format_spending_comparison(budget_data)}
+        def history(compact: bool = False) -> str:
+            if conversation is None or not (conversation.summary or conversation.turns):
+                return ""
+            return f"\nConversation So Far:\n{self._format_conversation(conversation, compact)}\n"
+
+        return prompt_compiler.compile("chat", [
+            lambda: body(self._format_context(context), history()),
+            lambda: body(self._format_context(context, compact=True), history(compact=True))
+        ])
+
+    def get_conversation_summary_prompt(self, summary: str, turns: List[Tuple[str, str]]) -> CompiledPrompt:
+        """Generate prompt folding older chat turns into the running summary"""
+        transcript = '\n'.join(f"{role.capitalize()}: {text}" for role, text in turns)
+        return prompt_compiler.compile("conversation_summary", [
+            lambda: f"""
+Previous Summary:
+{summary or 'None'}
+
+Conversation:
+{transcript}
+"""
+        ])
 
-Provide optimization suggestions for:
-1. Categories that are over-budget
-2. Categories with room for improvement
-3. Better allocation of funds
-4. Emergency fund recommendations
-5. Savings opportunities
+    def get_recommendation_prompt(self, user_data: Dict[str, Any]) -> CompiledPrompt:
+        """Generate prompt for financial recommendations"""
+        def body(goals: str) -> str:
+            return f"""
+Financial Summary:
+- Total Balance: ${user_data.get('total_balance', 0):.2f}
+- Monthly Income: ${user_data.get('monthly_income', 0):.2f}
+- Monthly Expenses: ${user_data.get('monthly_expenses', 0):.2f}
+- Savings Rate: {user_data.get('savings_rate', 0):.1%}
+- Top Spending Categories: {', '.join(user_data.get('top_categories', []))}
 
-Focus on practical, implementable changes that align with financial best practices.
+Current Goals:
+{goals}
 """
 
-    def _summarize_transactions(self, transactions: List[Dict]) -> str:
-        """Create a summary of transactions for prompt context"""
-        if not transactions:
-            return "No recent transactions available."
-        
-        total_spent = sum(t.get('amount', 0) for t in transactions if t.get('type') == 'expense')
-        total_income = sum(t.get('amount', 0) for t in transactions if t.get('type') == 'income')
-        
-        categories = {}
-        for t in transactions:
-            if t.get('type') == 'expense':
-                category = t.get('category', 'unknown')
-                categories[category] = categories.get(category, 0) + t.get('amount', 0)
-        
-        top_categories = sorted(categories.items(), key=lambda x: x[1], reverse=True)[:3]
-        
-        return f"""
-- Total Income: ${total_income:.2f}
-- Total Expenses: ${total_spent:.2f}
-- Number of Transactions: {len(transactions)}
-- Top Spending Categories: {', '.join([f"{cat}: ${amt:.2f}" for cat, amt in top_categories])}
+        goals = user_data.get('goals', [])
+        return prompt_compiler.compile("recommendation", [
+            lambda: body(self._format_goals(goals)),
+            lambda: body(self._format_goals(goals, limit=COMPACT_TOP_K))
+        ])
+
+    def get_budget_optimization_prompt(self, plan: Dict[str, Any]) -> CompiledPrompt:
+        """Generate prompt explaining a plan from the budget optimizer"""
+        def body(data: Dict[str, Any]) -> str:
+            return f"""
+Current Budget:
+{self._format_budget_data(data)}
+
+Spending vs Budget:
+{self._format_spending_comparison(data)}
+
+Recommended Budget:
+{self._format_budget_plan(data)}
 """
 
-    def _format_context(self, context: Dict[str, Any]) -> str:
-        """Format context data for prompts"""
+        return prompt_compiler.compile("budget_optimization", [
+            lambda: body(plan),
+            lambda: body(self._bucket_budget_categories(plan, COMPACT_TOP_K))
+        ])
+
+    def _analytics(
+        self,
+        transactions: List[Dict],
+        analytics: Optional["SpendingAnalytics"] = None
+    ) -> "SpendingAnalytics":
+        """Analytics over the given transactions, built only if the caller has none"""
+        # Imported here because the analytics engine reads this module's categories
+        from ..services.spending_analytics import SpendingAnalytics
+
+        if analytics is None:
+            analytics = SpendingAnalytics(transactions)
+        return analytics
+
+    def _format_conversation(self, conversation: "Conversation", compact: bool = False) -> str:
+        """Summary of older turns followed by the recent ones, only the last exchange when compact"""
+        formatted = []
+        if conversation.summary:
+            formatted.append(f"Summary: {conversation.summary}")
+        for role, text in conversation.turns[-2:] if compact else conversation.turns:
+            formatted.append(f"{role.capitalize()}: {text}")
+        return '\n'.join(formatted)
+
+    def _format_context(self, context: Dict[str, Any], compact: bool = False) -> str:
+        """Format context data for prompts
+
+        ``compact`` buckets relevant transactions by category instead of listing them.
+        """
         formatted = []
-        
+
         if 'recent_transactions' in context:
             formatted.append(f"Recent Transactions: {len(context['recent_transactions'])} transactions")
-        
+
         if 'current_balance' in context:
             formatted.append(f"Current Balance: ${context['current_balance']:.2f}")
-        
+
         if 'monthly_budget' in context:
             formatted.append(f"Monthly Budget: ${context['monthly_budget']:.2f}")
-        
+
         if 'financial_goals' in context:
-            formatted.append(f"Active Goals: {len(context['financial_goals'])} goals")
-        
+            goals = context['financial_goals']
+            formatted.append(f"Active Goals: {len(goals)} goals")
+            if any(isinstance(goal, dict) and goal.get('projection') for goal in goals):
+                formatted.append(self._format_goals(goals, limit=COMPACT_TOP_K if compact else None))
+
+        if 'relevant_transactions' in context and compact:
+            buckets = defaultdict(lambda: [0, 0.0])
+            for t in context['relevant_transactions']:
+                bucket = buckets[t.get('category') or 'uncategorized']
+                bucket[0] += 1
+                bucket[1] += float(t.get('amount') or 0)
+            ranked = sorted(buckets.items(), key=lambda item: abs(item[1][1]), reverse=True)
+            formatted.append("Relevant Transactions by Category:")
+            for category, (count, total) in ranked[:COMPACT_TOP_K]:
+                formatted.append(f"- {category}: {count} transactions, ${total:.2f}")
+        elif 'relevant_transactions' in context:
+            formatted.append("Relevant Transactions:")
+            for t in context['relevant_transactions']:
+                formatted.append(
+                    f"- {t.get('date') or 'unknown date'}: {t.get('description')} "
+                    f"${float(t.get('amount') or 0):.2f} ({t.get('category') or 'uncategorized'})"
+                )
+
         return '\n'.join(formatted) if formatted else "No specific context available."
 
-    def _format_goals(self, goals: List[Dict]) -> str:
-        """Format financial goals for prompts"""
+    def _format_goals(self, goals: List[Dict], limit: Optional[int] = None) -> str:
+        """Format financial goals for prompts, keeping the furthest-from-target ones when limited"""
         if not goals:
             return "No specific financial goals set."
-        
+
+        if limit is not None and len(goals) > limit:
+            ranked = sorted(
+                goals,
+                key=lambda g: g.get('target_amount', 0) - g.get('current_amount', 0),
+                reverse=True
+            )
+            return self._format_goals(ranked[:limit]) + f"\n- ...and {len(goals) - limit} more goals"
+
         formatted_goals = []
         for goal in goals:
-            formatted_goals.append(
+            line = (
                 f"- {goal.get('title', 'Untitled')}: "
                 f"${goal.get('current_amount', 0):.2f} / ${goal.get('target_amount', 0):.2f}"
             )
-        
+            if goal.get('projection'):
+                line += f" ({self._format_projection(goal['projection'])})"
+            formatted_goals.append(line)
+
         return '\n'.join(formatted_goals)
 
+    def _format_projection(self, projection: Dict[str, Any]) -> str:
+        """Simulated completion dates, so the model quotes them rather than estimating"""
+        years = projection['horizon_months'] / 12
+        median, early, late = projection.get('p50'), projection.get('p10'), projection.get('p90')
+        if median is None:
+            return f"projected: {projection['probability']:.0%} chance of reaching it within {years:g} years"
+        text = f"projected: likely by {median['date'][:7]}"
+        if early and late:
+            text += f", 80% range {early['date'][:7]} to {late['date'][:7]}"
+        elif early:
+            text += f", 10% chance by {early['date'][:7]}"
+        return text + f", {projection['probability']:.0%} chance within {years:g} years"
+
+    def _bucket_budget_categories(self, budget_data: Dict[str, Any], limit: int) -> Dict[str, Any]:
+        """Keep the top categories by spending and fold the rest into one 'other' bucket"""
+        categories = budget_data.get('categories', {})
+        if len(categories) <= limit:
+            return budget_data
+
+        ranked = sorted(categories.items(), key=lambda item: item[1].get('spent', 0), reverse=True)
+        bucketed = dict(ranked[:limit])
+        bucketed['other'] = {
+            key: sum(data.get(key, 0) for _, data in ranked[limit:])
+            for key in ('allocated', 'spent', 'recommended', 'change')
+        }
+        return {**budget_data, 'categories': bucketed}
+
     def _format_budget_data(self, budget_data: Dict[str, Any]) -> str:
         """Format budget data for prompts"""
         formatted = []
-        
+
         for category, data in budget_data.get('categories', {}).items():
             formatted.append(
                 f"- {category.title()}: ${data.get('allocated', 0):.2f} allocated, "
                 f"${data.get('spent', 0):.2f} spent"
             )
-        
+
         return '\n'.join(formatted) if formatted else "No budget data available."
 
+    def _format_budget_plan(self, plan: Dict[str, Any]) -> str:
+        """Format the optimizer's recommended amounts and savings outcome"""
+        formatted = [
+            f"- {category.title()}: ${data.get('recommended', 0):.2f} ({data.get('change', 0):+.2f})"
+            for category, data in plan.get('categories', {}).items()
+        ]
+        fund = plan.get('emergency_fund', {})
+        formatted.append(
+            f"- Savings: ${plan.get('savings', 0):.2f}/month ({plan.get('savings_rate', 0):.1%}, "
+            f"target {plan.get('target_savings_rate', 0):.1%})"
+        )
+        formatted.append(
+            f"- Emergency Fund: ${fund.get('current', 0):.2f} of ${fund.get('target', 0):.2f}, "
+            f"${fund.get('monthly_contribution', 0):.2f}/month to close the gap"
+        )
+        if not plan.get('feasible', True):
+            formatted.append("- Essential spending alone exceeds the limit; the target cannot be met yet")
+        return '\n'.join(formatted)
+
     def _format_spending_comparison(self, budget_data: Dict[str, Any]) -> str:
         """Format spending vs budget comparison"""
         comparisons = []
-        
+
         for category, data in budget_data.get('categories', {}).items():
             allocated = data.get('allocated', 0)
             spent = data.get('spent', 0)
-            
+
             if allocated > 0:
                 percentage = (spent / allocated) * 100
                 status = "Over" if percentage > 100 else "Under" if percentage < 80 else "On Track"
                 comparisons.append(f"- {category.title()}: {percentage:.1f}% ({status})")
-        
-        return '\n'.join(comparisons) if comparisons else "No comparison data available."
\ No newline at end of file
+
+        return '\n'.join(comparisons) if comparisons else "No comparison data available."
@@ -0,0 +1,134 @@
+"""Token accounting and budget-aware assembly of prompts"""
+
+import logging
+import math
+import threading
+from collections import defaultdict
+from functools import lru_cache
+from typing import Callable, Dict, Any, List, NamedTuple, Optional
+
+from ..config import settings
+from ..services.metrics import span
+
+
+logger = logging.getLogger("uvicorn.error")
+
+class CompiledPrompt(NamedTuple):
+    """A prompt split into a static system prefix and the per-call content"""
+    kind: str
+    system: str
+    user: str
+    input_tokens: int
+    compressed: bool = False
+
+    @property
+    def text(self) -> str:
+        return f"{self.system}\n\n{self.user}"
+
+
+# Share of the budget filled when tokens are only estimated; the estimate runs
+# low on number-heavy and non-English text
+HEURISTIC_BUDGET_SHARE = 0.8
+
+
+@lru_cache(maxsize=1)
+def _get_encoding():
+    """tiktoken encoding when installed and loadable, otherwise None"""
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(settings.DEFAULT_MODEL)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        # The first load downloads the BPE file, which fails without network access
+        logger.warning("tiktoken encoding unavailable, estimating tokens instead: %s", e)
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Token count from the local tokenizer, or about four characters per token without one"""
+    encoding = _get_encoding()
+    if encoding is None:
+        return math.ceil(len(text) / 4)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+class PromptCompiler:
+    """Holds precompiled static prefixes and fits per-call content into the token budget"""
+
+    def __init__(self, budget: Optional[int] = None):
+        self.budget = budget or settings.PROMPT_TOKEN_BUDGET
+        self._prefixes: Dict[str, str] = {}
+        self._prefix_tokens: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = defaultdict(
+            lambda: {"calls": 0, "input_tokens": 0, "max_input_tokens": 0, "compressed": 0, "over_budget": 0}
+        )
+
+    def register(self, kind: str, prefix: str) -> str:
+        """Store a prompt type's static prefix; its tokens are counted on first compile"""
+        prefix = prefix.strip()
+        self._prefixes[kind] = prefix
+        self._prefix_tokens.pop(kind, None)
+        return prefix
+
+    def compile(self, kind: str, bodies: List[Callable[[], str]]) -> CompiledPrompt:
+        """Use the most detailed body that fits the budget, falling back to the most compact one
+
+        ``bodies`` are ordered from full detail to most compressed and are only
+        rendered until one fits.
+        """
+        budget = self.budget if _get_encoding() is not None else int(self.budget * HEURISTIC_BUDGET_SHARE)
+        prefix_tokens = self._prefix_tokens.get(kind)
+        if prefix_tokens is None:
+            # Counted here rather than at import, so importing never loads the tokenizer
+            prefix_tokens = self._prefix_tokens[kind] = count_tokens(self._prefixes[kind])
+        available = budget - prefix_tokens
+        with span("prompt_build", kind=kind):
+            for attempt, render in enumerate(bodies):
+                body = render().strip()
+                body_tokens = count_tokens(body)
+                if body_tokens <= available:
+                    break
+
+        prompt = CompiledPrompt(
+            kind=kind,
+            system=self._prefixes[kind],
+            user=body,
+            input_tokens=prefix_tokens + body_tokens,
+            compressed=attempt > 0
+        )
+        self._record(prompt, over_budget=body_tokens > available)
+        return prompt
+
+    def stats(self) -> Dict[str, Any]:
+        """Input token usage per prompt type since startup"""
+        with self._lock:
+            return {
+                "budget": self.budget,
+                "tokenizer": "tiktoken" if _get_encoding() is not None else "heuristic",
+                "prompts": {
+                    kind: {
+                        **values,
+                        "prefix_tokens": self._prefix_tokens.get(kind, 0),
+                        "avg_input_tokens": round(values["input_tokens"] / values["calls"], 1)
+                    }
+                    for kind, values in self._stats.items()
+                }
+            }
+
+    def _record(self, prompt: CompiledPrompt, over_budget: bool):
+        with self._lock:
+            values = self._stats[prompt.kind]
+            values["calls"] += 1
+            values["input_tokens"] += prompt.input_tokens
+            values["max_input_tokens"] = max(values["max_input_tokens"], prompt.input_tokens)
+            values["compressed"] += int(prompt.compressed)
+            values["over_budget"] += int(over_budget)
+
+
+prompt_compiler = PromptCompiler()
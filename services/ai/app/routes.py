@@ -1,51 +1,238 @@
 """API routes for AI service"""
 
-from fastapi import APIRouter, HTTPException, Depends
+import asyncio
+import json
+import math
+
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
+from starlette.requests import ClientDisconnect
 from typing import List, Optional, Dict, Any
 
+from .config import settings
 from .services.llm_service import LLMService
+from .services.transaction_categorizer import TransactionCategorizer
+from .services import structured_output
+from .services.llm_cache import llm_cache
+from .prompts.prompt_compiler import prompt_compiler
+from .services.chat_router import chat_router
+from .services.conversation_memory import Conversation, conversation_memory
 from .services.embedding_service import EmbeddingService
 from .services.financial_analyzer import FinancialAnalyzer
+from .services.goal_projection import goal_projector
+from .services.job_queue import JobQueue
+from .services.readiness import check_readiness
+from .services.rate_limiter import RateLimitExceeded, user_limiter
+from .services.semantic_cache import semantic_cache
+from .services.single_flight import single_flight
+from .services.statement_import import StatementParseError, categorize_statement, create_parser
+from .services.transaction_index import transaction_indexes
+from .services.transaction_store import WatermarkConflict, get_transaction_store
+from .services.warmup import startup
 
 # Routers
 health_router = APIRouter()
 ai_router = APIRouter()
 
+# Dependencies
+async def get_llm_service(request: Request) -> LLMService:
+    """LLMService bound to the client pool created at startup, once the caller is admitted"""
+    if request.method == "POST" and settings.RATE_LIMIT_ENABLED:
+        await admit_user(request)
+    return LLMService(clients=request.app.state.llm_clients)
+
+async def admit_user(request: Request):
+    """Charge the caller's token bucket, queueing up to the deadline before answering 429"""
+    body: Any = {}
+    if request.headers.get("content-type", "").startswith("application/json"):
+        try:
+            body = await request.json()
+        except ValueError:
+            body = {}
+    if not isinstance(body, dict):
+        body = {}
+
+    key = rate_limit_key(request, body)
+    cost = 1
+    if request.url.path.rstrip("/").endswith(("/categorize", "/categorize/stream")):
+        # Upper bound on LLM batches; rows answered by the local tiers are not refunded
+        cost = max(1, math.ceil(len(body.get("transactions") or []) / settings.CATEGORIZATION_BATCH_SIZE))
+
+    try:
+        await user_limiter.acquire(key, cost, max_wait=settings.RATE_LIMIT_QUEUE_TIMEOUT)
+    except RateLimitExceeded as e:
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": str(math.ceil(e.retry_after))}
+        )
+
+def rate_limit_key(request: Request, body: Optional[Dict[str, Any]] = None) -> str:
+    """Bucket key for the caller: their user id when known, otherwise their address"""
+    body = body or {}
+    user_id = request.headers.get("x-user-id") or request.path_params.get("user_id") or body.get("user_id")
+    return str(user_id) if user_id else f"ip:{request.client.host if request.client else 'unknown'}"
+
+def get_embedding_service(request: Request) -> EmbeddingService:
+    """Process-wide EmbeddingService, so concurrent requests share batches"""
+    return request.app.state.embedding_service
+
+def get_job_queue(request: Request) -> JobQueue:
+    """Background job queue started with the app"""
+    return request.app.state.job_queue
+
+async def request_transactions(request: "CategorizationRequest") -> List[Dict[str, Any]]:
+    """Rows sent with a request, else the user's synced rows for its period"""
+    if request.transactions is not None:
+        return [transaction.dict() for transaction in request.transactions]
+    if not request.user_id:
+        raise HTTPException(status_code=400, detail="Send transactions or the user_id they were synced under")
+
+    from .services.spending_analytics import period_start
+
+    columns = await asyncio.to_thread(
+        get_transaction_store().read, request.user_id, period_start(request.time_period)
+    )
+    return columns.rows()
+
+async def load_conversation(request: "ChatRequest") -> Optional[Conversation]:
+    """Earlier turns of the request's chat session, when it names one"""
+    if not request.session_id or not settings.CONVERSATION_MEMORY_ENABLED:
+        return None
+    return await conversation_memory.load(request.user_id, request.session_id)
+
+async def with_relevant_transactions(
+    embedding_service: EmbeddingService,
+    user_id: str,
+    message: str,
+    context: Optional[Dict[str, Any]]
+) -> Dict[str, Any]:
+    """Add the user's most similar indexed transactions to the chat context"""
+    context = dict(context or {})
+    try:
+        matches = await embedding_service.search(user_id, message, k=5)
+    except Exception:
+        matches = []
+    if matches:
+        context["relevant_transactions"] = matches
+    return context
+
+class UploadStreamingResponse(StreamingResponse):
+    """Streaming response that leaves the request body to the handler until it is uploaded
+
+    StreamingResponse reads ``receive`` to notice disconnects, which would
+    swallow body chunks the handler is still streaming in.
+    """
+
+    def __init__(self, content: Any, uploaded: asyncio.Event, **kwargs: Any):
+        super().__init__(content, **kwargs)
+        self.uploaded = uploaded
+
+    async def listen_for_disconnect(self, receive):
+        await self.uploaded.wait()
+        await super().listen_for_disconnect(receive)
+
 # Pydantic models
 class TransactionData(BaseModel):
     description: str
     amount: float
     date: str
+    # The bank's own id; rows sharing one are the same transaction
+    id: Optional[str] = None
     account_id: Optional[str] = None
+    category: Optional[str] = None
+    type: Optional[str] = None
+    # Not yet posted; its posted copy arrives later with its own id
+    pending: Optional[bool] = None
 
 class CategorizationRequest(BaseModel):
-    transactions: List[TransactionData]
+    # Omitted to categorize the user's synced transactions for ``time_period``
+    transactions: Optional[List[TransactionData]] = None
+    user_id: Optional[str] = None
+    time_period: str = "last_30_days"
 
 class CategorizationResponse(BaseModel):
     transaction_id: str
     suggested_category: str
     confidence: float
     reasoning: str
+    tier: str = "llm"
+
+class GoalData(BaseModel):
+    title: str = "Untitled"
+    current_amount: float = 0.0
+    target_amount: float
 
 class AnalysisRequest(BaseModel):
     user_id: str
-    transactions: List[TransactionData]
+    # Omitted to analyze the user's synced transactions
+    transactions: Optional[List[TransactionData]] = None
     time_period: str = "last_30_days"
+    goals: Optional[List[GoalData]] = None
 
 class AnalysisResponse(BaseModel):
     insights: List[Dict[str, Any]]
     recommendations: List[str]
     financial_health_score: float
 
+class AnalysisJobRequest(AnalysisRequest):
+    lane: str = "interactive"
+
 class ChatRequest(BaseModel):
     user_id: str
     message: str
     context: Optional[Dict[str, Any]] = None
+    use_cache: bool = False
+    # Messages sharing a session_id see the earlier turns of that session
+    session_id: Optional[str] = None
+
+class SyncRequest(BaseModel):
+    since: Optional[str] = None
+    watermark: str
+    transactions: List[TransactionData]
+
+class EmbedBatchRequest(BaseModel):
+    texts: List[str]
+
+class IndexTransactionsRequest(BaseModel):
+    user_id: str
+    transactions: List[TransactionData]
+
+class SearchRequest(BaseModel):
+    user_id: str
+    query: str
+    k: int = 5
+
+class BudgetCategory(BaseModel):
+    allocated: float = 0.0
+    spent: float = 0.0
+
+class BudgetRequest(BaseModel):
+    user_id: Optional[str] = None
+    monthly_income: float
+    categories: Dict[str, BudgetCategory]
+    emergency_fund: float = 0.0
+    target_savings_rate: Optional[float] = None
+    explain: bool = False
+
+class BudgetBatchRequest(BaseModel):
+    budgets: List[BudgetRequest]
+
+class GoalProjectionRequest(BaseModel):
+    user_id: Optional[str] = None
+    transactions: List[TransactionData]
+    goals: List[GoalData]
+
+class GoalProjectionBatchRequest(BaseModel):
+    users: List[GoalProjectionRequest]
 
 class ChatResponse(BaseModel):
     response: str
     sources: List[str]
+    cached: bool = False
+    # "aggregate" when computed from the user's transactions, "llm" otherwise
+    answered_by: str = "llm"
 
 # Health check routes
 @health_router.get("/")
@@ -53,30 +240,151 @@ async def health_check():
     return {"status": "healthy", "service": "ai"}
 
 @health_router.get("/ready")
-async def readiness_check():
-    # Add checks for external dependencies
-    return {"status": "ready", "dependencies": {"llm": "connected", "vector_db": "connected"}}
+async def readiness_check(request: Request):
+    # Probes each provider over its pooled connection and pings Redis when enabled
+    if not startup:
+        return JSONResponse({"status": "warming_up"}, status_code=503)
+    result = {**await check_readiness(request.app.state.llm_clients), "startup": startup}
+    return JSONResponse(result, status_code=200 if result["status"] == "ready" else 503)
+
+@health_router.get("/providers")
+async def provider_status(request: Request):
+    # Routing decisions, breaker states, latency percentiles and the adaptive concurrency limit
+    clients = request.app.state.llm_clients
+    return {
+        **clients.router.stats(),
+        "concurrency": clients.concurrency.stats(),
+        "user_limits": dict(user_limiter.counters)
+    }
 
 # AI routes
 @ai_router.post("/categorize", response_model=List[CategorizationResponse])
-async def categorize_transactions(request: CategorizationRequest):
+async def categorize_transactions(
+    request: CategorizationRequest,
+    llm_service: LLMService = Depends(get_llm_service)
+):
     """
     Automatically categorize transactions using LLM
     """
+    transactions = await request_transactions(request)
     try:
-        llm_service = LLMService()
-        results = await llm_service.categorize_transactions(request.transactions)
+        results = await llm_service.categorize_transactions(transactions, user_id=request.user_id)
         return results
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Categorization failed: {str(e)}")
 
+@ai_router.post("/categorize/stream")
+async def stream_categorize_transactions(
+    request: CategorizationRequest,
+    llm_service: LLMService = Depends(get_llm_service)
+):
+    """
+    Categorize transactions, streaming each result as a JSON line once it is ready
+    """
+    transactions = await request_transactions(request)
+
+    async def result_stream():
+        results = llm_service.stream_categorizations(transactions, user_id=request.user_id)
+        try:
+            async for index, result in results:
+                yield json.dumps({"index": index, **result}) + "\n"
+        finally:
+            await results.aclose()
+
+    return StreamingResponse(result_stream(), media_type="application/x-ndjson")
+
+@ai_router.post("/categorize/import")
+async def import_statement(
+    request: Request,
+    statement_format: Optional[str] = Query(None, alias="format"),
+    llm_service: LLMService = Depends(get_llm_service)
+):
+    """
+    Categorize a CSV or OFX statement sent as the raw request body, streaming
+    each result as a JSON line while the rest of the file is still uploading
+    """
+    chunks = request.stream()
+    head = await anext(chunks, b"")
+    try:
+        parser = create_parser(statement_format, request.headers.get("content-type"), head)
+    except StatementParseError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    uploaded = asyncio.Event()
+    key = rate_limit_key(request)
+
+    async def body():
+        yield head
+        async for chunk in chunks:
+            yield chunk
+        uploaded.set()
+
+    async def admit(rows: int):
+        # Each chunk pays for its LLM batches, so a large file is not one request's worth
+        if settings.RATE_LIMIT_ENABLED:
+            await user_limiter.acquire(
+                key,
+                math.ceil(rows / settings.CATEGORIZATION_BATCH_SIZE),
+                max_wait=settings.RATE_LIMIT_QUEUE_TIMEOUT
+            )
+
+    async def result_stream():
+        results = categorize_statement(
+            body(), parser, llm_service, admit, user_id=request.headers.get("x-user-id")
+        )
+        try:
+            async for result in results:
+                yield json.dumps(result) + "\n"
+        except (StatementParseError, RateLimitExceeded) as e:
+            yield json.dumps({"error": str(e)}) + "\n"
+        except ClientDisconnect:
+            pass
+        finally:
+            await results.aclose()
+
+    return UploadStreamingResponse(result_stream(), uploaded, media_type="application/x-ndjson")
+
+@ai_router.get("/categorize/stats")
+async def get_categorization_stats():
+    """
+    Rows answered by each categorization tier since startup
+    """
+    return {
+        "tiers": dict(TransactionCategorizer.stats),
+        "structured_output": dict(structured_output.stats),
+        "series_index": transaction_indexes.stats()
+    }
+
+@ai_router.get("/cache/stats")
+async def get_cache_stats():
+    """
+    LLM response cache counters, plus calls shared by single-flight coalescing
+    and chat answers served by the semantic cache; goal projections are cached per input
+    """
+    return {
+        **llm_cache.stats(),
+        "single_flight": single_flight.stats(),
+        "semantic": semantic_cache.stats(),
+        "goal_projection": goal_projector.stats()
+    }
+
+@ai_router.get("/prompts/stats")
+async def get_prompt_stats():
+    """
+    Input token counts per prompt type
+    """
+    return prompt_compiler.stats()
+
 @ai_router.post("/analyze", response_model=AnalysisResponse)
-async def analyze_spending(request: AnalysisRequest):
+async def analyze_spending(
+    request: AnalysisRequest,
+    llm_service: LLMService = Depends(get_llm_service)
+):
     """
     Generate financial insights and analysis
     """
     try:
-        analyzer = FinancialAnalyzer()
+        analyzer = FinancialAnalyzer(llm_service)
         analysis = await analyzer.analyze_spending_patterns(
             request.user_id,
             request.transactions,
@@ -87,56 +395,397 @@ async def analyze_spending(request: AnalysisRequest):
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
 @ai_router.post("/recommendations")
-async def get_recommendations(request: AnalysisRequest):
+async def get_recommendations(
+    request: AnalysisRequest,
+    llm_service: LLMService = Depends(get_llm_service)
+):
     """
     Get personalized financial recommendations
     """
     try:
-        analyzer = FinancialAnalyzer()
+        analyzer = FinancialAnalyzer(llm_service)
         recommendations = await analyzer.generate_recommendations(
             request.user_id,
-            request.transactions
+            request.transactions,
+            [goal.dict() for goal in request.goals] if request.goals else None
         )
         return {"recommendations": recommendations}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Recommendation generation failed: {str(e)}")
 
+@ai_router.post("/budget/optimize")
+async def optimize_budget(
+    request: BudgetRequest,
+    llm_service: LLMService = Depends(get_llm_service)
+):
+    """
+    Reallocate category budgets to meet savings and emergency fund targets
+    """
+    try:
+        analyzer = FinancialAnalyzer(llm_service)
+        return await analyzer.optimize_budget(
+            request.dict(exclude={"user_id", "explain"}),
+            explain=request.explain
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Budget optimization failed: {str(e)}")
+
+@ai_router.post("/budget/optimize/batch")
+async def optimize_budgets(
+    request: BudgetBatchRequest,
+    llm_service: LLMService = Depends(get_llm_service)
+):
+    """
+    Reallocate many users' budgets in one pass; plans are returned in request order
+    """
+    try:
+        analyzer = FinancialAnalyzer(llm_service)
+        budgets = [budget.dict(exclude={"user_id", "explain"}) for budget in request.budgets]
+        plans = await asyncio.to_thread(analyzer.optimize_budgets, budgets)
+        return {
+            "plans": [
+                {"user_id": budget.user_id, **plan} for budget, plan in zip(request.budgets, plans)
+            ]
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Budget optimization failed: {str(e)}")
+
+@ai_router.post("/goals/project")
+async def project_goals(
+    request: GoalProjectionRequest,
+    llm_service: LLMService = Depends(get_llm_service)
+):
+    """
+    Simulated completion dates for savings goals from the user's monthly cash flow
+    """
+    try:
+        analyzer = FinancialAnalyzer(llm_service)
+        goals = await asyncio.to_thread(
+            analyzer.project_goals,
+            [transaction.dict() for transaction in request.transactions],
+            [goal.dict() for goal in request.goals]
+        )
+        return {"goals": goals}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Goal projection failed: {str(e)}")
+
+@ai_router.post("/goals/project/batch")
+async def project_goals_batch(
+    request: GoalProjectionBatchRequest,
+    llm_service: LLMService = Depends(get_llm_service)
+):
+    """
+    Goal projections for many users in one pass; results are returned in request order
+    """
+    try:
+        analyzer = FinancialAnalyzer(llm_service)
+        projections = await asyncio.to_thread(analyzer.project_goals_many, [
+            (
+                [transaction.dict() for transaction in user.transactions],
+                [goal.dict() for goal in user.goals]
+            )
+            for user in request.users
+        ])
+        return {
+            "users": [
+                {"user_id": user.user_id, "goals": goals} for user, goals in zip(request.users, projections)
+            ]
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Goal projection failed: {str(e)}")
+
+@ai_router.post("/jobs/analyze", status_code=202)
+async def submit_analysis_job(
+    request: AnalysisJobRequest,
+    job_queue: JobQueue = Depends(get_job_queue)
+):
+    """
+    Queue spending analysis and return a job id to poll
+    """
+    return await submit_job(job_queue, "analyze", request)
+
+@ai_router.post("/jobs/recommendations", status_code=202)
+async def submit_recommendations_job(
+    request: AnalysisJobRequest,
+    job_queue: JobQueue = Depends(get_job_queue)
+):
+    """
+    Queue recommendation generation and return a job id to poll
+    """
+    return await submit_job(job_queue, "recommendations", request)
+
+@ai_router.get("/jobs/{job_id}")
+async def get_job_status(
+    job_id: str,
+    job_queue: JobQueue = Depends(get_job_queue)
+):
+    """
+    Status of a background job
+    """
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    job.pop("result")
+    return job
+
+@ai_router.get("/jobs/{job_id}/result")
+async def get_job_result(
+    job_id: str,
+    job_queue: JobQueue = Depends(get_job_queue)
+):
+    """
+    Result of a finished background job
+    """
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["status"] == "failed":
+        raise HTTPException(status_code=500, detail=f"Job failed: {job['error']}")
+    if job["status"] != "succeeded":
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
+    return job["result"]
+
+async def submit_job(job_queue: JobQueue, kind: str, request: AnalysisJobRequest) -> Dict[str, Any]:
+    payload = request.dict(exclude={"lane"})
+    if request.transactions is None:
+        # Stored-data jobs are keyed on the store's state, so a sync starts a fresh one
+        state = await asyncio.to_thread(get_transaction_store().state, request.user_id)
+        payload["store"] = {"watermark": state["watermark"], "rows": state["rows"]}
+    try:
+        job = await job_queue.submit(kind, request.user_id, payload, lane=request.lane)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"job_id": job["job_id"], "status": job["status"], "deduplicated": job["deduplicated"]}
+
 @ai_router.post("/chat", response_model=ChatResponse)
-async def chat_with_ai(request: ChatRequest):
+async def chat_with_ai(
+    request: ChatRequest,
+    llm_service: LLMService = Depends(get_llm_service),
+    embedding_service: EmbeddingService = Depends(get_embedding_service)
+):
     """
     Chat interface for financial queries
     """
     try:
-        llm_service = LLMService()
+        conversation = await load_conversation(request)
+        if settings.CHAT_ROUTER_ENABLED:
+            answer = await chat_router.answer(request.user_id, request.message, request.context)
+            if answer is not None:
+                if conversation is not None:
+                    llm_service.remember(conversation, request.message, answer["response"])
+                return answer
+
+        # A follow-up's meaning depends on the session, so only standalone questions are cached
+        cached, semantic_query = None, None
+        if conversation is None:
+            cached, semantic_query = await llm_service.lookup_chat_answer(
+                embedding_service, request.user_id, request.message, request.context
+            )
+        if cached is not None:
+            return cached
+
+        context = await with_relevant_transactions(
+            embedding_service, request.user_id, request.message,
+            await asyncio.to_thread(FinancialAnalyzer(llm_service).with_goal_projections, request.context)
+        )
         response = await llm_service.process_chat_message(
             request.user_id,
             request.message,
-            request.context
+            context,
+            use_cache=request.use_cache,
+            semantic_query=semantic_query,
+            conversation=conversation
         )
         return response
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Chat processing failed: {str(e)}")
 
+@ai_router.post("/chat/stream")
+async def stream_chat_with_ai(
+    request: ChatRequest,
+    llm_service: LLMService = Depends(get_llm_service),
+    embedding_service: EmbeddingService = Depends(get_embedding_service)
+):
+    """
+    Chat interface streamed as server-sent events
+    """
+    conversation = await load_conversation(request)
+    if settings.CHAT_ROUTER_ENABLED:
+        answer = await chat_router.answer(request.user_id, request.message, request.context)
+        if answer is not None:
+            if conversation is not None:
+                llm_service.remember(conversation, request.message, answer["response"])
+
+            async def answer_stream():
+                yield f"event: token\ndata: {json.dumps(answer['response'])}\n\n"
+                yield f"event: sources\ndata: {json.dumps(answer['sources'])}\n\n"
+
+            return StreamingResponse(
+                answer_stream(),
+                media_type="text/event-stream",
+                headers={"Cache-Control": "no-cache", "X-Answered-By": "aggregate"}
+            )
+
+    context = await with_relevant_transactions(
+        embedding_service, request.user_id, request.message,
+        await asyncio.to_thread(FinancialAnalyzer(llm_service).with_goal_projections, request.context)
+    )
+
+    async def event_stream():
+        # Starlette cancels this generator when the client disconnects, and
+        # closing it closes the provider stream underneath
+        events = llm_service.stream_chat_message(
+            request.user_id,
+            request.message,
+            context,
+            conversation=conversation
+        )
+        try:
+            async for event in events:
+                yield f"event: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+        finally:
+            await events.aclose()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "X-Answered-By": "llm"}
+    )
+
+@ai_router.delete("/chat/sessions/{user_id}/{session_id}", status_code=204)
+async def clear_chat_session(user_id: str, session_id: str):
+    """
+    Forget a chat session's history
+    """
+    conversation_memory.clear(user_id, session_id)
+
+@ai_router.get("/chat/sessions/stats")
+async def get_chat_session_stats():
+    """
+    Sessions and history tokens held by conversation memory, and summaries made
+    """
+    return conversation_memory.stats()
+
 @ai_router.post("/embed")
-async def create_embeddings(text: str):
+async def create_embeddings(
+    text: str,
+    embedding_service: EmbeddingService = Depends(get_embedding_service)
+):
     """
     Create embeddings for text data
     """
     try:
-        embedding_service = EmbeddingService()
         embeddings = await embedding_service.create_embedding(text)
         return {"embeddings": embeddings}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Embedding creation failed: {str(e)}")
 
+@ai_router.post("/embed/batch")
+async def create_embeddings_batch(
+    request: EmbedBatchRequest,
+    embedding_service: EmbeddingService = Depends(get_embedding_service)
+):
+    """
+    Create embeddings for several texts in one call
+    """
+    try:
+        embeddings = await embedding_service.embed(request.texts)
+        return {"embeddings": embeddings.tolist()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Embedding creation failed: {str(e)}")
+
+@ai_router.post("/transactions/index")
+async def index_transactions(
+    request: IndexTransactionsRequest,
+    embedding_service: EmbeddingService = Depends(get_embedding_service)
+):
+    """
+    Store transaction embeddings for semantic search and chat context
+    """
+    try:
+        indexed = await embedding_service.index_transactions(
+            request.user_id,
+            [transaction.dict() for transaction in request.transactions]
+        )
+        semantic_cache.invalidate(request.user_id)
+        return {"indexed": indexed}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Transaction indexing failed: {str(e)}")
+
+@ai_router.get("/transactions/{user_id}/sync")
+async def get_sync_state(user_id: str):
+    """
+    Watermark and coverage of a user's stored transactions; sync continues from the watermark
+    """
+    try:
+        return await asyncio.to_thread(get_transaction_store().state, user_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Sync state retrieval failed: {str(e)}")
+
+@ai_router.post("/transactions/{user_id}/sync")
+async def sync_transactions(user_id: str, request: SyncRequest):
+    """
+    Append the transactions a client added since its last sync; analysis and
+    categorization requests without transactions then read the stored rows
+    """
+    try:
+        result = await asyncio.to_thread(
+            get_transaction_store().append,
+            user_id,
+            [transaction.dict() for transaction in request.transactions],
+            request.since,
+            request.watermark
+        )
+    except WatermarkConflict as e:
+        raise HTTPException(status_code=409, detail={"error": str(e), "watermark": e.current})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Transaction sync failed: {str(e)}")
+    if result["appended"]:
+        semantic_cache.invalidate(user_id)
+    return result
+
+@ai_router.post("/transactions/search")
+async def search_transactions(
+    request: SearchRequest,
+    embedding_service: EmbeddingService = Depends(get_embedding_service)
+):
+    """
+    Semantic search over a user's indexed transactions
+    """
+    try:
+        results = await embedding_service.search(request.user_id, request.query, request.k)
+        return {"results": results}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Transaction search failed: {str(e)}")
+
 @ai_router.get("/insights/{user_id}")
-async def get_user_insights(user_id: str):
+async def get_user_insights(
+    user_id: str,
+    llm_service: LLMService = Depends(get_llm_service)
+):
     """
     Get cached insights for a specific user
     """
     try:
-        analyzer = FinancialAnalyzer()
+        analyzer = FinancialAnalyzer(llm_service)
         insights = await analyzer.get_cached_insights(user_id)
         return {"insights": insights}
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Insights retrieval failed: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Insights retrieval failed: {str(e)}")
+
+@ai_router.post("/insights/{user_id}/transactions")
+async def update_user_insights(
+    user_id: str,
+    request: CategorizationRequest,
+    llm_service: LLMService = Depends(get_llm_service)
+):
+    """
+    Fold newly arrived transactions into a user's stored insights
+    """
+    try:
+        analyzer = FinancialAnalyzer(llm_service)
+        result = await analyzer.ingest_transactions(user_id, request.transactions or [])
+        semantic_cache.invalidate(user_id)
+        return result
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Insights update failed: {str(e)}")
\ No newline at end of file
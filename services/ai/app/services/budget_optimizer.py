@@ -0,0 +1,170 @@
+"""Deterministic budget reallocation solved locally for one user or thousands at once"""
+
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+
+from ..config import settings
+
+
+# Per category: share of current spending the budget may not go below, and
+# how strongly cuts are resisted (cutting costs weight * cut ** 2)
+CATEGORY_PROFILES: Dict[str, Tuple[float, float]] = {
+    "housing": (1.0, 10.0),
+    "utilities": (1.0, 10.0),
+    "healthcare": (1.0, 10.0),
+    "savings": (1.0, 10.0),
+    "education": (0.8, 5.0),
+    "food": (0.7, 3.0),
+    "transport": (0.7, 3.0),
+    "shopping": (0.0, 1.0),
+    "entertainment": (0.0, 1.0),
+    "other_expense": (0.0, 1.0),
+}
+DEFAULT_PROFILE = (0.0, 1.0)
+
+# Halvings of the multiplier bracket; 60 takes it below a cent for any realistic budget
+BISECTION_STEPS = 60
+
+
+class BudgetOptimizer:
+    """Reallocate category budgets to meet a savings target while cutting as little as possible
+
+    For each user this solves the quadratic program
+
+        minimize    sum_c weight_c * (spent_c - x_c) ** 2
+        subject to  sum_c x_c <= income - required_savings
+                    floor_c * spent_c <= x_c <= spent_c
+
+    where required savings are the larger of the target savings rate and the
+    monthly contribution that fills the emergency fund within
+    ``emergency_fund_horizon_months``. The optimum is
+    x_c = clip(spent_c - lambda / (2 * weight_c), floor_c * spent_c, spent_c)
+    for the smallest lambda >= 0 meeting the spending limit, found by
+    bisection for every user at once on padded (users x categories) arrays.
+    """
+
+    def __init__(
+        self,
+        target_savings_rate: Optional[float] = None,
+        emergency_fund_months: Optional[float] = None,
+        emergency_fund_horizon_months: Optional[float] = None
+    ):
+        self.target_savings_rate = (
+            target_savings_rate if target_savings_rate is not None else settings.BUDGET_TARGET_SAVINGS_RATE
+        )
+        self.emergency_fund_months = (
+            emergency_fund_months if emergency_fund_months is not None
+            else settings.BUDGET_EMERGENCY_FUND_MONTHS
+        )
+        self.emergency_fund_horizon_months = (
+            emergency_fund_horizon_months if emergency_fund_horizon_months is not None
+            else settings.BUDGET_EMERGENCY_FUND_HORIZON_MONTHS
+        )
+
+    def optimize(self, budget_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Plan for a single user"""
+        return self.optimize_many([budget_data])[0]
+
+    def optimize_many(self, budgets: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Plans for many users, solved together in one vectorized pass
+
+        Each budget has ``monthly_income``, ``categories`` mapping a name to
+        ``allocated`` and ``spent``, and optionally ``emergency_fund`` (current
+        balance) and ``target_savings_rate``.
+        """
+        if not budgets:
+            return []
+
+        names = [list(b.get("categories", {})) for b in budgets]
+        width = max(1, max(map(len, names)))
+        shape = (len(budgets), width)
+        spent = np.zeros(shape)
+        allocated = np.zeros(shape)
+        floors = np.zeros(shape)
+        weights = np.ones(shape)
+        for row, (budget, categories) in enumerate(zip(budgets, names)):
+            for col, name in enumerate(categories):
+                data = budget["categories"][name]
+                spent[row, col] = max(float(data.get("spent") or 0), 0.0)
+                allocated[row, col] = max(float(data.get("allocated") or 0), 0.0)
+                floors[row, col], weights[row, col] = CATEGORY_PROFILES.get(name.lower(), DEFAULT_PROFILE)
+
+        income = np.array([float(b.get("monthly_income") or 0) for b in budgets])
+        fund = np.array([float(b.get("emergency_fund") or 0) for b in budgets])
+        rates = np.array([
+            float(b["target_savings_rate"]) if b.get("target_savings_rate") is not None
+            else self.target_savings_rate
+            for b in budgets
+        ])
+
+        lower = floors * spent
+        monthly_spending = spent.sum(axis=1)
+        fund_target = self.emergency_fund_months * monthly_spending
+        contribution = np.maximum(fund_target - fund, 0.0) / self.emergency_fund_horizon_months
+        required_savings = np.maximum(rates * income, contribution)
+        limit = income - required_savings
+
+        recommended = self._solve(spent, lower, weights, limit)
+        feasible = (lower.sum(axis=1) <= limit + 0.005).tolist()
+        total = recommended.sum(axis=1)
+        savings = income - total
+        savings_rate = np.divide(savings, income, out=np.zeros_like(income), where=income > 0)
+
+        # Rounded as whole arrays; rounding NumPy scalars one at a time dominates large batches
+        def cents(values: np.ndarray) -> list:
+            return np.round(values, 2).tolist()
+
+        allocated, spent, recommended = cents(allocated), cents(spent), cents(recommended)
+        change = cents(np.asarray(recommended) - np.asarray(allocated))
+        income, limit = cents(income), cents(np.maximum(limit, 0.0))
+        total, savings = cents(total), cents(savings)
+        fund, fund_target, contribution = cents(fund), cents(fund_target), cents(contribution)
+        savings_rate, rates = np.round(savings_rate, 4).tolist(), np.round(rates, 4).tolist()
+
+        plans = []
+        for row, categories in enumerate(names):
+            plans.append({
+                "categories": {
+                    name: {
+                        "allocated": allocated[row][col],
+                        "spent": spent[row][col],
+                        "recommended": recommended[row][col],
+                        "change": change[row][col]
+                    }
+                    for col, name in enumerate(categories)
+                },
+                "monthly_income": income[row],
+                "spending_limit": limit[row],
+                "recommended_total": total[row],
+                "savings": savings[row],
+                "savings_rate": savings_rate[row],
+                "target_savings_rate": rates[row],
+                "emergency_fund": {
+                    "current": fund[row],
+                    "target": fund_target[row],
+                    "monthly_contribution": contribution[row]
+                },
+                "feasible": feasible[row]
+            })
+        return plans
+
+    @staticmethod
+    def _solve(spent: np.ndarray, lower: np.ndarray, weights: np.ndarray, limit: np.ndarray) -> np.ndarray:
+        """Bisect every user's multiplier in lockstep; infeasible users end at their floors"""
+        def allocation(multiplier: np.ndarray) -> np.ndarray:
+            return np.clip(spent - multiplier[:, None] / (2 * weights), lower, spent)
+
+        # At this multiplier every category sits on its floor
+        high = (2 * weights * (spent - lower)).max(axis=1)
+        low = np.zeros_like(high)
+        over = spent.sum(axis=1) > limit
+        for _ in range(BISECTION_STEPS):
+            middle = (low + high) / 2
+            too_much = allocation(middle).sum(axis=1) > limit
+            low = np.where(too_much, middle, low)
+            high = np.where(too_much, high, middle)
+        return allocation(np.where(over, high, 0.0))
+
+
+budget_optimizer = BudgetOptimizer()
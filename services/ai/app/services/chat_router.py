@@ -0,0 +1,308 @@
+"""Answer aggregate chat questions from the user's transactions without an LLM call"""
+
+import asyncio
+import calendar
+import re
+from collections import Counter
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from ..prompts.financial_prompts import INCOME_CATEGORIES, EXPENSE_CATEGORIES
+from .transaction_categorizer import normalize_description
+from .transaction_store import get_transaction_store
+
+
+# Judgement and advice always go to the LLM, however numeric the question looks
+ADVICE_PATTERN = re.compile(
+    r"\b(should|could|would|can|will|going to|why|advice|advise|tips?|recommend\w*|suggest\w*|help|improve|better|"
+    r"worth|afford|plan|save more|cut|reduce|invest|how (can|do|should) i)\b"
+)
+QUESTION_PATTERN = re.compile(r"^(how much|how many|what(?:'s| is| was| were| did| are)?|total|show|tell me)\b")
+# Superlatives, averages, ratios, comparisons and breakdowns ask for more than one total
+UNSUPPORTED_PATTERN = re.compile(
+    r"\b(most|least|biggest|largest|smallest|highest|lowest|top|bottom|average|avg|mean|median|typical\w*|"
+    r"per|each|every|percent\w*|ratio|proportion|share|fraction|compar\w*|vs|versus|than|more|less|fewer|"
+    r"differen\w*|change[sd]?|increase[sd]?|decrease[sd]?|trend\w*|rank\w*|breakdown|split|by|which|when|where|who)\b|%"
+)
+
+# Checked in order; the first metric whose words appear wins
+METRIC_PATTERNS = [
+    ("balance", re.compile(r"\bbalance\b")),
+    ("count", re.compile(r"\bhow many\b")),
+    ("net", re.compile(r"\b(net(?! worth)|saved|save|cash ?flow)\b")),
+    ("income", re.compile(r"\b(earn\w*|income|made|make|received?|salary|paychecks?|deposits?)\b")),
+    ("expense", re.compile(
+        r"\b(spen[dt]|spending|costs?|pay|paid|expenses?|charges?|charged|bought|purchases?)\b"
+    )),
+]
+INCOME_WORDS = METRIC_PATTERNS[3][1]
+
+MONTHS = {
+    name.lower(): number
+    for number in range(1, 13)
+    for name in (calendar.month_name[number], calendar.month_abbr[number])
+}
+PERIOD_PATTERN = re.compile(
+    r"\b(?:(today)|(yesterday)|(this|last|past|previous) (week|month|year)|"
+    r"(?:in |over |during )?(?:the )?(?:last|past) (\d+) (day|week|month|year)s?|"
+    r"(?:in|during|for) (" + "|".join(sorted(MONTHS, key=len, reverse=True)) + r")\b(?: (\d{4}))?)\b"
+)
+UNIT_DAYS = {"day": 1, "week": 7, "month": 30, "year": 365}
+
+# Words people use for a category, beyond its own name
+CATEGORY_SYNONYMS = {
+    "groceries": "food", "grocery": "food", "restaurants": "food", "restaurant": "food",
+    "dining": "food", "eating out": "food", "eat out": "food", "ate out": "food",
+    "takeout": "food", "coffee": "food",
+    "gas": "transport", "fuel": "transport", "transportation": "transport", "commute": "transport",
+    "rent": "housing", "mortgage": "housing",
+    "bills": "utilities", "electricity": "utilities", "internet": "utilities", "phone": "utilities",
+    "medical": "healthcare", "health": "healthcare", "doctor": "healthcare", "pharmacy": "healthcare",
+    "subscriptions": "entertainment", "streaming": "entertainment", "movies": "entertainment",
+    "clothes": "shopping", "clothing": "shopping",
+    "tuition": "education", "courses": "education",
+    "wages": "salary", "paycheck": "salary", "paychecks": "salary",
+    "investments": "investment", "dividends": "investment",
+}
+CATEGORY_TERMS = {
+    **{category.replace("_", " "): category for category in INCOME_CATEGORIES + EXPENSE_CATEGORIES},
+    **CATEGORY_SYNONYMS,
+}
+CATEGORY_PATTERN = re.compile(
+    r"\b(" + "|".join(sorted(map(re.escape, CATEGORY_TERMS), key=len, reverse=True)) + r")\b"
+)
+
+# What a question is about: "on food", "at amazon", "from my checking account"
+TARGET_PATTERN = re.compile(
+    r"\b(?:on|at|from|for|with|to|in) (?:my |the |our )?([a-z0-9'&. ]+?)"
+    r"(?= (?:on|at|from|for|with|to|in|so far|altogether|overall|total)\b|[?.!,]|$)"
+)
+FILLER = {"me", "all", "everything", "total", "transactions"}
+# Words pointing back at an earlier turn; only the LLM sees the conversation they refer to
+REFERENCE_WORDS = {"it", "that", "this", "those", "these", "them", "there", "same", "again"}
+# Every word of a question outside its metric, period, categories and targets must be one of these
+QUESTION_WORDS = FILLER | {
+    "how", "much", "many", "what", "what's", "whats", "is", "was", "were", "did", "do", "does", "are",
+    "have", "has", "had", "been", "show", "tell", "i", "i've", "we", "my", "our", "the", "a", "an",
+    "on", "at", "from", "for", "with", "to", "in", "so", "far", "altogether", "overall", "money",
+    "amount", "current", "currently", "transaction", "account", "accounts", "up", "out", "get", "got",
+}
+
+
+class Period(NamedTuple):
+    """Days in [start, end); both None means all of the user's history"""
+    start: Optional[np.datetime64]
+    end: Optional[np.datetime64]
+    label: str
+
+
+class ChatIntent(NamedTuple):
+    metric: str
+    period: Period
+    # The question with its period removed, for matching categories, merchants and accounts
+    remainder: str
+
+
+class ChatQueryRouter:
+    """Recognize aggregate questions and answer them with array queries
+
+    A question is answered here only when every slot in it resolves:
+    the metric (spending, income, net, count or balance), an optional
+    period, and the categories, merchants or accounts it names, matched
+    against the user's own data, and no word falls outside those slots.
+    Anything else, including superlatives, averages, comparisons and every
+    request for advice, is left to the LLM.
+    """
+
+    def __init__(self):
+        self.counters: Counter = Counter()
+
+    def parse(self, message: str, today: Optional[np.datetime64] = None) -> Optional[ChatIntent]:
+        """The aggregate a question asks for, or None when it needs the LLM"""
+        text = " ".join(message.lower().replace("’", "'").split())
+        if not QUESTION_PATTERN.match(text) or ADVICE_PATTERN.search(text):
+            return None
+        metric = next((name for name, pattern in METRIC_PATTERNS if pattern.search(text)), None)
+        if metric is None:
+            return None
+
+        if UNSUPPORTED_PATTERN.search(text):
+            return None
+
+        today = today if today is not None else np.datetime64("today", "D")
+        match = PERIOD_PATTERN.search(text)
+        period = _period(match, today) if match else Period(None, None, "in total")
+        remainder = " ".join((text[:match.start()] + text[match.end():] if match else text).split())
+        if REFERENCE_WORDS & set(re.findall(r"[a-z0-9']+", remainder)):
+            return None
+
+        # Words no slot accounts for would change the question, so they send it to the LLM
+        rest = CATEGORY_PATTERN.sub(" ", TARGET_PATTERN.sub(" ", remainder))
+        for _, pattern in METRIC_PATTERNS:
+            rest = pattern.sub(" ", rest)
+        if not set(re.findall(r"[a-z0-9']+", rest)) <= QUESTION_WORDS:
+            return None
+        return ChatIntent(metric, period, remainder)
+
+    async def answer(
+        self,
+        user_id: str,
+        message: str,
+        context: Optional[Dict[str, Any]] = None
+    ) -> Optional[Dict[str, Any]]:
+        """A chat response computed from the user's transactions, or None to ask the LLM"""
+        context = context or {}
+        intent = self.parse(message)
+        if intent is None:
+            self.counters["llm"] += 1
+            return None
+
+        if intent.metric == "balance":
+            response = self._balance(intent, context)
+        else:
+            analytics = await asyncio.to_thread(self._analytics, user_id, intent.period, context)
+            response = self._aggregate(intent, analytics) if analytics is not None else None
+        if response is None:
+            self.counters["llm"] += 1
+            return None
+
+        self.counters["aggregate"] += 1
+        return {"response": response, "sources": ["Transaction Aggregates"], "answered_by": "aggregate"}
+
+    def stats(self) -> Dict[str, int]:
+        return dict(self.counters)
+
+    def _analytics(self, user_id: str, period: Period, context: Dict[str, Any]):
+        """The user's transactions in the period: synced ones, else those in the chat context"""
+        from .spending_analytics import SpendingAnalytics
+
+        store = get_transaction_store()
+        if store.state(user_id)["rows"]:
+            end = period.end - np.timedelta64(1, "D") if period.end is not None else None
+            return SpendingAnalytics(store.read(user_id, period.start, end))
+
+        transactions = context.get("recent_transactions")
+        if not transactions:
+            return None
+        analytics = SpendingAnalytics([t for t in transactions if isinstance(t, dict)])
+        mask = np.ones(analytics.size, dtype=bool)
+        if period.start is not None:
+            mask &= analytics.valid_dates & (analytics.dates >= period.start) & (analytics.dates < period.end)
+        return analytics.select(mask)
+
+    def _balance(self, intent: ChatIntent, context: Dict[str, Any]) -> Optional[str]:
+        # Balances live in the context, not the transactions, and only as a current total
+        if intent.period.start is not None or context.get("current_balance") is None:
+            return None
+        return f"Your current balance is ${float(context['current_balance']):,.2f}."
+
+    def _aggregate(self, intent: ChatIntent, analytics) -> Optional[str]:
+        slots = self._resolve(intent, analytics)
+        if slots is None:
+            return None
+        mask, described = slots
+
+        income = float(analytics.amounts[mask & analytics.is_income].sum())
+        expenses = float(analytics.amounts[mask & analytics.is_expense].sum())
+        label = intent.period.label
+        if intent.metric == "net":
+            return (
+                f"{label[0].upper()}{label[1:]}{described}, you received ${income:,.2f} and spent "
+                f"${expenses:,.2f}, a net of {'-' if income < expenses else ''}${abs(income - expenses):,.2f}."
+            )
+
+        incoming = intent.metric == "income" or (intent.metric == "count" and INCOME_WORDS.search(intent.remainder))
+        kind = analytics.is_income if incoming else analytics.is_expense
+        count = int(np.count_nonzero(mask & kind))
+        total = income if incoming else expenses
+        noun = "transaction" if count == 1 else "transactions"
+        if intent.metric == "count":
+            return f"You had {count} {'incoming' if incoming else 'spending'} {noun}{described} {label}, totalling ${total:,.2f}."
+        if not count:
+            return f"I found no {'income' if incoming else 'spending'}{described} {label}."
+        verb = "received" if incoming else "spent"
+        return f"You {verb} ${total:,.2f}{described} {label}, across {count} {noun}."
+
+    def _resolve(self, intent: ChatIntent, analytics) -> Optional[Tuple[np.ndarray, str]]:
+        """Row mask for the categories, accounts and merchants a question names, with their wording"""
+        mask = np.ones(analytics.size, dtype=bool)
+        described: List[str] = []
+
+        categories = {str(name).lower(): code for code, name in enumerate(analytics.category_names)}
+        accounts = {
+            str(name).lower(): code for code, name in enumerate(analytics.account_names) if name is not None
+        }
+        uncategorized = analytics.category_codes == categories.get("uncategorized", -1)
+        remainder = intent.remainder
+
+        for match in CATEGORY_PATTERN.finditer(remainder):
+            category = CATEGORY_TERMS[match.group(1)]
+            # Uncategorized rows may belong to the category, so only the LLM can total it
+            if category not in categories or uncategorized.any():
+                return None
+            mask &= analytics.category_codes == categories[category]
+            described.append(f" on {category.replace('_', ' ')}")
+            remainder = remainder.replace(match.group(0), " ")
+
+        for target in TARGET_PATTERN.findall(remainder):
+            target = target.strip()
+            words = target.split()
+            if not words or set(words) <= FILLER:
+                continue
+            account = target[:-len(" account")] if target.endswith(" account") else target
+            if account in accounts:
+                mask &= analytics.account_codes == accounts[account]
+                described.append(f" from account {account}")
+                continue
+
+            # Vectorized over the user's distinct merchants, then mapped back to rows
+            needle = f" {normalize_description(target)} "
+            if needle.strip() == "":
+                return None
+            merchants = np.array([needle in f" {name} " for name in analytics.merchant_names], dtype=bool)
+            if not merchants.any():
+                return None
+            mask &= merchants[analytics.merchant_codes]
+            described.append(f" at {target}")
+
+        return mask, "".join(described)
+
+
+def _period(match: "re.Match", today: np.datetime64) -> Period:
+    is_today, yesterday, relative, unit, count, rolling_unit, month, year = match.groups()
+    tomorrow = today + np.timedelta64(1, "D")
+    if is_today:
+        return Period(today, tomorrow, "today")
+    if yesterday:
+        return Period(today - np.timedelta64(1, "D"), today, "yesterday")
+    if count:
+        days = int(count) * UNIT_DAYS[rolling_unit]
+        plural = rolling_unit if int(count) == 1 else f"{rolling_unit}s"
+        return Period(today - np.timedelta64(days, "D"), tomorrow, f"in the last {count} {plural}")
+    if month:
+        number = MONTHS[month]
+        current_year, current_month = int(str(today)[:4]), int(str(today)[5:7])
+        # A bare month name means its most recent occurrence
+        year = int(year) if year else current_year - (number > current_month)
+        start = np.datetime64(f"{year:04d}-{number:02d}-01", "D")
+        end = (np.datetime64(f"{year:04d}-{number:02d}", "M") + 1).astype("datetime64[D]")
+        return Period(start, end, f"in {calendar.month_name[number]} {year}")
+
+    previous = relative != "this"
+    if unit == "week":
+        # Weeks start on Monday; 1970-01-05 was one
+        monday = today - np.timedelta64((int(today.astype(int)) - 4) % 7, "D")
+        start = monday - np.timedelta64(7, "D") if previous else monday
+        return Period(start, start + np.timedelta64(7, "D"), f"{'last' if previous else 'this'} week")
+    step = "M" if unit == "month" else "Y"
+    current = today.astype(f"datetime64[{step}]")
+    start = current - 1 if previous else current
+    label = (
+        f"in {calendar.month_name[int(str(start)[5:7])]} {str(start)[:4]}" if unit == "month"
+        else f"in {str(start)[:4]}"
+    )
+    return Period(start.astype("datetime64[D]"), (start + 1).astype("datetime64[D]"), label)
+
+
+chat_router = ChatQueryRouter()
@@ -0,0 +1,247 @@
+"""Bounded per-session chat history with rolling summaries of older turns"""
+
+import asyncio
+import json
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+
+from ..config import settings
+from ..prompts.prompt_compiler import count_tokens
+
+
+# (role, text, tokens); role is "user" or "assistant"
+Turn = Tuple[str, str, int]
+Summarizer = Callable[[str, List[Tuple[str, str]]], Awaitable[Optional[str]]]
+
+
+class Conversation(NamedTuple):
+    """What a chat prompt sees of a session: its summary and the recent turns that fit the budget"""
+    key: str
+    summary: str
+    turns: List[Tuple[str, str]]
+
+
+class _Session:
+    __slots__ = ("summary", "summary_tokens", "turns", "expires_at", "summarizing")
+
+    def __init__(self, summary: str = "", turns: Optional[List[Turn]] = None):
+        self.summary = summary
+        self.summary_tokens = count_tokens(summary) if summary else 0
+        self.turns: List[Turn] = turns or []
+        self.expires_at = 0.0
+        self.summarizing = False
+
+    @property
+    def tokens(self) -> int:
+        return self.summary_tokens + sum(turn[2] for turn in self.turns)
+
+
+class ConversationMemory:
+    """Per-session history kept within a token budget, across a bounded set of sessions
+
+    Every prompt carries the session summary plus as many recent turns as fit
+    in ``token_budget``, so prompt size stays flat however long a chat runs.
+    Once a session outgrows the budget, its oldest turns are folded into the
+    summary by a background LLM call, never on the request path. Least
+    recently used sessions are dropped past ``max_sessions`` or
+    ``max_total_tokens``; with Redis configured they are reloaded from there.
+    """
+
+    KEY_PREFIX = "conversation:"
+
+    def __init__(
+        self,
+        token_budget: int,
+        max_sessions: int,
+        max_total_tokens: int,
+        ttl_seconds: int,
+        redis_url: Optional[str] = None
+    ):
+        self.token_budget = token_budget
+        self.max_sessions = max_sessions
+        self.max_total_tokens = max_total_tokens
+        self.ttl_seconds = ttl_seconds
+        self.redis_url = redis_url
+        self.counters: Counter = Counter()
+        self.total_tokens = 0
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+        self._tasks: Set[asyncio.Task] = set()
+        self._redis = None
+
+    @staticmethod
+    def key(user_id: str, session_id: str) -> str:
+        return f"{user_id}:{session_id}"
+
+    async def load(self, user_id: str, session_id: str) -> Conversation:
+        """The session as the next prompt should see it"""
+        key = self.key(user_id, session_id)
+        session = self._sessions.get(key)
+        if session is not None and session.expires_at <= time.monotonic():
+            self._drop(key)
+            self.counters["expirations"] += 1
+            session = None
+        if session is None:
+            session = await self._load_shared(key)
+        if session is None:
+            return Conversation(key, "", [])
+
+        self._sessions.move_to_end(key)
+        # Newest turns first until the budget left after the summary runs out
+        available = self.token_budget - session.summary_tokens
+        recent: List[Tuple[str, str]] = []
+        for role, text, tokens in reversed(session.turns):
+            available -= tokens
+            if available < 0:
+                break
+            recent.append((role, text))
+        return Conversation(key, session.summary, recent[::-1])
+
+    def record(self, key: str, message: str, reply: str, summarize: Summarizer):
+        """Add a question and its answer; summarizing and persisting happen in the background"""
+        session = self._sessions.get(key)
+        if session is None:
+            session = self._sessions[key] = _Session()
+            self.counters["sessions"] += 1
+        self._sessions.move_to_end(key)
+        session.expires_at = time.monotonic() + self.ttl_seconds
+
+        for role, text in (("user", message), ("assistant", reply)):
+            tokens = count_tokens(text)
+            session.turns.append((role, text, tokens))
+            self.total_tokens += tokens
+
+        # Summaries that keep failing must not let a session grow without bound
+        while not session.summarizing and session.tokens > 2 * self.token_budget and session.turns:
+            self.total_tokens -= session.turns.pop(0)[2]
+            self.counters["dropped_turns"] += 1
+        self._evict()
+
+        if session.tokens > self.token_budget and not session.summarizing:
+            session.summarizing = True
+            self._spawn(self._summarize(key, session, summarize))
+        elif self._get_redis() is not None:
+            self._spawn(self._persist(key, session))
+
+    def clear(self, user_id: str, session_id: str):
+        """Forget a session here and in the shared tier"""
+        key = self.key(user_id, session_id)
+        self._drop(key)
+        if self._get_redis() is not None:
+            self._spawn(self._delete_shared(key))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "active_sessions": len(self._sessions),
+            "total_tokens": self.total_tokens,
+            "max_total_tokens": self.max_total_tokens,
+            "summarizing": len(self._tasks)
+        }
+
+    async def _summarize(self, key: str, session: _Session, summarize: Summarizer):
+        """Fold the oldest turns into the summary, keeping about half the budget verbatim"""
+        try:
+            keep, kept_tokens = len(session.turns), 0
+            while keep > 0 and kept_tokens + session.turns[keep - 1][2] <= self.token_budget // 2:
+                keep -= 1
+                kept_tokens += session.turns[keep][2]
+            folded = session.turns[:keep]
+            if not folded:
+                return
+
+            summary = await summarize(session.summary, [(role, text) for role, text, _ in folded])
+            if not summary:
+                self.counters["summary_errors"] += 1
+                return
+            # Turns only ever append while this runs, so the folded ones are still in front
+            del session.turns[:len(folded)]
+            tokens = count_tokens(summary)
+            if self._sessions.get(key) is session:
+                self.total_tokens += tokens - session.summary_tokens - sum(turn[2] for turn in folded)
+            session.summary, session.summary_tokens = summary, tokens
+            self.counters["summaries"] += 1
+            if self._get_redis() is not None:
+                await self._persist(key, session)
+        except Exception:
+            self.counters["summary_errors"] += 1
+        finally:
+            session.summarizing = False
+
+    def _evict(self):
+        while self._sessions and (
+            len(self._sessions) > self.max_sessions or self.total_tokens > self.max_total_tokens
+        ):
+            key = next(iter(self._sessions))
+            self._drop(key)
+            self.counters["evictions"] += 1
+
+    def _drop(self, key: str):
+        session = self._sessions.pop(key, None)
+        if session is not None:
+            self.total_tokens -= session.tokens
+
+    def _spawn(self, coroutine: Awaitable[Any]):
+        # Held until done; the event loop keeps only weak references to tasks
+        task = asyncio.ensure_future(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _load_shared(self, key: str) -> Optional[_Session]:
+        client = self._get_redis()
+        if client is None:
+            return None
+        try:
+            value = await client.get(self.KEY_PREFIX + key)
+        except Exception:
+            self.counters["redis_errors"] += 1
+            return None
+        if value is None:
+            return None
+
+        data = json.loads(value)
+        session = _Session(data["summary"], [tuple(turn) for turn in data["turns"]])
+        session.expires_at = time.monotonic() + self.ttl_seconds
+        self._sessions[key] = session
+        self.total_tokens += session.tokens
+        self.counters["redis_loads"] += 1
+        self._evict()
+        return session if self._sessions.get(key) is session else None
+
+    async def _persist(self, key: str, session: _Session):
+        client = self._get_redis()
+        if client is None:
+            return
+        payload = json.dumps({"summary": session.summary, "turns": session.turns})
+        try:
+            await client.set(self.KEY_PREFIX + key, payload, ex=self.ttl_seconds)
+        except Exception:
+            self.counters["redis_errors"] += 1
+
+    async def _delete_shared(self, key: str):
+        try:
+            await self._get_redis().delete(self.KEY_PREFIX + key)
+        except Exception:
+            self.counters["redis_errors"] += 1
+
+    def _get_redis(self):
+        """Create the shared-tier client on first use"""
+        if not self.redis_url:
+            return None
+        if self._redis is None:
+            try:
+                import redis.asyncio as aioredis
+            except ImportError:
+                self.redis_url = None
+                return None
+            self._redis = aioredis.from_url(self.redis_url)
+        return self._redis
+
+
+conversation_memory = ConversationMemory(
+    token_budget=settings.CONVERSATION_TOKEN_BUDGET,
+    max_sessions=settings.CONVERSATION_MAX_SESSIONS,
+    max_total_tokens=settings.CONVERSATION_MAX_TOTAL_TOKENS,
+    ttl_seconds=settings.CONVERSATION_TTL_SECONDS,
+    redis_url=settings.REDIS_URL if settings.CONVERSATION_REDIS_ENABLED else None
+)
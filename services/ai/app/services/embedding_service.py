@@ -0,0 +1,197 @@
+"""Local sentence-transformers embeddings with cross-request micro-batching"""
+
+import asyncio
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+
+from ..config import settings
+from .vector_index import VectorIndex
+
+
+@lru_cache(maxsize=None)
+def load_embedding_model(model_name: str):
+    """Load a sentence-transformers model once per process
+
+    A model loaded in a preforking parent is inherited by every worker.
+    """
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name)
+
+
+class EmbeddingService:
+    """Encodes text on a local model, coalescing concurrent requests into batches"""
+
+    def __init__(
+        self,
+        model_name: Optional[str] = None,
+        index: Optional[VectorIndex] = None
+    ):
+        self.model_name = model_name or settings.EMBEDDING_MODEL
+        self.max_batch_size = settings.EMBEDDING_BATCH_SIZE
+        self.max_wait = settings.EMBEDDING_MAX_WAIT_MS / 1000
+        self.index = index
+        self._model = None
+        self._executor = ThreadPoolExecutor(
+            max_workers=settings.EMBEDDING_WORKERS,
+            thread_name_prefix="embedding"
+        )
+        self._queue: Optional[asyncio.Queue] = None
+        self._batcher: Optional[asyncio.Task] = None
+        self._workers = asyncio.Semaphore(settings.EMBEDDING_WORKERS)
+        self._start_lock = asyncio.Lock()
+        self._encoding_tasks = set()
+
+    def load_model(self):
+        """Load the model now instead of on the first request"""
+        if self._model is None:
+            self._model = load_embedding_model(self.model_name)
+        return self._model
+
+    async def start(self):
+        """Load the model and the index and start the batching loop"""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self.load_model)
+        if self.index is None:
+            self.index = await loop.run_in_executor(self._executor, self._open_index)
+        self._queue = asyncio.Queue()
+        self._batcher = asyncio.create_task(self._batch_loop())
+
+    async def aclose(self):
+        """Stop batching and release the worker pool"""
+        if self._batcher:
+            self._batcher.cancel()
+            await asyncio.gather(self._batcher, return_exceptions=True)
+        self._executor.shutdown(wait=False)
+
+    async def create_embedding(self, text: str) -> List[float]:
+        """Embed a single string"""
+        vectors = await self.embed([text])
+        return vectors[0].tolist()
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        """Embed many strings, sharing model calls with concurrent requests"""
+        await self._ensure_started()
+        unique = list(dict.fromkeys(texts))
+        loop = asyncio.get_running_loop()
+        futures = [loop.create_future() for _ in unique]
+        for text, future in zip(unique, futures):
+            self._queue.put_nowait((text, future))
+
+        if not texts:
+            return np.zeros((0, settings.EMBEDDING_DIMENSION), dtype=np.float32)
+        vectors = dict(zip(unique, await asyncio.gather(*futures)))
+        return np.stack([vectors[text] for text in texts])
+
+    async def index_transactions(self, user_id: str, transactions: List[Dict[str, Any]]) -> int:
+        """Embed and store transactions for semantic search"""
+        if not transactions:
+            return 0
+
+        texts = [self._transaction_text(t) for t in transactions]
+        vectors = await self.embed(texts)
+        ids = [hashlib.sha1(f"{user_id}|{text}".encode("utf-8")).hexdigest() for text in texts]
+        metadata = [
+            {
+                "description": t.get("description"),
+                "amount": t.get("amount"),
+                "date": t.get("date"),
+                "category": t.get("category"),
+                "account_id": t.get("account_id")
+            }
+            for t in transactions
+        ]
+        await asyncio.get_running_loop().run_in_executor(
+            self._executor, self.index.upsert, ids, vectors, metadata, user_id
+        )
+        return len(ids)
+
+    async def search(self, user_id: str, query: str, k: int = 5) -> List[Dict[str, Any]]:
+        """Transactions most similar to a free-text query"""
+        # Opened here too, so an empty result always means no matches
+        await self._ensure_started()
+        if self.index.count == 0:
+            return []
+
+        vector = (await self.embed([query]))[0]
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, self.index.search, vector, k, user_id
+        )
+
+    async def _ensure_started(self):
+        """Start on first use when start() was not called, e.g. in scripts"""
+        if self._queue is None:
+            async with self._start_lock:
+                if self._queue is None:
+                    await self.start()
+
+    async def _batch_loop(self):
+        """Collect queued texts for up to max_wait, then encode them together"""
+        loop = asyncio.get_running_loop()
+        while True:
+            pending: List[Tuple[str, asyncio.Future]] = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(pending) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    pending.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            await self._workers.acquire()
+            task = asyncio.create_task(self._encode(pending))
+            self._encoding_tasks.add(task)
+            task.add_done_callback(self._encoding_tasks.discard)
+
+    async def _encode(self, pending: List[Tuple[str, asyncio.Future]]):
+        """Encode each distinct text once and resolve every waiter"""
+        try:
+            texts = list(dict.fromkeys(text for text, _ in pending))
+            vectors = await asyncio.get_running_loop().run_in_executor(
+                self._executor, self._encode_sync, texts
+            )
+            by_text = dict(zip(texts, vectors))
+            for text, future in pending:
+                if not future.done():
+                    future.set_result(by_text[text])
+        except Exception as e:
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            self._workers.release()
+
+    def _encode_sync(self, texts: List[str]) -> np.ndarray:
+        """Run the model on one batch inside the worker pool"""
+        return self.load_model().encode(
+            texts,
+            batch_size=self.max_batch_size,
+            normalize_embeddings=True,
+            convert_to_numpy=True
+        ).astype(np.float32)
+
+    def _open_index(self) -> VectorIndex:
+        """Open the on-disk index configured in settings"""
+        return VectorIndex(
+            settings.VECTOR_INDEX_PATH,
+            dimension=settings.EMBEDDING_DIMENSION,
+            nlist=settings.VECTOR_INDEX_NLIST,
+            nprobe=settings.VECTOR_INDEX_NPROBE,
+            train_threshold=settings.VECTOR_INDEX_TRAIN_THRESHOLD
+        )
+
+    @staticmethod
+    def _transaction_text(transaction: Dict[str, Any]) -> str:
+        """Text embedded for a transaction"""
+        parts = [str(transaction.get("description", ""))]
+        if transaction.get("category"):
+            parts.append(str(transaction["category"]))
+        parts.append(f"${float(transaction.get('amount', 0)):.2f}")
+        if transaction.get("date"):
+            parts.append(str(transaction["date"]))
+        return " | ".join(parts)
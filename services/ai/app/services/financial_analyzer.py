@@ -0,0 +1,253 @@
+"""Spending analysis and recommendations built on the analytics engine"""
+
+import asyncio
+import hashlib
+import json
+import logging
+from typing import List, Dict, Any, Optional, Tuple, TYPE_CHECKING
+
+from ..config import settings
+from ..prompts.financial_prompts import INCOME_CATEGORIES
+from .budget_optimizer import budget_optimizer
+from .goal_projection import goal_projector
+from .insights_store import get_insights_store
+from .llm_service import LLMService
+from .single_flight import single_flight
+from .transaction_index import TransactionIndex
+from .transaction_store import get_transaction_store
+
+if TYPE_CHECKING:
+    from .spending_analytics import SpendingAnalytics
+
+
+logger = logging.getLogger("uvicorn.error")
+
+
+class FinancialAnalyzer:
+    def __init__(self, llm_service: Optional[LLMService] = None):
+        self.llm_service = llm_service or LLMService()
+
+    async def analyze_spending_patterns(
+        self,
+        user_id: str,
+        transactions: Optional[List[Any]] = None,
+        time_period: str = "last_30_days"
+    ) -> Dict[str, Any]:
+        """Compute spending metrics locally and ask the LLM for narrative insights
+
+        Without ``transactions`` the period is read from the user's synced store.
+        """
+        if transactions is None:
+            return await self._analyze_stored(user_id, time_period)
+
+        rows = [t if isinstance(t, dict) else t.dict() for t in transactions]
+        if not settings.SINGLE_FLIGHT_ENABLED:
+            return await self._analyze(rows, time_period)
+
+        # Dashboard refreshes repeat the same analysis; concurrent copies share one run
+        digest = hashlib.sha256(
+            json.dumps([user_id, time_period, rows], sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()
+        return await single_flight.do(f"analyze:{digest}", lambda: self._analyze(rows, time_period))
+
+    async def _analyze(self, rows: List[Dict[str, Any]], time_period: str) -> Dict[str, Any]:
+        # Imported here so pandas loads on first use rather than at startup
+        from .spending_analytics import SpendingAnalytics
+
+        # Re-imported and pending-then-posted copies would otherwise count twice
+        index = TransactionIndex()
+        rows, _ = index.deduplicate(rows)
+        return await self._report(SpendingAnalytics.for_period(rows, time_period, series=index.recurring()))
+
+    async def _analyze_stored(self, user_id: str, time_period: str) -> Dict[str, Any]:
+        from .spending_analytics import SpendingAnalytics, period_start
+
+        async def analyze() -> Dict[str, Any]:
+            # Rows were deduplicated when they were synced
+            columns = await asyncio.to_thread(get_transaction_store().read, user_id, period_start(time_period))
+            return await self._report(SpendingAnalytics(columns))
+
+        if not settings.SINGLE_FLIGHT_ENABLED:
+            return await analyze()
+
+        # The watermark changes with every sync, so it stands in for hashing the rows
+        state = await asyncio.to_thread(get_transaction_store().state, user_id)
+        return await single_flight.do(
+            f"analyze:{user_id}:{time_period}:{state['watermark']}:{state['rows']}", analyze
+        )
+
+    async def _report(self, analytics: "SpendingAnalytics") -> Dict[str, Any]:
+        insights = await self.llm_service.generate_financial_insights(
+            [],
+            {"monthly_income": analytics.monthly_averages()["monthly_income"]},
+            analytics=analytics
+        )
+
+        return {
+            "insights": insights,
+            "recommendations": self._quick_recommendations(analytics),
+            "financial_health_score": analytics.health_score()
+        }
+
+    async def generate_recommendations(
+        self,
+        user_id: str,
+        transactions: Optional[List[Any]] = None,
+        goals: Optional[List[Dict[str, Any]]] = None
+    ) -> List[str]:
+        """Generate personalized recommendations from the user's history
+
+        Without ``transactions`` the user's whole synced history is used.
+        """
+        from .spending_analytics import SpendingAnalytics
+
+        if transactions is None:
+            analytics = SpendingAnalytics(await asyncio.to_thread(get_transaction_store().read, user_id))
+        else:
+            index = TransactionIndex()
+            rows, _ = index.deduplicate([t if isinstance(t, dict) else t.dict() for t in transactions])
+            analytics = SpendingAnalytics(rows, series=index.recurring())
+        projected = self._project_goals(analytics, goals) if goals else None
+        return await self.llm_service.generate_recommendations(analytics.recommendation_data(goals=projected))
+
+    def project_goals(self, transactions: List[Any], goals: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Goals with Monte Carlo completion dates from the user's monthly cash flow"""
+        from .spending_analytics import SpendingAnalytics
+
+        return self._project_goals(SpendingAnalytics(transactions), goals)
+
+    def project_goals_many(
+        self,
+        users: List[Tuple[List[Any], List[Dict[str, Any]]]]
+    ) -> List[List[Dict[str, Any]]]:
+        """Goal projections for many users, simulated together"""
+        from .spending_analytics import SpendingAnalytics
+
+        return goal_projector.project_many([
+            ([month["net"] for month in SpendingAnalytics(transactions).monthly_burn()], goals)
+            for transactions, goals in users
+        ])
+
+    def with_goal_projections(self, context: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Chat context whose goals carry projections, when it has transactions to project from
+
+        CPU-bound, so callers on the event loop run it in a thread. Goals with
+        amounts that are not numbers are passed through without a projection.
+        """
+        if not context or not context.get("financial_goals") or not context.get("recent_transactions"):
+            return context
+        goals = [goal for goal in context["financial_goals"] if isinstance(goal, dict)]
+        valid = [goal for goal in goals if _projectable(goal)]
+        if len(valid) < len(goals):
+            logger.warning("Skipping projections for %d goals with non-numeric amounts", len(goals) - len(valid))
+        if not valid:
+            return context
+        try:
+            projected = iter(self.project_goals(context["recent_transactions"], valid))
+        except Exception as e:
+            logger.warning("Skipping goal projections: %s", e)
+            return context
+        return {**context, "financial_goals": [next(projected) if _projectable(goal) else goal for goal in goals]}
+
+    def _project_goals(
+        self,
+        analytics: "SpendingAnalytics",
+        goals: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        return goal_projector.project([month["net"] for month in analytics.monthly_burn()], goals)
+
+    async def optimize_budget(self, budget_data: Dict[str, Any], explain: bool = False) -> Dict[str, Any]:
+        """Reallocate a budget locally; with ``explain`` one LLM call phrases the result"""
+        plan = budget_optimizer.optimize(budget_data)
+        if explain:
+            plan["explanation"] = await self.llm_service.explain_budget_plan(plan)
+        return plan
+
+    def optimize_budgets(self, budgets: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Reallocate many users' budgets in one vectorized pass, e.g. for nightly runs"""
+        return budget_optimizer.optimize_many(budgets)
+
+    async def get_cached_insights(self, user_id: str) -> List[Dict[str, Any]]:
+        """Precomputed insights for a user; never triggers analysis"""
+        record = await get_insights_store().get(user_id)
+        return record["insights"] if record else []
+
+    async def ingest_transactions(self, user_id: str, transactions: List[Any]) -> Dict[str, Any]:
+        """Update a user's stored insights with newly arrived transactions"""
+        rows = [t if isinstance(t, dict) else t.dict() for t in transactions]
+        return await get_insights_store().add_transactions(user_id, rows, self.llm_service)
+
+    def job_handlers(self) -> Dict[str, Any]:
+        """Background job kinds served by this analyzer, keyed by job kind"""
+        return {
+            "analyze": self._run_analysis_job,
+            "recommendations": self._run_recommendations_job
+        }
+
+    async def _run_analysis_job(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        return await self.analyze_spending_patterns(
+            payload["user_id"],
+            payload.get("transactions"),
+            payload.get("time_period", "last_30_days")
+        )
+
+    async def _run_recommendations_job(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        recommendations = await self.generate_recommendations(
+            payload["user_id"],
+            payload.get("transactions"),
+            payload.get("goals")
+        )
+        return {"recommendations": recommendations}
+
+    def _quick_recommendations(self, analytics: "SpendingAnalytics") -> List[str]:
+        """Rule-of-thumb recommendations that need no LLM call"""
+        recommendations = []
+        averages = analytics.monthly_averages()
+        categories = analytics.category_totals()
+        total_expenses = sum(categories.values())
+
+        if averages["monthly_income"] > 0 and averages["savings_rate"] < 0.2:
+            recommendations.append(
+                f"Your savings rate is {averages['savings_rate']:.0%}; aim for at least 20% of income."
+            )
+
+        # Only a real spending category is something to review
+        actionable = [
+            (category, amount) for category, amount in categories.items()
+            if category != "uncategorized" and category not in INCOME_CATEGORIES
+        ]
+        if total_expenses > 0 and actionable:
+            category, amount = actionable[0]
+            if amount / total_expenses > 0.3:
+                recommendations.append(
+                    f"{category.replace('_', ' ').title()} is {amount / total_expenses:.0%} of spending; "
+                    f"review it first for savings."
+                )
+
+        recurring = analytics.recurring_charges()
+        if recurring:
+            monthly_cost = sum(
+                r["average_amount"] for r in recurring if r["frequency"] == "monthly"
+            )
+            recommendations.append(
+                f"Recurring charges detected: {len(recurring)} "
+                f"(${monthly_cost:.2f}/month in monthly subscriptions); cancel any you no longer use."
+            )
+
+        for anomaly in analytics.anomalies(limit=2):
+            recommendations.append(
+                f"Check the unusual {anomaly['category']} charge "
+                f"\"{anomaly['description']}\" for ${anomaly['amount']:.2f}."
+            )
+
+        return recommendations
+
+
+def _projectable(goal: Dict[str, Any]) -> bool:
+    """Whether a goal's amounts can be read as numbers"""
+    try:
+        float(goal.get("target_amount") or 0)
+        float(goal.get("current_amount") or 0)
+    except (TypeError, ValueError):
+        return False
+    return True
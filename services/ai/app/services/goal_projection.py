@@ -0,0 +1,183 @@
+"""Monte Carlo projection of when savings goals will be reached"""
+
+import calendar
+import datetime
+import hashlib
+import json
+from collections import Counter, OrderedDict
+from typing import List, Dict, Any, Optional, Sequence
+
+import numpy as np
+
+from ..config import settings
+
+
+PERCENTILES = (10, 50, 90)
+
+# Paths x months held in memory at once; users are simulated in chunks below this
+MAX_CHUNK_CELLS = 4_000_000
+
+
+class GoalProjector:
+    """Simulate cash-flow paths from a user's own monthly history and read off goal dates
+
+    Each path resamples the user's historical monthly net cash flow (income
+    minus expenses, one whole month at a time) for ``horizon_months``; a
+    user's unmet goals split every month's net equally. A goal's completion month
+    on a path is the first month its running balance reaches the target.
+    Every user gets a random stream seeded from ``seed`` and a hash of their
+    inputs and the start date, so results are reproducible, independent of
+    how users are batched, and cached by that hash.
+    """
+
+    def __init__(
+        self,
+        simulations: int,
+        horizon_months: int,
+        seed: int,
+        cache_size: int
+    ):
+        self.simulations = simulations
+        self.horizon_months = horizon_months
+        self.seed = seed
+        self.cache_size = cache_size
+        self.counters: Counter = Counter()
+        self._cache: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+
+    def project(
+        self,
+        monthly_net: Sequence[float],
+        goals: List[Dict[str, Any]],
+        today: Optional[datetime.date] = None
+    ) -> List[Dict[str, Any]]:
+        """Projections for one user's goals, in goal order"""
+        return self.project_many([(monthly_net, goals)], today)[0]
+
+    def project_many(
+        self,
+        users: List[tuple],
+        today: Optional[datetime.date] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """Projections for many users given as (monthly_net, goals) pairs
+
+        Users whose inputs were projected before come from the cache; the rest
+        are simulated together in as few array passes as memory allows.
+        """
+        today = today or datetime.date.today()
+        results: List[Optional[List[Dict[str, Any]]]] = [None] * len(users)
+        pending = []
+        for position, (monthly_net, goals) in enumerate(users):
+            history = [float(n) for n in monthly_net]
+            key = self._key(history, goals, today)
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self.counters["hits"] += 1
+                results[position] = cached
+            elif not goals or not history:
+                results[position] = [self._unprojected(goal) for goal in goals]
+            else:
+                self.counters["misses"] += 1
+                pending.append((position, key, history, goals))
+
+        per_chunk = max(1, MAX_CHUNK_CELLS // (self.simulations * self.horizon_months))
+        for start in range(0, len(pending), per_chunk):
+            chunk = pending[start:start + per_chunk]
+            months = self._simulate([(key, history, goals) for _, key, history, goals in chunk])
+            for (position, key, _, goals), goal_months in zip(chunk, months):
+                results[position] = [
+                    self._summarize(goal, reached, today) for goal, reached in zip(goals, goal_months)
+                ]
+                self._store(key, results[position])
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.counters, "cached_users": len(self._cache)}
+
+    def _simulate(self, users: List[tuple]) -> List[np.ndarray]:
+        """Completion month per path for every goal of every user, np.inf when never reached"""
+        # Bootstrap whole months, drawn per user so batching never changes a user's result;
+        # months x paths, so each month below is one contiguous block per user
+        saved = np.empty((len(users), self.horizon_months, self.simulations), dtype=np.float32)
+        for row, (key, history, _) in enumerate(users):
+            rng = np.random.default_rng([self.seed, int(key[:16], 16)])
+            picks = rng.integers(0, len(history), (self.horizon_months, self.simulations), dtype=np.int32)
+            np.take(np.asarray(history, dtype=np.float32), picks, out=saved[row])
+
+        # Best balance so far, so a goal counts as met the first month it is hit. Stepping
+        # month by month beats cumsum/accumulate along a middle axis several times over
+        balance = np.zeros((len(users), self.simulations), dtype=np.float32)
+        best = np.full_like(balance, -np.inf)
+        for month in range(self.horizon_months):
+            balance += saved[:, month]
+            np.maximum(best, balance, out=best)
+            saved[:, month] = best
+
+        owners, needed = [], []
+        for row, (_, _, goals) in enumerate(users):
+            remaining = [
+                max(float(goal.get("target_amount") or 0) - float(goal.get("current_amount") or 0), 0.0)
+                for goal in goals
+            ]
+            # Goals already met take no share of the monthly net
+            open_goals = sum(1 for amount in remaining if amount > 0)
+            owners.extend([row] * len(goals))
+            needed.extend(amount * open_goals for amount in remaining)
+        owners = np.array(owners)
+        needed = np.array(needed, dtype=np.float32)
+
+        # Months still short of the goal, plus the month that reaches it
+        short = np.stack([
+            np.count_nonzero(saved[owner] < need, axis=0) for owner, need in zip(owners, needed)
+        ])
+        months = np.where(short == self.horizon_months, np.inf, short + 1.0)
+        months[needed <= 0] = 0.0
+
+        split = np.cumsum([len(goals) for _, _, goals in users])[:-1]
+        return np.split(months, split)
+
+    def _summarize(self, goal: Dict[str, Any], reached: np.ndarray, today: datetime.date) -> Dict[str, Any]:
+        finite = np.isfinite(reached)
+        projection: Dict[str, Any] = {
+            "probability": round(float(finite.mean()), 4),
+            "horizon_months": self.horizon_months,
+            "simulations": self.simulations
+        }
+        for percentile, months in zip(PERCENTILES, np.percentile(reached, PERCENTILES, method="higher")):
+            projection[f"p{percentile}"] = (
+                {"months": int(months), "date": _add_months(today, int(months)).isoformat()}
+                if np.isfinite(months) else None
+            )
+        return {**goal, "projection": projection}
+
+    def _unprojected(self, goal: Dict[str, Any]) -> Dict[str, Any]:
+        """A goal returned as is when there is no cash-flow history to project from"""
+        return {**goal, "projection": None}
+
+    def _key(self, history: List[float], goals: List[Dict[str, Any]], today: datetime.date) -> str:
+        payload = json.dumps(
+            [self.seed, self.simulations, self.horizon_months, history, goals, today.isoformat()],
+            sort_keys=True,
+            default=str
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _store(self, key: str, projections: List[Dict[str, Any]]):
+        self._cache[key] = projections
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+
+def _add_months(date: datetime.date, months: int) -> datetime.date:
+    """Same day ``months`` later, clamped to the end of shorter months"""
+    year, month = divmod(date.month - 1 + months, 12)
+    year, month = date.year + year, month + 1
+    return date.replace(year=year, month=month, day=min(date.day, calendar.monthrange(year, month)[1]))
+
+
+goal_projector = GoalProjector(
+    simulations=settings.GOAL_PROJECTION_SIMULATIONS,
+    horizon_months=settings.GOAL_PROJECTION_HORIZON_MONTHS,
+    seed=settings.GOAL_PROJECTION_SEED,
+    cache_size=settings.GOAL_PROJECTION_CACHE_SIZE
+)
@@ -0,0 +1,294 @@
+"""Per-user insights kept up to date incrementally and served as a pure read"""
+
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Dict, Any, Optional
+
+from ..config import settings
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS user_insights (
+    user_id TEXT PRIMARY KEY,
+    aggregates TEXT NOT NULL,
+    insights TEXT NOT NULL,
+    narrative TEXT NOT NULL,
+    narrative_basis TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS seen_transactions (
+    user_id TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    PRIMARY KEY (user_id, fingerprint)
+) WITHOUT ROWID;
+"""
+
+# Months of category spending compared when deciding whether to rewrite the narrative
+NARRATIVE_WINDOW_MONTHS = 3
+
+
+class InsightsStore:
+    """SQLite-backed running aggregates, derived insights and LLM narrative per user"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or settings.INSIGHTS_DB_PATH
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.executescript(SCHEMA)
+
+    async def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Stored insights for a user, without recomputing anything"""
+        return await asyncio.to_thread(self._read, user_id)
+
+    async def add_transactions(
+        self,
+        user_id: str,
+        transactions: List[Dict[str, Any]],
+        llm_service: Optional[Any] = None
+    ) -> Dict[str, Any]:
+        """Fold new transactions into the running aggregates"""
+        record = await asyncio.to_thread(self._apply, user_id, transactions)
+
+        if llm_service is not None and self._narrative_is_stale(record):
+            narrative = await llm_service.generate_financial_insights(
+                [],
+                {"monthly_income": self._recent_income(record["aggregates"])},
+                transaction_summary=self._summary(record["aggregates"])
+            )
+            # A failed call keeps the previous narrative and basis, so the next update retries
+            if not any(insight.get("type") == "error" for insight in narrative):
+                record["narrative"] = narrative
+                record["narrative_basis"] = self._window_totals(record["aggregates"])
+                await asyncio.to_thread(self._write_narrative, user_id, record)
+
+        return self._public(record)
+
+    def _apply(self, user_id: str, transactions: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Merge only unseen rows and refresh insights for the months they touch"""
+        # Imported here so pandas loads on first use rather than at startup
+        from .spending_analytics import SpendingAnalytics
+
+        with self._lock:
+            record = self._load(user_id)
+            fresh = self._unseen(user_id, transactions)
+            if not fresh:
+                return record
+
+            delta = SpendingAnalytics(fresh).month_category_totals()
+            months = record["aggregates"]["months"]
+            for month, values in delta.items():
+                current = months.setdefault(
+                    month, {"income": 0.0, "expenses": 0.0, "count": 0, "categories": {}}
+                )
+                current["income"] = round(current["income"] + values["income"], 2)
+                current["expenses"] = round(current["expenses"] + values["expenses"], 2)
+                current["count"] += values["count"]
+                for category, amount in values["categories"].items():
+                    current["categories"][category] = round(
+                        current["categories"].get(category, 0.0) + amount, 2
+                    )
+
+            # Derived insights only look at the two latest months
+            if set(delta) & set(sorted(months)[-2:]):
+                record["insights"] = self._derive_insights(record["aggregates"])
+            record["updated_at"] = time.time()
+            self._connection.execute(
+                "INSERT OR REPLACE INTO user_insights VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    user_id,
+                    json.dumps(record["aggregates"]),
+                    json.dumps(record["insights"]),
+                    json.dumps(record["narrative"]),
+                    json.dumps(record["narrative_basis"]),
+                    record["updated_at"]
+                )
+            )
+            self._connection.executemany(
+                "INSERT OR IGNORE INTO seen_transactions VALUES (?, ?)",
+                [(user_id, self._fingerprint(t)) for t in fresh]
+            )
+            self._connection.commit()
+            return record
+
+    def _derive_insights(self, aggregates: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Deterministic insights comparing the two latest months"""
+        months = sorted(aggregates["months"])
+        insights = []
+        if not months:
+            return insights
+
+        latest = aggregates["months"][months[-1]]
+        if latest["income"] > 0:
+            rate = (latest["income"] - latest["expenses"]) / latest["income"]
+            insights.append({
+                "type": "savings_rate",
+                "title": "Savings Rate",
+                "description": f"You saved {rate:.0%} of income in {months[-1]}.",
+                "confidence": 1.0
+            })
+
+        if len(months) > 1:
+            previous = aggregates["months"][months[-2]]["categories"]
+            for category, amount in latest["categories"].items():
+                before = previous.get(category, 0.0)
+                if before > 0 and abs(amount - before) / before >= 0.2:
+                    direction = "up" if amount > before else "down"
+                    insights.append({
+                        "type": "spending_change",
+                        "title": f"{category.title()} Spending {direction.title()}",
+                        "description": (
+                            f"{category.title()} spending is {direction} "
+                            f"{abs(amount - before) / before:.0%} from {months[-2]} "
+                            f"(${before:.2f} to ${amount:.2f})."
+                        ),
+                        "confidence": 1.0
+                    })
+
+        return insights
+
+    def _narrative_is_stale(self, record: Dict[str, Any]) -> bool:
+        """Whether recent category spending moved enough to justify an LLM call"""
+        current = self._window_totals(record["aggregates"])
+        basis = record["narrative_basis"]
+        if not current:
+            return False
+        if not record["narrative"]:
+            return True
+
+        change = sum(
+            abs(current.get(category, 0.0) - basis.get(category, 0.0))
+            for category in set(current) | set(basis)
+        )
+        return change / max(sum(basis.values()), 1.0) > settings.INSIGHTS_NARRATIVE_THRESHOLD
+
+    def _window_totals(self, aggregates: Dict[str, Any]) -> Dict[str, float]:
+        """Category spending over the most recent months"""
+        totals: Dict[str, float] = {}
+        for month in sorted(aggregates["months"])[-NARRATIVE_WINDOW_MONTHS:]:
+            for category, amount in aggregates["months"][month]["categories"].items():
+                totals[category] = round(totals.get(category, 0.0) + amount, 2)
+        return totals
+
+    def _recent_income(self, aggregates: Dict[str, Any]) -> float:
+        """Average monthly income over the narrative window"""
+        months = sorted(aggregates["months"])[-NARRATIVE_WINDOW_MONTHS:]
+        if not months:
+            return 0.0
+        return sum(aggregates["months"][m]["income"] for m in months) / len(months)
+
+    def _summary(self, aggregates: Dict[str, Any]) -> str:
+        """Prompt summary built from aggregates rather than raw rows"""
+        months = sorted(aggregates["months"])[-NARRATIVE_WINDOW_MONTHS:]
+        income = sum(aggregates["months"][m]["income"] for m in months)
+        expenses = sum(aggregates["months"][m]["expenses"] for m in months)
+        count = sum(aggregates["months"][m]["count"] for m in months)
+        top = sorted(self._window_totals(aggregates).items(), key=lambda x: x[1], reverse=True)[:3]
+        lines = [
+            f"- Total Income: ${income:.2f}",
+            f"- Total Expenses: ${expenses:.2f}",
+            f"- Number of Transactions: {count}",
+            f"- Top Spending Categories: {', '.join([f'{cat}: ${amt:.2f}' for cat, amt in top])}",
+        ]
+        lines.extend(
+            f"- {m}: income ${aggregates['months'][m]['income']:.2f}, "
+            f"expenses ${aggregates['months'][m]['expenses']:.2f}"
+            for m in months
+        )
+        return "\n" + "\n".join(lines) + "\n"
+
+    def _unseen(self, user_id: str, transactions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Drop rows already folded into this user's aggregates"""
+        by_fingerprint = {self._fingerprint(t): t for t in transactions}
+        fingerprints = list(by_fingerprint)
+        seen = set()
+        for start in range(0, len(fingerprints), 500):
+            chunk = fingerprints[start:start + 500]
+            rows = self._connection.execute(
+                f"SELECT fingerprint FROM seen_transactions WHERE user_id = ? "
+                f"AND fingerprint IN ({', '.join('?' * len(chunk))})",
+                (user_id, *chunk)
+            )
+            seen.update(row[0] for row in rows)
+        return [t for f, t in by_fingerprint.items() if f not in seen]
+
+    def _load(self, user_id: str) -> Dict[str, Any]:
+        """Stored record, or an empty one for a new user"""
+        row = self._connection.execute(
+            "SELECT aggregates, insights, narrative, narrative_basis, updated_at "
+            "FROM user_insights WHERE user_id = ?",
+            (user_id,)
+        ).fetchone()
+        if row is None:
+            return {
+                "aggregates": {"months": {}},
+                "insights": [],
+                "narrative": [],
+                "narrative_basis": {},
+                "updated_at": None
+            }
+        return {
+            "aggregates": json.loads(row[0]),
+            "insights": json.loads(row[1]),
+            "narrative": json.loads(row[2]),
+            "narrative_basis": json.loads(row[3]),
+            "updated_at": row[4]
+        }
+
+    def _read(self, user_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT insights, narrative, updated_at FROM user_insights WHERE user_id = ?",
+                (user_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "insights": json.loads(row[0]) + json.loads(row[1]),
+            "updated_at": row[2]
+        }
+
+    def _write_narrative(self, user_id: str, record: Dict[str, Any]):
+        with self._lock:
+            self._connection.execute(
+                "UPDATE user_insights SET narrative = ?, narrative_basis = ? WHERE user_id = ?",
+                (json.dumps(record["narrative"]), json.dumps(record["narrative_basis"]), user_id)
+            )
+            self._connection.commit()
+
+    @staticmethod
+    def _public(record: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "insights": record["insights"] + record["narrative"],
+            "updated_at": record["updated_at"]
+        }
+
+    @staticmethod
+    def _fingerprint(transaction: Dict[str, Any]) -> str:
+        """The row's own id when it has one; otherwise only an identical row matches"""
+        if transaction.get("id") not in (None, "", "unknown"):
+            key = f"id|{transaction['id']}"
+        else:
+            key = "|".join(
+                str(transaction.get(field, "")) for field in ("account_id", "date", "description", "amount")
+            )
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+_store: Optional[InsightsStore] = None
+
+
+def get_insights_store() -> InsightsStore:
+    """Process-wide store, opened on first use"""
+    global _store
+    if _store is None:
+        _store = InsightsStore()
+    return _store
@@ -0,0 +1,265 @@
+"""Background jobs for long-running analysis, with dedupe and priority lanes"""
+
+import asyncio
+import hashlib
+import itertools
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, Any, List, Optional, Tuple
+
+from ..config import settings
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    dedupe_key TEXT NOT NULL,
+    lane TEXT NOT NULL,
+    status TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_dedupe ON jobs (dedupe_key, created_at);
+"""
+
+# Lower rank runs first
+LANES = {"interactive": 0, "batch": 1}
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+JobHandler = Callable[[Dict[str, Any]], Awaitable[Any]]
+
+
+class JobQueue:
+    """SQLite-backed job table drained by a bounded pool of asyncio workers"""
+
+    def __init__(
+        self,
+        handlers: Dict[str, JobHandler],
+        path: Optional[str] = None,
+        concurrency: Optional[int] = None
+    ):
+        self.handlers = handlers
+        self.path = path or settings.JOB_DB_PATH
+        self.concurrency = concurrency or settings.JOB_WORKERS
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.executescript(SCHEMA)
+        self._queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        self._sequence = itertools.count()
+        self._workers: List[asyncio.Task] = []
+        self._reaper_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """Requeue unfinished jobs and start the workers and the lease reaper"""
+        for job_id, lane in await asyncio.to_thread(self._unfinished):
+            self._enqueue(job_id, lane)
+        self._workers = [
+            asyncio.create_task(self._worker()) for _ in range(self.concurrency)
+        ]
+        self._reaper_task = asyncio.create_task(self._reaper())
+
+    async def stop(self):
+        """Cancel the workers; the jobs they were running go back to queued"""
+        tasks = self._workers + ([self._reaper_task] if self._reaper_task else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+        self._reaper_task = None
+
+    async def submit(
+        self,
+        kind: str,
+        user_id: str,
+        payload: Dict[str, Any],
+        lane: str = "interactive"
+    ) -> Dict[str, Any]:
+        """Create a job, or return the existing one for the same user and data"""
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        if lane not in LANES:
+            raise ValueError(f"Unknown lane: {lane}")
+
+        data_hash = hashlib.sha256(
+            json.dumps(payload, sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()
+        dedupe_key = f"{kind}:{user_id}:{data_hash}"
+
+        job, created = await asyncio.to_thread(self._insert, kind, user_id, dedupe_key, lane, payload)
+        if created:
+            self._enqueue(job["job_id"], lane)
+        return {**job, "deduplicated": not created}
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Job status, and the result once finished"""
+        return await asyncio.to_thread(self._read, job_id)
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth and worker count"""
+        return {"queued": self._queue.qsize(), "workers": len(self._workers)}
+
+    def _enqueue(self, job_id: str, lane: str):
+        self._queue.put_nowait((LANES[lane], next(self._sequence), job_id))
+
+    async def _worker(self):
+        """Run jobs in priority order until cancelled"""
+        while True:
+            _, _, job_id = await self._queue.get()
+            try:
+                job = await asyncio.to_thread(self._claim, job_id)
+                if job is None:
+                    continue
+                try:
+                    result = await self.handlers[job["kind"]](job["payload"])
+                except asyncio.CancelledError:
+                    # Synchronous so a second cancellation cannot skip it; the next start runs the job
+                    self._release(job_id)
+                    raise
+                except Exception as e:
+                    await asyncio.to_thread(self._finish, job_id, FAILED, None, str(e))
+                else:
+                    await asyncio.to_thread(self._finish, job_id, SUCCEEDED, result, None)
+            finally:
+                self._queue.task_done()
+
+    async def _reaper(self):
+        """Requeue jobs whose worker died without releasing them, e.g. in another process"""
+        while True:
+            await asyncio.sleep(settings.JOB_LEASE_SECONDS / 4)
+            for job_id, lane in await asyncio.to_thread(self._expired):
+                self._enqueue(job_id, lane)
+
+    def _insert(
+        self,
+        kind: str,
+        user_id: str,
+        dedupe_key: str,
+        lane: str,
+        payload: Dict[str, Any]
+    ) -> Tuple[Dict[str, Any], bool]:
+        """Check for a live duplicate and insert atomically"""
+        now = time.time()
+        with self._lock:
+            cursor = self._connection.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                # A running job past its lease has lost its worker, so it is not reused
+                row = cursor.execute(
+                    "SELECT id FROM jobs WHERE dedupe_key = ? AND ("
+                    "status = ? OR (status = ? AND started_at > ?) OR (status = ? AND finished_at > ?)"
+                    ") ORDER BY created_at DESC LIMIT 1",
+                    (
+                        dedupe_key, QUEUED, RUNNING, now - settings.JOB_LEASE_SECONDS,
+                        SUCCEEDED, now - settings.JOB_RESULT_TTL_SECONDS
+                    )
+                ).fetchone()
+                if row:
+                    cursor.execute("COMMIT")
+                    return self._read_unlocked(row[0]), False
+
+                job_id = uuid.uuid4().hex
+                cursor.execute(
+                    "INSERT INTO jobs (id, kind, user_id, dedupe_key, lane, status, payload, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (job_id, kind, user_id, dedupe_key, lane, QUEUED, json.dumps(payload, default=str), now)
+                )
+                cursor.execute("COMMIT")
+            except Exception:
+                cursor.execute("ROLLBACK")
+                raise
+            return self._read_unlocked(job_id), True
+
+    def _claim(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Mark a queued job as running; None if another worker took it"""
+        with self._lock:
+            cursor = self._connection.execute(
+                "UPDATE jobs SET status = ?, started_at = ? WHERE id = ? AND status = ?",
+                (RUNNING, time.time(), job_id, QUEUED)
+            )
+            if cursor.rowcount == 0:
+                return None
+            kind, payload = self._connection.execute(
+                "SELECT kind, payload FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return {"kind": kind, "payload": json.loads(payload)}
+
+    def _finish(self, job_id: str, status: str, result: Any, error: Optional[str]):
+        with self._lock:
+            self._connection.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ?",
+                (status, json.dumps(result, default=str), error, time.time(), job_id)
+            )
+
+    def _release(self, job_id: str):
+        """Put an interrupted job back in the queue"""
+        with self._lock:
+            self._connection.execute(
+                "UPDATE jobs SET status = ?, started_at = NULL WHERE id = ? AND status = ?",
+                (QUEUED, job_id, RUNNING)
+            )
+
+    def _expired(self) -> List[tuple]:
+        """Running jobs held past the lease, marked queued again"""
+        with self._lock:
+            cutoff = time.time() - settings.JOB_LEASE_SECONDS
+            rows = self._connection.execute(
+                "SELECT id, lane FROM jobs WHERE status = ? AND started_at < ? ORDER BY created_at",
+                (RUNNING, cutoff)
+            ).fetchall()
+            self._connection.executemany(
+                "UPDATE jobs SET status = ?, started_at = NULL WHERE id = ? AND status = ?",
+                [(QUEUED, job_id, RUNNING) for job_id, _ in rows]
+            )
+            return rows
+
+    def _unfinished(self) -> List[tuple]:
+        """Queued jobs, plus running ones whose worker has held them past the lease"""
+        self._expired()
+        with self._lock:
+            return self._connection.execute(
+                "SELECT id, lane FROM jobs WHERE status = ? ORDER BY created_at",
+                (QUEUED,)
+            ).fetchall()
+
+    def _read(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._read_unlocked(job_id)
+
+    def _read_unlocked(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connection.execute(
+            "SELECT id, kind, user_id, lane, status, result, error, created_at, started_at, finished_at "
+            "FROM jobs WHERE id = ?",
+            (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {
+            "job_id": row[0],
+            "kind": row[1],
+            "user_id": row[2],
+            "lane": row[3],
+            "status": row[4],
+            "result": json.loads(row[5]) if row[5] is not None else None,
+            "error": row[6],
+            "created_at": row[7],
+            "started_at": row[8],
+            "finished_at": row[9]
+        }
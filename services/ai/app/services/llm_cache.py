@@ -0,0 +1,136 @@
+"""Content-addressed cache for LLM completions"""
+
+import hashlib
+import json
+import time
+from collections import Counter, OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+from ..config import settings
+
+
+class LLMCache:
+    """In-process LRU/TTL tier with an optional shared Redis tier behind it"""
+
+    KEY_PREFIX = "llm-cache:"
+
+    def __init__(
+        self,
+        max_entries: int,
+        ttl_seconds: int,
+        redis_url: Optional[str] = None
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.redis_url = redis_url
+        self.counters: Counter = Counter()
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._redis = None
+
+    @staticmethod
+    def make_key(
+        provider: str,
+        model: str,
+        temperature: float,
+        max_tokens: int,
+        prompt: str
+    ) -> str:
+        """Hash everything that determines a completion into a cache key"""
+        payload = json.dumps(
+            [provider, model, temperature, max_tokens, prompt],
+            ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str) -> Optional[str]:
+        """Look a completion up in the local tier, then the shared tier"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.counters["hits"] += 1
+                return value
+            del self._entries[key]
+            self.counters["expirations"] += 1
+
+        client = self._get_redis()
+        if client is not None:
+            try:
+                value = await client.get(self.KEY_PREFIX + key)
+            except Exception:
+                self.counters["redis_errors"] += 1
+                value = None
+            if value is not None:
+                value = value.decode("utf-8") if isinstance(value, bytes) else value
+                self._store_local(key, value)
+                self.counters["hits"] += 1
+                self.counters["redis_hits"] += 1
+                return value
+
+        self.counters["misses"] += 1
+        return None
+
+    async def set(self, key: str, value: str):
+        """Store a completion in both tiers"""
+        self._store_local(key, value)
+
+        client = self._get_redis()
+        if client is not None:
+            try:
+                await client.set(self.KEY_PREFIX + key, value, ex=self.ttl_seconds)
+            except Exception:
+                self.counters["redis_errors"] += 1
+
+    async def ping(self) -> Optional[bool]:
+        """Whether the shared tier answers, or None when it is not configured"""
+        client = self._get_redis()
+        if client is None:
+            return None
+        try:
+            return bool(await client.ping())
+        except Exception:
+            self.counters["redis_errors"] += 1
+            return False
+
+    def clear(self):
+        """Drop every entry from the local tier"""
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss/eviction counters and current size"""
+        lookups = self.counters["hits"] + self.counters["misses"]
+        return {
+            **self.counters,
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "hit_rate": round(self.counters["hits"] / lookups, 4) if lookups else 0.0
+        }
+
+    def _store_local(self, key: str, value: str):
+        """Insert into the LRU tier, evicting the least recently used entries"""
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.counters["evictions"] += 1
+
+    def _get_redis(self):
+        """Create the shared-tier client on first use"""
+        if not self.redis_url:
+            return None
+        if self._redis is None:
+            try:
+                import redis.asyncio as aioredis
+            except ImportError:
+                self.redis_url = None
+                return None
+            self._redis = aioredis.from_url(self.redis_url)
+        return self._redis
+
+
+llm_cache = LLMCache(
+    max_entries=settings.LLM_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.LLM_CACHE_TTL_SECONDS,
+    redis_url=settings.REDIS_URL if settings.LLM_CACHE_REDIS_ENABLED else None
+)
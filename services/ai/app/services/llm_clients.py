@@ -0,0 +1,137 @@
+"""Process-wide LLM provider clients with tuned connection pools"""
+
+import asyncio
+from contextlib import asynccontextmanager, nullcontext
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+from openai import AsyncOpenAI
+from anthropic import AsyncAnthropic
+
+from ..config import settings
+from .provider_router import ProviderRouter
+from .rate_limiter import create_concurrency_limiter
+
+
+class LLMClientPool:
+    """Provider clients created once at startup and shared by every request"""
+
+    def __init__(self):
+        self.openai_client: Optional[AsyncOpenAI] = None
+        self.anthropic_client: Optional[AsyncAnthropic] = None
+        self._http_clients = []
+        self._probe_targets: Dict[str, Tuple[httpx.AsyncClient, str]] = {}
+        self._in_flight = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self.concurrency = create_concurrency_limiter()
+
+        if settings.OPENAI_API_KEY:
+            http_client = self._http_client()
+            self.openai_client = AsyncOpenAI(
+                api_key=settings.OPENAI_API_KEY,
+                base_url=settings.OPENAI_BASE_URL,
+                http_client=http_client,
+                timeout=self._timeout(),
+                max_retries=settings.LLM_MAX_RETRIES
+            )
+            self._probe_targets["openai"] = (http_client, str(self.openai_client.base_url))
+
+        if settings.ANTHROPIC_API_KEY:
+            http_client = self._http_client()
+            self.anthropic_client = AsyncAnthropic(
+                api_key=settings.ANTHROPIC_API_KEY,
+                base_url=settings.ANTHROPIC_BASE_URL,
+                http_client=http_client,
+                timeout=self._timeout(),
+                max_retries=settings.LLM_MAX_RETRIES
+            )
+            self._probe_targets["anthropic"] = (http_client, str(self.anthropic_client.base_url))
+
+        self.router = ProviderRouter([
+            name.strip() for name in settings.LLM_PROVIDER_ORDER.split(",")
+            if name.strip() in self.available()
+        ])
+
+    def available(self) -> List[str]:
+        """Names of the providers with a configured client"""
+        names = []
+        if self.openai_client:
+            names.append("openai")
+        if self.anthropic_client:
+            names.append("anthropic")
+        return names
+
+    @property
+    def in_flight(self) -> int:
+        """Provider calls currently running"""
+        return self._in_flight
+
+    async def probe(self, timeout: float) -> Dict[str, str]:
+        """Reachability of each configured provider over its own connection pool"""
+        async def check(name: str, client: httpx.AsyncClient, url: str) -> Tuple[str, str]:
+            breaker = self.router.breakers.get(name)
+            if breaker is not None and not breaker.is_available():
+                return name, "circuit_open"
+            try:
+                # Any HTTP response, even 401/404, proves DNS, TLS and the pool work
+                await client.get(url, timeout=timeout)
+            except Exception as e:
+                return name, f"unreachable: {type(e).__name__}"
+            return name, "connected"
+
+        results = await asyncio.gather(*(
+            check(name, client, url) for name, (client, url) in self._probe_targets.items()
+        ))
+        return dict(results)
+
+    @asynccontextmanager
+    async def request(self):
+        """Wait for a provider-call slot and track the call so shutdown can wait for it"""
+        slot = self.concurrency.slot(settings.RATE_LIMIT_QUEUE_TIMEOUT) if settings.RATE_LIMIT_ENABLED else nullcontext()
+        async with slot:
+            self._in_flight += 1
+            self._idle.clear()
+            try:
+                yield
+            finally:
+                self._in_flight -= 1
+                if self._in_flight == 0:
+                    self._idle.set()
+
+    async def aclose(self, drain_timeout: float = 0):
+        """Wait for in-flight calls to finish, then close the connection pools"""
+        if drain_timeout > 0:
+            try:
+                await asyncio.wait_for(self._idle.wait(), timeout=drain_timeout)
+            except asyncio.TimeoutError:
+                pass
+
+        for client in self._http_clients:
+            await client.aclose()
+        self._http_clients = []
+
+    def _timeout(self) -> httpx.Timeout:
+        """Per-request timeouts shared by both providers"""
+        return httpx.Timeout(
+            settings.LLM_REQUEST_TIMEOUT,
+            connect=settings.LLM_CONNECT_TIMEOUT
+        )
+
+    def _http_client(self) -> httpx.AsyncClient:
+        """Keep-alive connection pool for one provider"""
+        client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.LLM_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.LLM_KEEPALIVE_EXPIRY
+            ),
+            timeout=self._timeout(),
+            event_hooks={"response": [self._observe_response]}
+        )
+        self._http_clients.append(client)
+        return client
+
+    async def _observe_response(self, response: httpx.Response):
+        """Feed every provider response, SDK retries included, to the concurrency limiter"""
+        await self.concurrency.on_response(response.status_code, response.headers)
@@ -1,99 +1,326 @@
 """LLM service for processing financial data and generating insights"""
 
 import asyncio
-from typing import List, Dict, Any, Optional
-from openai import AsyncOpenAI
-from anthropic import AsyncAnthropic
+import time
+from typing import List, Dict, Any, Optional, AsyncIterator, Tuple, TYPE_CHECKING
 
 from ..config import settings
 from ..prompts.financial_prompts import FinancialPrompts
+from ..prompts.prompt_compiler import CompiledPrompt, count_tokens
+from .conversation_memory import Conversation, conversation_memory
+from .llm_cache import llm_cache
+from .llm_clients import LLMClientPool
+from .metrics import observe_llm_call, observe_stage, record_tokens, span
+from .semantic_cache import ChatQuery, semantic_cache
+from .single_flight import single_flight
+from . import structured_output
+from .structured_output import (
+    CATEGORIZATION_SCHEMA,
+    INSIGHTS_SCHEMA,
+    JSONItemStream,
+    validate_categorization,
+    validate_insight
+)
+from .transaction_categorizer import TransactionCategorizer, TIER_LLM, TIER_FALLBACK, TIER_SERIES
+from .transaction_index import TransactionIndex, transaction_indexes
+
+if TYPE_CHECKING:
+    # pandas is imported on first use rather than at startup
+    from .spending_analytics import SpendingAnalytics
+
+
+PROVIDER_MODELS = {
+    "openai": settings.DEFAULT_MODEL,
+    "anthropic": settings.ANTHROPIC_MODEL
+}
 
 
 class LLMService:
-    def __init__(self):
-        self.openai_client = None
-        self.anthropic_client = None
-        
-        if settings.OPENAI_API_KEY:
-            self.openai_client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
-        
-        if settings.ANTHROPIC_API_KEY:
-            self.anthropic_client = AsyncAnthropic(api_key=settings.ANTHROPIC_API_KEY)
+    # Output budget per row when several transactions share one prompt
+    BATCH_TOKENS_PER_ROW = 60
+
+    def __init__(self, clients: Optional[LLMClientPool] = None):
+        self.clients = clients or LLMClientPool()
+        self.openai_client = self.clients.openai_client
+        self.anthropic_client = self.clients.anthropic_client
         
         self.prompts = FinancialPrompts()
+        self.categorizer = TransactionCategorizer()
 
-    async def categorize_transactions(self, transactions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """Categorize transactions using LLM"""
-        results = []
-        
-        for transaction in transactions:
-            prompt = self.prompts.get_categorization_prompt(
-                description=transaction["description"],
-                amount=transaction["amount"]
-            )
-            
-            try:
-                response = await self._call_llm(prompt, max_tokens=100)
-                category_data = self._parse_categorization_response(response)
-                
-                results.append({
-                    "transaction_id": transaction.get("id", "unknown"),
-                    "suggested_category": category_data["category"],
-                    "confidence": category_data["confidence"],
-                    "reasoning": category_data["reasoning"]
+    async def categorize_transactions(
+        self,
+        transactions: List[Dict[str, Any]],
+        batch_size: Optional[int] = None,
+        user_id: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """Categorize transactions, sending only low-confidence rows to the LLM"""
+        results: List[Optional[Dict[str, Any]]] = [None] * len(transactions)
+        async for index, result in self.stream_categorizations(transactions, batch_size, user_id):
+            results[index] = result
+        return results
+
+    async def stream_categorizations(
+        self,
+        transactions: List[Dict[str, Any]],
+        batch_size: Optional[int] = None,
+        user_id: Optional[str] = None
+    ) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+        """Yield (position, result) for each transaction as soon as it is categorized
+
+        Rows from a series that already has a label, duplicates included, reuse
+        it. Of the rest, one row per series goes to the LLM and the others share
+        its answer. With a ``user_id`` labels carry over to the user's later requests.
+        """
+        index = transaction_indexes.get(user_id) if user_id else TransactionIndex()
+        fast_results = await self.categorizer.categorize(transactions)
+        groups: Dict[Any, List[int]] = {}
+        for position, (transaction, category_data) in enumerate(zip(transactions, fast_results)):
+            _, series_key = index.add(transaction)
+            if category_data:
+                yield position, self._categorization_result(transaction, category_data, category_data["tier"])
+                continue
+            label = index.label(series_key)
+            if label:
+                self.categorizer.record(TIER_SERIES)
+                yield position, self._categorization_result(transaction, label, TIER_SERIES)
+            else:
+                # Descriptions with no merchant words left after normalizing are not grouped
+                groups.setdefault(series_key if series_key[1] else position, []).append(position)
+
+        series = list(groups.items())
+        async for offset, result in self._categorize_with_llm(
+            [transactions[members[0]] for _, members in series],
+            batch_size
+        ):
+            series_key, members = series[offset]
+            if result["tier"] == TIER_LLM and isinstance(series_key, tuple):
+                index.set_label(series_key, {
+                    "category": result["suggested_category"],
+                    "confidence": result["confidence"],
+                    "reasoning": result["reasoning"]
                 })
+            for member in members:
+                tier = result["tier"] if member == members[0] else TIER_SERIES
+                self.categorizer.record(tier)
+                yield member, {
+                    **result,
+                    "transaction_id": transactions[member].get("id") or "unknown",
+                    "tier": tier
+                }
+
+    async def _categorize_with_llm(
+        self,
+        transactions: List[Dict[str, Any]],
+        batch_size: Optional[int] = None
+    ) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+        """Categorize transactions using LLM, several rows per call, yielding rows as they validate"""
+        batch_size = batch_size or settings.CATEGORIZATION_BATCH_SIZE
+        semaphore = asyncio.Semaphore(settings.CATEGORIZATION_MAX_CONCURRENCY)
+        queue: asyncio.Queue = asyncio.Queue()
+
+        async def run(offset: int, batch: List[Dict[str, Any]]):
+            async with semaphore:
+                async for position, result in self._categorize_batch(batch):
+                    queue.put_nowait((offset + position, result))
+
+        tasks = [
+            asyncio.create_task(run(offset, transactions[offset:offset + batch_size]))
+            for offset in range(0, len(transactions), batch_size)
+        ]
+        finished = asyncio.gather(*tasks)
+        finished.add_done_callback(lambda _: queue.put_nowait(None))
+
+        try:
+            while (item := await queue.get()) is not None:
+                yield item
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _categorize_batch(
+        self,
+        batch: List[Dict[str, Any]]
+    ) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+        """Categorize a batch with one structured call, resending only rows that fail validation"""
+        remaining = dict(enumerate(batch))
+        error = "no valid answer returned for this transaction"
+
+        for attempt in range(settings.CATEGORIZATION_MAX_RETRIES + 1):
+            if not remaining:
+                return
+            if attempt:
+                structured_output.stats["retried_rows"] += len(remaining)
+
+            positions = list(remaining)
+            prompt = self.prompts.get_batch_categorization_prompt([remaining[p] for p in positions])
+            try:
+                async for item in self._stream_structured(
+                    prompt,
+                    CATEGORIZATION_SCHEMA,
+                    max_tokens=min(settings.MAX_TOKENS, self.BATCH_TOKENS_PER_ROW * len(positions))
+                ):
+                    validated = validate_categorization(item, len(positions))
+                    if validated is None or positions[validated[0] - 1] not in remaining:
+                        continue
+                    position = positions[validated[0] - 1]
+                    yield position, self._categorization_result(remaining.pop(position), validated[1])
             except Exception as e:
-                # Fallback to default category
-                results.append({
-                    "transaction_id": transaction.get("id", "unknown"),
-                    "suggested_category": "other_expense",
-                    "confidence": 0.1,
-                    "reasoning": f"Error in categorization: {str(e)}"
-                })
-        
-        return results
+                error = str(e)
+
+        for position, transaction in remaining.items():
+            yield position, self._categorization_fallback(transaction, f"Error in categorization: {error}")
+
+    def _categorization_result(
+        self,
+        transaction: Dict[str, Any],
+        category_data: Dict[str, Any],
+        tier: str = TIER_LLM
+    ) -> Dict[str, Any]:
+        """Build a categorization result row"""
+        return {
+            "transaction_id": transaction.get("id") or "unknown",
+            "suggested_category": category_data["category"],
+            "confidence": category_data["confidence"],
+            "reasoning": category_data["reasoning"],
+            "tier": tier
+        }
+
+    def _categorization_fallback(self, transaction: Dict[str, Any], reason: str) -> Dict[str, Any]:
+        """Fallback to default category"""
+        return {
+            "transaction_id": transaction.get("id") or "unknown",
+            "suggested_category": "other_expense",
+            "confidence": 0.1,
+            "reasoning": reason,
+            "tier": TIER_FALLBACK
+        }
+
+    async def lookup_chat_answer(
+        self,
+        embedding_service: Any,
+        user_id: str,
+        message: str,
+        context: Optional[Dict[str, Any]] = None
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[ChatQuery]]:
+        """Earlier answer to a paraphrase of ``message`` over the same context, if any
+
+        Also returns the query to pass to process_chat_message so a fresh
+        answer is cached; both are None when the semantic cache is disabled.
+        """
+        if not settings.SEMANTIC_CACHE_ENABLED:
+            return None, None
+        context = context or {}
+        return await semantic_cache.lookup(
+            embedding_service, user_id, message, self.prompts._format_context(context), context
+        )
 
     async def process_chat_message(
         self, 
         user_id: str, 
         message: str, 
-        context: Optional[Dict[str, Any]] = None
+        context: Optional[Dict[str, Any]] = None,
+        use_cache: bool = False,
+        semantic_query: Optional[ChatQuery] = None,
+        conversation: Optional[Conversation] = None
     ) -> Dict[str, Any]:
         """Process user chat message and return AI response"""
         
         prompt = self.prompts.get_chat_prompt(
             user_message=message,
-            context=context or {}
+            context=context or {},
+            conversation=conversation
         )
         
         try:
-            response = await self._call_llm(prompt, max_tokens=500)
+            response = await self._call_llm(prompt, max_tokens=500, use_cache=use_cache)
             
-            return {
+            answer = {
                 "response": response.strip(),
-                "sources": self._extract_sources(context or {})
+                "sources": self._extract_sources(context or {}),
+                "answered_by": "llm"
             }
+            if semantic_query is not None:
+                semantic_cache.store(user_id, semantic_query, answer)
+            if conversation is not None:
+                self.remember(conversation, message, answer["response"])
+            return answer
         except Exception as e:
             return {
                 "response": "I'm sorry, I encountered an error processing your request. Please try again.",
-                "sources": []
+                "sources": [],
+                "answered_by": "llm"
             }
 
+    async def stream_chat_message(
+        self,
+        user_id: str,
+        message: str,
+        context: Optional[Dict[str, Any]] = None,
+        conversation: Optional[Conversation] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Stream a chat response as token events, followed by a sources event"""
+        
+        prompt = self.prompts.get_chat_prompt(
+            user_message=message,
+            context=context or {},
+            conversation=conversation
+        )
+        
+        tokens = []
+        try:
+            async for token in self._stream_llm(prompt, max_tokens=500):
+                tokens.append(token)
+                yield {"event": "token", "data": token}
+        except Exception:
+            yield {
+                "event": "error",
+                "data": "I'm sorry, I encountered an error processing your request. Please try again."
+            }
+            return
+        
+        if conversation is not None:
+            self.remember(conversation, message, "".join(tokens).strip())
+        yield {"event": "sources", "data": self._extract_sources(context or {})}
+
+    def remember(self, conversation: Conversation, message: str, reply: str):
+        """Add an exchange to the session; older turns are summarized in the background"""
+        conversation_memory.record(conversation.key, message, reply, self.summarize_conversation)
+
+    async def summarize_conversation(self, summary: str, turns: List[Tuple[str, str]]) -> Optional[str]:
+        """Fold older chat turns into a session's running summary"""
+        
+        prompt = self.prompts.get_conversation_summary_prompt(summary, turns)
+        
+        try:
+            response = await self._call_llm(prompt, max_tokens=settings.CONVERSATION_SUMMARY_MAX_TOKENS)
+            return response.strip()
+        except Exception:
+            return None
+
     async def generate_financial_insights(
         self, 
         transactions: List[Dict[str, Any]], 
-        user_profile: Dict[str, Any]
+        user_profile: Dict[str, Any],
+        analytics: Optional["SpendingAnalytics"] = None,
+        transaction_summary: Optional[str] = None
     ) -> List[Dict[str, Any]]:
         """Generate financial insights from transaction data"""
         
         prompt = self.prompts.get_analysis_prompt(
             transactions=transactions,
-            user_profile=user_profile
+            user_profile=user_profile,
+            analytics=analytics,
+            transaction_summary=transaction_summary
         )
         
         try:
-            response = await self._call_llm(prompt, max_tokens=1000)
-            insights = self._parse_insights_response(response)
+            insights = []
+            async for item in self._stream_structured(prompt, INSIGHTS_SCHEMA, max_tokens=1000):
+                insight = validate_insight(item)
+                if insight is not None:
+                    insights.append(insight)
+            if not insights:
+                raise ValueError("response contained no valid insights")
             return insights
         except Exception as e:
             return [{
@@ -103,85 +330,244 @@ class LLMService:
                 "confidence": 0.0
             }]
 
-    async def _call_llm(self, prompt: str, max_tokens: int = 500) -> str:
+    async def generate_recommendations(self, user_data: Dict[str, Any]) -> List[str]:
+        """Generate personalized recommendations from a financial summary"""
+        
+        prompt = self.prompts.get_recommendation_prompt(user_data)
+        
+        try:
+            response = await self._call_llm(prompt, max_tokens=800)
+            return [section.strip() for section in response.split('\n\n') if section.strip()]
+        except Exception:
+            return []
+
+    async def explain_budget_plan(self, plan: Dict[str, Any]) -> Optional[str]:
+        """Phrase a computed budget plan for the user; the figures come from the optimizer"""
+        
+        prompt = self.prompts.get_budget_optimization_prompt(plan)
+        
+        try:
+            response = await self._call_llm(prompt, max_tokens=settings.BUDGET_EXPLANATION_MAX_TOKENS)
+            return response.strip()
+        except Exception:
+            return None
+
+    async def _call_llm(self, prompt: CompiledPrompt, max_tokens: int = 500, use_cache: bool = True) -> str:
         """Call the configured LLM with the given prompt"""
         
-        if self.openai_client:
-            return await self._call_openai(prompt, max_tokens)
-        elif self.anthropic_client:
-            return await self._call_anthropic(prompt, max_tokens)
-        else:
+        providers = {
+            "openai": lambda: self._call_openai(prompt, max_tokens),
+            "anthropic": lambda: self._call_anthropic(prompt, max_tokens)
+        }
+        providers = {name: providers[name] for name in self.clients.router.order}
+        if not providers:
             raise ValueError("No LLM client configured")
 
-    async def _call_openai(self, prompt: str, max_tokens: int) -> str:
+        use_cache = use_cache and settings.LLM_CACHE_ENABLED
+        key = self._cache_key(prompt.text, max_tokens)
+        if use_cache:
+            cached = await llm_cache.get(key)
+            if cached is not None:
+                return cached
+
+        async def call() -> str:
+            with span("llm_call", kind=prompt.kind):
+                async with self.clients.request():
+                    response = await self.clients.router.call(providers)
+            if use_cache:
+                await llm_cache.set(key, response)
+            return response
+
+        if not settings.SINGLE_FLIGHT_ENABLED:
+            return await call()
+        # Identical prompts already in flight share that call instead of starting another
+        return await single_flight.do(key, call)
+
+    async def _stream_structured(
+        self,
+        prompt: CompiledPrompt,
+        schema: Dict[str, Any],
+        max_tokens: int = 500,
+        use_cache: bool = True
+    ) -> AsyncIterator[Any]:
+        """Stream a schema-constrained response, yielding each array item as it is parsed"""
+        parser = JSONItemStream()
+        use_cache = use_cache and settings.LLM_CACHE_ENABLED
+        key = self._cache_key(f"{schema['name']}\n{prompt.text}", max_tokens)
+
+        cached = await llm_cache.get(key) if use_cache else None
+        if cached is not None:
+            for item in parser.feed(cached):
+                yield item
+            return
+
+        if settings.SINGLE_FLIGHT_ENABLED:
+            stream = single_flight.stream(key, lambda: self._stream_llm(prompt, max_tokens, schema=schema))
+        else:
+            stream = self._stream_llm(prompt, max_tokens, schema=schema)
+
+        chunks = []
+        parse_time = 0.0
+        try:
+            async for chunk in stream:
+                chunks.append(chunk)
+                start = time.perf_counter()
+                items = parser.feed(chunk)
+                parse_time += time.perf_counter() - start
+                for item in items:
+                    yield item
+        finally:
+            # Leaves a shared stream promptly when this caller stops reading
+            await stream.aclose()
+        observe_stage("parse", parse_time)
+
+        # Only whole responses are cached; a cut-off stream is retried instead
+        if use_cache and parser.complete:
+            await llm_cache.set(key, "".join(chunks))
+
+    def _cache_key(self, text: str, max_tokens: int) -> str:
+        """Cache key for a prompt as answered by the primary provider"""
+        primary = self.clients.router.order[0]
+        return llm_cache.make_key(primary, PROVIDER_MODELS[primary], settings.TEMPERATURE, max_tokens, text)
+
+    async def _call_openai(self, prompt: CompiledPrompt, max_tokens: int) -> str:
         """Call OpenAI GPT"""
-        response = await self.openai_client.chat.completions.create(
+        with observe_llm_call("openai"):
+            response = await self.openai_client.chat.completions.create(
+                model=settings.DEFAULT_MODEL,
+                messages=[
+                    {"role": "system", "content": prompt.system},
+                    {"role": "user", "content": prompt.user}
+                ],
+                max_tokens=max_tokens,
+                temperature=settings.TEMPERATURE
+            )
+        if response.usage:
+            record_tokens("openai", response.usage.prompt_tokens, response.usage.completion_tokens)
+        return response.choices[0].message.content
+
+    async def _call_anthropic(self, prompt: CompiledPrompt, max_tokens: int) -> str:
+        """Call Anthropic Claude"""
+        with observe_llm_call("anthropic"):
+            response = await self.anthropic_client.messages.create(
+                model=settings.ANTHROPIC_MODEL,
+                max_tokens=max_tokens,
+                temperature=settings.TEMPERATURE,
+                system=prompt.system,
+                messages=[
+                    {"role": "user", "content": prompt.user}
+                ]
+            )
+        record_tokens("anthropic", response.usage.input_tokens, response.usage.output_tokens)
+        return response.content[0].text
+
+    async def _stream_llm(
+        self,
+        prompt: CompiledPrompt,
+        max_tokens: int = 500,
+        schema: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[str]:
+        """Stream tokens from the configured LLM as they arrive
+
+        With a ``schema``, OpenAI is forced to answer through a tool call and
+        the streamed tool arguments are yielded; Anthropic answers in JSON as
+        instructed by the prompt.
+        """
+        
+        providers = {
+            "openai": lambda: self._observe_stream(
+                "openai", prompt, self._stream_openai(prompt, max_tokens, schema)
+            ),
+            "anthropic": lambda: self._observe_stream(
+                "anthropic", prompt, self._stream_anthropic(prompt, max_tokens)
+            )
+        }
+        providers = {name: providers[name] for name in self.clients.router.order}
+        if not providers:
+            raise ValueError("No LLM client configured")
+
+        async with self.clients.request():
+            stream = self.clients.router.stream(providers)
+            try:
+                async for _, token in stream:
+                    yield token
+            finally:
+                # Runs on client disconnect too, closing the upstream stream
+                await stream.aclose()
+
+    async def _observe_stream(
+        self,
+        provider: str,
+        prompt: CompiledPrompt,
+        stream: AsyncIterator[str]
+    ) -> AsyncIterator[str]:
+        """Time one provider stream and count its tokens"""
+        # Streams report no usage in these SDK versions, so tokens are counted locally
+        output = []
+        try:
+            with observe_llm_call(provider):
+                async for token in stream:
+                    output.append(token)
+                    yield token
+        finally:
+            await stream.aclose()
+            record_tokens(provider, prompt.input_tokens, count_tokens("".join(output)))
+
+    async def _stream_openai(
+        self,
+        prompt: CompiledPrompt,
+        max_tokens: int,
+        schema: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[str]:
+        """Stream OpenAI GPT tokens, or tool-call arguments when a schema is given"""
+        tools = {}
+        if schema is not None:
+            tools = {
+                "tools": [{"type": "function", "function": schema}],
+                "tool_choice": {"type": "function", "function": {"name": schema["name"]}}
+            }
+        stream = await self.openai_client.chat.completions.create(
             model=settings.DEFAULT_MODEL,
             messages=[
-                {"role": "system", "content": "You are a helpful financial advisor AI."},
-                {"role": "user", "content": prompt}
+                {"role": "system", "content": prompt.system},
+                {"role": "user", "content": prompt.user}
             ],
             max_tokens=max_tokens,
-            temperature=settings.TEMPERATURE
+            temperature=settings.TEMPERATURE,
+            stream=True,
+            **tools
         )
-        return response.choices[0].message.content
+        try:
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                if delta.content:
+                    yield delta.content
+                for call in delta.tool_calls or []:
+                    if call.function and call.function.arguments:
+                        yield call.function.arguments
+        finally:
+            await stream.response.aclose()
 
-    async def _call_anthropic(self, prompt: str, max_tokens: int) -> str:
-        """Call Anthropic Claude"""
-        response = await self.anthropic_client.messages.create(
-            model="claude-3-sonnet-20240229",
+    async def _stream_anthropic(self, prompt: CompiledPrompt, max_tokens: int) -> AsyncIterator[str]:
+        """Stream Anthropic Claude tokens"""
+        stream = await self.anthropic_client.messages.create(
+            model=settings.ANTHROPIC_MODEL,
             max_tokens=max_tokens,
             temperature=settings.TEMPERATURE,
+            system=prompt.system,
             messages=[
-                {"role": "user", "content": prompt}
-            ]
+                {"role": "user", "content": prompt.user}
+            ],
+            stream=True
         )
-        return response.content[0].text
-
-    def _parse_categorization_response(self, response: str) -> Dict[str, Any]:
-        """Parse LLM response for transaction categorization"""
-        # Simple parsing - in production, use more robust parsing
-        lines = response.strip().split('\n')
-        
-        category = "other_expense"
-        confidence = 0.5
-        reasoning = "Default categorization"
-        
-        for line in lines:
-            if "category:" in line.lower():
-                category = line.split(':')[1].strip()
-            elif "confidence:" in line.lower():
-                try:
-                    confidence = float(line.split(':')[1].strip())
-                except ValueError:
-                    confidence = 0.5
-            elif "reasoning:" in line.lower():
-                reasoning = line.split(':', 1)[1].strip()
-        
-        return {
-            "category": category,
-            "confidence": confidence,
-            "reasoning": reasoning
-        }
-
-    def _parse_insights_response(self, response: str) -> List[Dict[str, Any]]:
-        """Parse LLM response for financial insights"""
-        # Simple parsing - in production, use structured output
-        insights = []
-        
-        # Split response into sections
-        sections = response.split('\n\n')
-        
-        for section in sections:
-            if section.strip():
-                insights.append({
-                    "type": "insight",
-                    "title": "Financial Insight",
-                    "description": section.strip(),
-                    "confidence": 0.8
-                })
-        
-        return insights
+        try:
+            async for event in stream:
+                if event.type == "content_block_delta" and getattr(event.delta, "text", None):
+                    yield event.delta.text
+        finally:
+            await stream.response.aclose()
 
     def _extract_sources(self, context: Dict[str, Any]) -> List[str]:
         """Extract relevant sources from context"""
@@ -193,5 +579,7 @@ class LLMService:
             sources.append("Budget Data")
         if "goals" in context:
             sources.append("Financial Goals")
+        if "relevant_transactions" in context:
+            sources.append("Similar Transactions")
         
         return sources
\ No newline at end of file
@@ -0,0 +1,198 @@
+"""Prometheus metrics and optional tracing spans for the request and LLM hot paths"""
+
+import asyncio
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterator
+
+from prometheus_client import Counter, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+from ..config import settings
+
+
+REQUEST_LATENCY = Histogram(
+    "ai_http_request_duration_seconds",
+    "Time to the first response byte per route",
+    ["method", "route", "status"]
+)
+
+LLM_LATENCY = Histogram(
+    "ai_llm_call_duration_seconds",
+    "Provider call latency",
+    ["provider", "outcome"],
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0, 32.0, 64.0)
+)
+
+LLM_TOKENS = Counter(
+    "ai_llm_tokens_total",
+    "Tokens sent to and received from providers",
+    ["provider", "direction"]
+)
+
+STAGE_LATENCY = Histogram(
+    "ai_stage_duration_seconds",
+    "Time spent in each hot-path stage",
+    ["stage"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 4.0, 16.0, 64.0)
+)
+
+
+@lru_cache(maxsize=1)
+def _get_tracer():
+    """OpenTelemetry tracer when tracing is enabled and installed, otherwise None"""
+    if not settings.TRACING_ENABLED:
+        return None
+    try:
+        from opentelemetry import trace
+    except ImportError:
+        return None
+    return trace.get_tracer("budget-tracker-ai")
+
+
+@contextmanager
+def span(stage: str, **attributes: Any) -> Iterator[None]:
+    """Time a stage into STAGE_LATENCY and, when tracing is on, record it as a span"""
+    tracer = _get_tracer()
+    start = time.perf_counter()
+    try:
+        if tracer is None:
+            yield
+        else:
+            with tracer.start_as_current_span(stage, attributes=attributes):
+                yield
+    finally:
+        STAGE_LATENCY.labels(stage).observe(time.perf_counter() - start)
+
+
+def observe_stage(stage: str, seconds: float):
+    """Record stage time measured by hand, e.g. parse time summed across a stream"""
+    STAGE_LATENCY.labels(stage).observe(seconds)
+
+
+@contextmanager
+def observe_llm_call(provider: str) -> Iterator[None]:
+    """Record one provider call's latency, labelled by outcome"""
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "success"
+    except (GeneratorExit, asyncio.CancelledError):
+        outcome = "cancelled"
+        raise
+    finally:
+        LLM_LATENCY.labels(provider, outcome).observe(time.perf_counter() - start)
+
+
+def record_tokens(provider: str, input_tokens: int, output_tokens: int):
+    LLM_TOKENS.labels(provider, "input").inc(input_tokens or 0)
+    LLM_TOKENS.labels(provider, "output").inc(output_tokens or 0)
+
+
+class RequestLatencyMiddleware:
+    """ASGI middleware timing each request to its first response byte"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+
+        async def send_and_observe(message):
+            if message["type"] == "http.response.start":
+                # Label by route template so path parameters don't explode cardinality
+                route = scope.get("route")
+                REQUEST_LATENCY.labels(
+                    scope["method"],
+                    route.path if route is not None else "unmatched",
+                    str(message["status"])
+                ).observe(time.perf_counter() - start)
+            await send(message)
+
+        await self.app(scope, receive, send_and_observe)
+
+
+class ServiceCollector:
+    """Reads cache, queue and parser state at scrape time instead of mirroring it in gauges"""
+
+    def __init__(self, sources: Dict[str, Callable[[], Any]]):
+        self.sources = sources
+
+    def collect(self):
+        from . import structured_output
+        from .llm_cache import llm_cache
+        from .chat_router import chat_router
+        from .conversation_memory import conversation_memory
+        from .semantic_cache import semantic_cache
+        from .single_flight import single_flight
+        from .transaction_categorizer import TransactionCategorizer
+
+        cache = llm_cache.stats()
+        events = CounterMetricFamily("ai_llm_cache_events", "LLM cache lookups and evictions", labels=["event"])
+        for event in ("hits", "misses", "redis_hits", "evictions", "expirations", "redis_errors"):
+            events.add_metric([event], cache.get(event, 0))
+        yield events
+        yield GaugeMetricFamily("ai_llm_cache_entries", "Entries in the local LLM cache", value=cache["size"])
+
+        parsed = CounterMetricFamily(
+            "ai_structured_output_items", "Structured output items by parse result", labels=["result"]
+        )
+        for result in ("items", "invalid", "retried_rows"):
+            parsed.add_metric([result], structured_output.stats[result])
+        yield parsed
+
+        flights = CounterMetricFamily(
+            "ai_single_flight_calls", "Calls that led or joined an identical in-flight call", labels=["role"]
+        )
+        for role in ("leaders", "coalesced", "stream_leaders", "stream_coalesced", "shared_hits", "abandoned"):
+            flights.add_metric([role], single_flight.counters[role])
+        yield flights
+
+        semantic = semantic_cache.stats()
+        answers = CounterMetricFamily(
+            "ai_semantic_cache_events", "Chat questions answered from or missed by the semantic cache",
+            labels=["event"]
+        )
+        for event in ("hits", "misses", "evictions", "expirations", "stale", "invalidations"):
+            answers.add_metric([event], semantic.get(event, 0))
+        yield answers
+        yield CounterMetricFamily(
+            "ai_semantic_cache_latency_saved_seconds",
+            "Chat latency avoided by serving cached answers",
+            value=semantic_cache.latency_saved
+        )
+
+        routed = CounterMetricFamily(
+            "ai_chat_router_questions", "Chat questions by the path that answered them", labels=["answered_by"]
+        )
+        for path in ("aggregate", "llm"):
+            routed.add_metric([path], chat_router.counters[path])
+        yield routed
+
+        memory = conversation_memory.stats()
+        yield GaugeMetricFamily(
+            "ai_conversation_sessions", "Chat sessions held in memory", value=memory["active_sessions"]
+        )
+        yield GaugeMetricFamily(
+            "ai_conversation_tokens", "History tokens held across chat sessions", value=memory["total_tokens"]
+        )
+        yield CounterMetricFamily(
+            "ai_conversation_summaries", "Older chat turns folded into session summaries",
+            value=memory.get("summaries", 0)
+        )
+
+        tiers = CounterMetricFamily(
+            "ai_categorization_rows", "Categorized rows by answering tier", labels=["tier"]
+        )
+        for tier, count in TransactionCategorizer.stats.items():
+            tiers.add_metric([tier], count)
+        yield tiers
+
+        for name, read in self.sources.items():
+            yield GaugeMetricFamily(f"ai_{name}", name.replace("_", " ").capitalize(), value=read())
@@ -0,0 +1,303 @@
+"""Deadline, failover, hedging and circuit-breaking across LLM providers"""
+
+import asyncio
+import time
+from collections import Counter, deque
+from typing import AsyncIterator, Awaitable, Callable, Deque, Dict, Any, List, Optional, Tuple
+
+from ..config import settings
+
+
+class ProviderUnavailableError(Exception):
+    """Raised when every configured provider is failing or circuit-open"""
+
+
+class CircuitBreaker:
+    """Rolling-window breaker that opens on error rate or tail latency"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        window_size: int,
+        min_calls: int,
+        error_rate_threshold: float,
+        p95_latency_threshold: float,
+        cooldown_seconds: float
+    ):
+        self.min_calls = min_calls
+        self.error_rate_threshold = error_rate_threshold
+        self.p95_latency_threshold = p95_latency_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.state = self.CLOSED
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._outcomes: Deque[Tuple[bool, float]] = deque(maxlen=window_size)
+
+    def is_available(self) -> bool:
+        """Whether a call would be admitted, without claiming the half-open probe"""
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN:
+            return time.monotonic() - self.opened_at >= self.cooldown_seconds
+        return not self._probe_in_flight
+
+    def allow(self) -> bool:
+        """Admit a call, claiming the single probe slot when half-open"""
+        if not self.is_available():
+            return False
+        if self.state == self.OPEN:
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN:
+            self._probe_in_flight = True
+        return True
+
+    def release(self):
+        """Give back a probe slot whose call was cancelled before finishing"""
+        self._probe_in_flight = False
+
+    def record(self, success: bool, latency: float):
+        """Feed one call outcome into the window and update the state"""
+        self._outcomes.append((success, latency))
+
+        if self.state == self.HALF_OPEN:
+            self._probe_in_flight = False
+            if success:
+                self.state = self.CLOSED
+                self._outcomes.clear()
+            else:
+                self._trip()
+            return
+
+        if len(self._outcomes) >= self.min_calls and (
+            self.error_rate() > self.error_rate_threshold
+            or (self.p95() or 0.0) > self.p95_latency_threshold
+        ):
+            self._trip()
+
+    def error_rate(self) -> float:
+        """Share of failed calls in the window"""
+        if not self._outcomes:
+            return 0.0
+        return sum(1 for success, _ in self._outcomes if not success) / len(self._outcomes)
+
+    def p95(self) -> Optional[float]:
+        """95th percentile latency of successful calls in the window"""
+        return self._percentile(0.95)
+
+    def p50(self) -> Optional[float]:
+        """Median latency of successful calls in the window"""
+        return self._percentile(0.5)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current state for the stats endpoint"""
+        return {
+            "state": self.state,
+            "window_calls": len(self._outcomes),
+            "error_rate": round(self.error_rate(), 4),
+            "p50_seconds": self.p50(),
+            "p95_seconds": self.p95()
+        }
+
+    def _percentile(self, q: float) -> Optional[float]:
+        latencies = sorted(latency for success, latency in self._outcomes if success)
+        if not latencies:
+            return None
+        return round(latencies[min(len(latencies) - 1, int(q * len(latencies)))], 4)
+
+    def _trip(self):
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+
+
+class ProviderRouter:
+    """Routes each LLM call to the healthiest provider, with optional hedging"""
+
+    def __init__(self, order: List[str]):
+        self.order = order
+        self.breakers = {
+            name: CircuitBreaker(
+                window_size=settings.LLM_BREAKER_WINDOW_SIZE,
+                min_calls=settings.LLM_BREAKER_MIN_CALLS,
+                error_rate_threshold=settings.LLM_BREAKER_ERROR_RATE,
+                p95_latency_threshold=settings.LLM_BREAKER_P95_LATENCY,
+                cooldown_seconds=settings.LLM_BREAKER_COOLDOWN
+            )
+            for name in order
+        }
+        self.decisions: Counter = Counter()
+
+    def select(self, available: List[str]) -> str:
+        """Pick the first provider whose breaker admits a call"""
+        for name in self._candidates(available):
+            if self.breakers[name].is_available():
+                return name
+        self.decisions["rejected"] += 1
+        raise ProviderUnavailableError("All LLM providers are unavailable")
+
+    async def call(self, providers: Dict[str, Callable[[], Awaitable[str]]]) -> str:
+        """Run one logical LLM call across providers with deadlines and failover"""
+        candidates = [
+            name for name in self._candidates(list(providers))
+            if self.breakers[name].is_available()
+        ]
+        if not candidates:
+            self.decisions["rejected"] += 1
+            raise ProviderUnavailableError("All LLM providers are unavailable")
+
+        if settings.LLM_HEDGING_ENABLED and len(candidates) > 1:
+            return await self._hedged(candidates, providers)
+
+        last_error: Optional[BaseException] = None
+        for position, name in enumerate(candidates):
+            try:
+                result = await self._attempt(name, providers[name])
+                self.decisions["primary" if position == 0 else "failover"] += 1
+                return result
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                last_error = e
+        raise last_error
+
+    async def stream(
+        self,
+        providers: Dict[str, Callable[[], AsyncIterator[str]]]
+    ) -> AsyncIterator[Tuple[str, str]]:
+        """Stream one logical LLM call, yielding (provider, chunk) pairs
+
+        Until the first chunk arrives, each provider gets the per-call deadline
+        and a failing or silent one is replaced by the next. After that the
+        caller already holds output, so a later error is raised instead.
+        Outcomes go into the breaker window like any other call. The recorded
+        latency is the time spent waiting on the provider, not on a slow reader.
+        """
+        candidates = [
+            name for name in self._candidates(list(providers))
+            if self.breakers[name].is_available()
+        ]
+        if not candidates:
+            self.decisions["rejected"] += 1
+            raise ProviderUnavailableError("All LLM providers are unavailable")
+
+        last_error: Optional[BaseException] = None
+        for position, name in enumerate(candidates):
+            breaker = self.breakers[name]
+            if not breaker.allow():
+                last_error = ProviderUnavailableError(f"Provider {name} is circuit-open")
+                continue
+
+            stream = providers[name]()
+            sent = False
+            waited = 0.0
+            try:
+                while True:
+                    start = time.monotonic()
+                    try:
+                        if sent:
+                            chunk = await anext(stream)
+                        else:
+                            chunk = await asyncio.wait_for(anext(stream), timeout=settings.LLM_CALL_DEADLINE)
+                    except StopAsyncIteration:
+                        break
+                    finally:
+                        waited += time.monotonic() - start
+                    if not sent:
+                        sent = True
+                        self.decisions["primary" if position == 0 else "failover"] += 1
+                    yield name, chunk
+            except (asyncio.CancelledError, GeneratorExit):
+                # The reader went away; that says nothing about the provider
+                breaker.release()
+                raise
+            except Exception as e:
+                breaker.record(False, waited)
+                if sent:
+                    raise
+                last_error = e
+                continue
+            finally:
+                await stream.aclose()
+
+            breaker.record(True, waited)
+            if not sent:
+                self.decisions["primary" if position == 0 else "failover"] += 1
+            return
+
+        raise last_error
+
+    def stats(self) -> Dict[str, Any]:
+        """Routing decisions and per-provider health"""
+        return {
+            "order": self.order,
+            "hedging": settings.LLM_HEDGING_ENABLED,
+            "decisions": dict(self.decisions),
+            "providers": {name: breaker.snapshot() for name, breaker in self.breakers.items()}
+        }
+
+    async def _hedged(
+        self,
+        candidates: List[str],
+        providers: Dict[str, Callable[[], Awaitable[str]]]
+    ) -> str:
+        """Fire the next provider if the current one is slower than its p95"""
+        tasks: Dict[asyncio.Task, str] = {}
+        last_error: Optional[BaseException] = None
+        remaining = list(candidates)
+        hedge_fired = False
+
+        try:
+            while remaining or tasks:
+                if remaining:
+                    name = remaining.pop(0)
+                    tasks[asyncio.create_task(self._attempt(name, providers[name]))] = name
+                    delay = self.breakers[name].p95() or settings.LLM_HEDGE_MIN_DELAY
+                    timeout = max(delay, settings.LLM_HEDGE_MIN_DELAY) if remaining else None
+                else:
+                    timeout = None
+
+                done, _ = await asyncio.wait(
+                    tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    hedge_fired = True
+                for task in done:
+                    name = tasks.pop(task)
+                    if task.exception() is None:
+                        if name == candidates[0]:
+                            self.decisions["hedge_primary_won" if hedge_fired else "primary"] += 1
+                        else:
+                            self.decisions["hedge_secondary_won" if hedge_fired else "failover"] += 1
+                        return task.result()
+                    last_error = task.exception()
+        finally:
+            # Cancel whichever request lost the race
+            for task in tasks:
+                task.cancel()
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+        raise last_error
+
+    async def _attempt(self, name: str, factory: Callable[[], Awaitable[str]]) -> str:
+        """Call one provider under the per-call deadline and record the outcome"""
+        breaker = self.breakers[name]
+        if not breaker.allow():
+            raise ProviderUnavailableError(f"Provider {name} is circuit-open")
+
+        start = time.monotonic()
+        try:
+            result = await asyncio.wait_for(factory(), timeout=settings.LLM_CALL_DEADLINE)
+        except asyncio.CancelledError:
+            breaker.release()
+            raise
+        except Exception:
+            breaker.record(False, time.monotonic() - start)
+            raise
+        breaker.record(True, time.monotonic() - start)
+        return result
+
+    def _candidates(self, available: List[str]) -> List[str]:
+        return [name for name in self.order if name in available]
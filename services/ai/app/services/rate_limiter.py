@@ -0,0 +1,316 @@
+"""Per-user token buckets and an adaptive global limit on concurrent provider calls"""
+
+import asyncio
+import time
+import uuid
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import Dict, Any, Mapping, Optional, Tuple
+
+from ..config import settings
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a request could not be admitted before its deadline"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+# Takes cost tokens if available, otherwise reserves them when the wait fits in
+# max_wait; returns the wait in seconds, negative when the request is rejected
+BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local max_wait = tonumber(ARGV[4])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or burst
+local updated = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + (now - updated) * rate)
+local wait = 0
+if tokens < cost then
+    wait = (cost - tokens) / rate
+    if wait > max_wait then
+        return tostring(-wait)
+    end
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens - cost, 'updated', now)
+redis.call('EXPIRE', KEYS[1], math.ceil((burst - tokens + cost) / rate) + 60)
+return tostring(wait)
+"""
+
+# Leased slots in a sorted set scored by expiry, so a crashed worker's slots free themselves
+SLOT_SCRIPT = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+local limit = tonumber(redis.call('GET', KEYS[2]) or ARGV[1])
+if redis.call('ZCARD', KEYS[1]) < math.floor(limit) then
+    redis.call('ZADD', KEYS[1], now + tonumber(ARGV[2]), ARGV[3])
+    return 1
+end
+return 0
+"""
+
+# AIMD step on the shared limit; decreases are spaced by a cooldown so one burst
+# of 429s halves the limit once rather than once per response
+ADJUST_SCRIPT = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local limit = tonumber(redis.call('GET', KEYS[1]) or ARGV[1])
+local minimum = tonumber(ARGV[2])
+local maximum = tonumber(ARGV[3])
+if ARGV[4] == 'decrease' then
+    local last = tonumber(redis.call('GET', KEYS[2]) or 0)
+    if now - last < tonumber(ARGV[5]) then
+        return tostring(limit)
+    end
+    limit = math.max(minimum, limit * 0.5)
+    redis.call('SET', KEYS[2], now)
+elseif ARGV[4] == 'cap' then
+    limit = math.max(minimum, math.min(limit, tonumber(ARGV[5])))
+else
+    limit = math.min(maximum, limit + 1 / limit)
+end
+redis.call('SET', KEYS[1], limit)
+return tostring(limit)
+"""
+
+
+class _RedisScripts:
+    """Lazily created Redis client shared by both limiters"""
+
+    def __init__(self, redis_url: Optional[str]):
+        self.redis_url = redis_url
+        self._client = None
+        self._scripts: Dict[str, Any] = {}
+
+    def get(self, name: str, source: str):
+        if not self.redis_url:
+            return None
+        if self._client is None:
+            try:
+                import redis.asyncio as aioredis
+            except ImportError:
+                self.redis_url = None
+                return None
+            self._client = aioredis.from_url(self.redis_url)
+        if name not in self._scripts:
+            self._scripts[name] = self._client.register_script(source)
+        return self._scripts[name]
+
+    @property
+    def client(self):
+        return self._client
+
+
+class TokenBucketLimiter:
+    """Per-key token buckets that queue callers up to a deadline instead of failing at once"""
+
+    KEY_PREFIX = "rate:user:"
+
+    def __init__(self, rate_per_second: float, burst: float, redis: Optional[_RedisScripts] = None):
+        self.rate = rate_per_second
+        self.burst = burst
+        self.redis = redis
+        self.counters: Counter = Counter()
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+
+    async def acquire(self, key: str, cost: float = 1.0, max_wait: float = 0.0):
+        """Take ``cost`` tokens, sleeping up to ``max_wait`` for them to refill"""
+        cost = min(cost, self.burst)
+        wait = await self._reserve(key, cost, max_wait)
+        if wait < 0:
+            self.counters["rejected"] += 1
+            raise RateLimitExceeded(f"Rate limit exceeded for {key}", retry_after=-wait)
+        if wait > 0:
+            self.counters["queued"] += 1
+            await asyncio.sleep(wait)
+        self.counters["admitted"] += 1
+
+    async def _reserve(self, key: str, cost: float, max_wait: float) -> float:
+        script = self.redis.get("bucket", BUCKET_SCRIPT) if self.redis else None
+        if script is not None:
+            try:
+                return float(await script(
+                    keys=[self.KEY_PREFIX + key],
+                    args=[self.rate, self.burst, cost, max_wait]
+                ))
+            except Exception:
+                self.counters["redis_errors"] += 1
+
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        wait = 0.0
+        if tokens < cost:
+            wait = (cost - tokens) / self.rate
+            if wait > max_wait:
+                return -wait
+        # Tokens may go negative: that is the reservation later callers queue behind
+        self._buckets[key] = (tokens - cost, now)
+        if len(self._buckets) > 100000:
+            self._prune(now)
+        return wait
+
+    def _prune(self, now: float):
+        """Forget buckets that have refilled completely, counting reservations that drove them negative"""
+        self._buckets = {
+            key: (tokens, updated) for key, (tokens, updated) in self._buckets.items()
+            if tokens + (now - updated) * self.rate < self.burst
+        }
+
+
+class AdaptiveConcurrencyLimiter:
+    """AIMD limit on concurrent provider calls, lowered by 429s and rate-limit headers"""
+
+    LIMIT_KEY = "rate:llm:limit"
+    DECREASED_KEY = "rate:llm:decreased_at"
+    SLOTS_KEY = "rate:llm:slots"
+    REMAINING_HEADERS = ("x-ratelimit-remaining-requests", "anthropic-ratelimit-requests-remaining")
+
+    def __init__(
+        self,
+        initial: float,
+        minimum: float,
+        maximum: float,
+        decrease_cooldown: float,
+        redis: Optional[_RedisScripts] = None
+    ):
+        self.limit = float(initial)
+        self.minimum = float(minimum)
+        self.maximum = float(maximum)
+        self.decrease_cooldown = decrease_cooldown
+        self.redis = redis
+        self.in_flight = 0
+        self.counters: Counter = Counter()
+        self._last_decrease = 0.0
+        self._condition = asyncio.Condition()
+
+    @asynccontextmanager
+    async def slot(self, timeout: float):
+        """Hold one provider-call slot, waiting up to ``timeout`` for one to free up"""
+        member = await self._acquire(timeout)
+        try:
+            yield
+        finally:
+            await self._release(member)
+
+    async def on_response(self, status_code: int, headers: Mapping[str, str]):
+        """Adjust the limit from one provider response"""
+        if status_code == 429:
+            self.counters["throttled"] += 1
+            await self._adjust("decrease", self.decrease_cooldown)
+        elif status_code < 400:
+            remaining = next((headers[h] for h in self.REMAINING_HEADERS if h in headers), None)
+            if remaining is not None and remaining.isdigit() and int(remaining) < self.limit:
+                await self._adjust("cap", int(remaining))
+            else:
+                await self._adjust("increase", 0)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "shared": self.redis is not None and bool(self.redis.redis_url),
+            **self.counters
+        }
+
+    async def _acquire(self, timeout: float) -> Optional[str]:
+        script = self.redis.get("slot", SLOT_SCRIPT) if self.redis else None
+        if script is not None:
+            member = uuid.uuid4().hex
+            deadline = time.monotonic() + timeout
+            delay = 0.01
+            try:
+                while True:
+                    if await script(
+                        keys=[self.SLOTS_KEY, self.LIMIT_KEY],
+                        args=[self.limit, settings.RATE_LIMIT_SLOT_LEASE, member]
+                    ):
+                        self.in_flight += 1
+                        return member
+                    if time.monotonic() + delay > deadline:
+                        self.counters["timed_out"] += 1
+                        raise RateLimitExceeded("Timed out waiting for an LLM slot", retry_after=delay)
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, 0.25)
+            except RateLimitExceeded:
+                raise
+            except Exception:
+                self.counters["redis_errors"] += 1
+
+        async with self._condition:
+            try:
+                await asyncio.wait_for(
+                    self._condition.wait_for(lambda: self.in_flight < int(self.limit)),
+                    timeout=timeout
+                )
+            except asyncio.TimeoutError:
+                self.counters["timed_out"] += 1
+                raise RateLimitExceeded("Timed out waiting for an LLM slot", retry_after=1.0)
+            self.in_flight += 1
+        return None
+
+    async def _release(self, member: Optional[str]):
+        self.in_flight -= 1
+        if member is not None:
+            try:
+                await self.redis.client.zrem(self.SLOTS_KEY, member)
+            except Exception:
+                self.counters["redis_errors"] += 1
+            return
+        async with self._condition:
+            self._condition.notify()
+
+    async def _adjust(self, mode: str, value: float):
+        script = self.redis.get("adjust", ADJUST_SCRIPT) if self.redis else None
+        previous = self.limit
+        if script is not None:
+            try:
+                self.limit = float(await script(
+                    keys=[self.LIMIT_KEY, self.DECREASED_KEY],
+                    args=[self.limit, self.minimum, self.maximum, mode, value]
+                ))
+            except Exception:
+                self.counters["redis_errors"] += 1
+                script = None
+
+        if script is None:
+            now = time.monotonic()
+            if mode == "decrease":
+                if now - self._last_decrease >= value:
+                    self.limit = max(self.minimum, self.limit * 0.5)
+                    self._last_decrease = now
+            elif mode == "cap":
+                self.limit = max(self.minimum, min(self.limit, value))
+            else:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+
+        if int(self.limit) > int(previous):
+            async with self._condition:
+                self._condition.notify(int(self.limit) - int(previous))
+
+
+_redis = _RedisScripts(settings.REDIS_URL if settings.RATE_LIMIT_REDIS_ENABLED else None)
+
+user_limiter = TokenBucketLimiter(
+    rate_per_second=settings.RATE_LIMIT_USER_PER_MINUTE / 60,
+    burst=settings.RATE_LIMIT_USER_BURST,
+    redis=_redis
+)
+
+
+def create_concurrency_limiter() -> AdaptiveConcurrencyLimiter:
+    """Provider-call limiter configured from settings, sharing Redis state when enabled"""
+    return AdaptiveConcurrencyLimiter(
+        initial=settings.LLM_CONCURRENCY_INITIAL,
+        minimum=settings.LLM_CONCURRENCY_MIN,
+        maximum=settings.LLM_CONCURRENCY_MAX,
+        decrease_cooldown=settings.LLM_CONCURRENCY_DECREASE_COOLDOWN,
+        redis=_redis
+    )
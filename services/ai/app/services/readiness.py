@@ -0,0 +1,40 @@
+"""Readiness probes for the service's external dependencies"""
+
+import asyncio
+import time
+from typing import Dict, Any, Optional, Tuple
+
+from ..config import settings
+from .llm_cache import llm_cache
+from .llm_clients import LLMClientPool
+
+
+_last_result: Optional[Tuple[float, Dict[str, Any]]] = None
+_probe_lock = asyncio.Lock()
+
+
+async def check_readiness(clients: LLMClientPool) -> Dict[str, Any]:
+    """Probe providers and Redis, reusing the last result for READINESS_CACHE_SECONDS"""
+    global _last_result
+    async with _probe_lock:
+        if _last_result is not None and time.monotonic() - _last_result[0] < settings.READINESS_CACHE_SECONDS:
+            return _last_result[1]
+
+        providers, redis_ok = await asyncio.gather(
+            clients.probe(settings.READINESS_PROBE_TIMEOUT),
+            _ping_redis()
+        )
+        dependencies = {f"llm_{name}": status for name, status in providers.items()}
+        dependencies["redis"] = {None: "disabled", True: "connected", False: "unreachable"}[redis_ok]
+
+        ready = "connected" in providers.values() and redis_ok is not False
+        result = {"status": "ready" if ready else "not_ready", "dependencies": dependencies}
+        _last_result = (time.monotonic(), result)
+        return result
+
+
+async def _ping_redis() -> Optional[bool]:
+    try:
+        return await asyncio.wait_for(llm_cache.ping(), timeout=settings.READINESS_PROBE_TIMEOUT)
+    except asyncio.TimeoutError:
+        return False
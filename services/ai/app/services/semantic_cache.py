@@ -0,0 +1,166 @@
+"""Per-user cache of chat answers matched by meaning rather than exact wording"""
+
+import hashlib
+import json
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from ..config import settings
+
+
+class ChatQuery(NamedTuple):
+    """An embedded question, kept to store its answer once the LLM has replied"""
+    vector: np.ndarray
+    fingerprint: str
+    started: float
+
+
+class _UserAnswers:
+    """One user's cached answers, oldest first, with their vectors stacked for one matmul"""
+
+    __slots__ = ("vectors", "entries")
+
+    def __init__(self, dimension: int):
+        self.vectors = np.zeros((0, dimension), dtype=np.float32)
+        # (fingerprint, expires_at, answer, latency_seconds) per row of ``vectors``
+        self.entries: List[Tuple[str, float, Dict[str, Any], float]] = []
+
+    def remove(self, keep: np.ndarray):
+        self.vectors = self.vectors[keep]
+        self.entries = [entry for entry, kept in zip(self.entries, keep) if kept]
+
+
+class SemanticCache:
+    """Serve an earlier answer to a paraphrased question about unchanged data
+
+    A question matches a cached one when the cosine similarity of their
+    embeddings reaches ``threshold`` and the context fingerprint is identical,
+    so answers never outlive the balance, budget or transactions they describe.
+    Each user holds at most ``max_entries_per_user`` answers and the least
+    recently active users are dropped past ``max_users``.
+    """
+
+    def __init__(
+        self,
+        threshold: float,
+        max_entries_per_user: int,
+        max_users: int,
+        ttl_seconds: int
+    ):
+        self.threshold = threshold
+        self.max_entries_per_user = max_entries_per_user
+        self.max_users = max_users
+        self.ttl_seconds = ttl_seconds
+        self.counters: Counter = Counter()
+        self.latency_saved = 0.0
+        self._users: "OrderedDict[str, _UserAnswers]" = OrderedDict()
+
+    @staticmethod
+    def fingerprint(formatted_context: str, context: Dict[str, Any]) -> str:
+        """Hash of the prompt's context section and the raw data behind it"""
+        payload = json.dumps([formatted_context, context], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    async def lookup(
+        self,
+        embedding_service: Any,
+        user_id: str,
+        message: str,
+        formatted_context: str,
+        context: Dict[str, Any]
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[ChatQuery]]:
+        """Cached answer for a question, else the query to store the fresh answer under
+
+        Returns (None, None) when the question cannot be embedded, so the
+        caller simply goes to the LLM without caching.
+        """
+        started = time.monotonic()
+        try:
+            vector = (await embedding_service.embed([message]))[0]
+        except Exception:
+            self.counters["embedding_errors"] += 1
+            return None, None
+
+        query = ChatQuery(vector, self.fingerprint(formatted_context, context), started)
+        answers = self._users.get(user_id)
+        if answers is not None:
+            self._users.move_to_end(user_id)
+            self._expire(answers)
+        if answers is None or not answers.entries:
+            self.counters["misses"] += 1
+            return None, query
+
+        similarity = answers.vectors @ vector
+        same_data = np.array([entry[0] == query.fingerprint for entry in answers.entries], dtype=bool)
+        similarity[~same_data] = -1.0
+        best = int(np.argmax(similarity))
+        if similarity[best] < self.threshold:
+            self.counters["misses"] += 1
+            return None, query
+
+        _, _, answer, latency = answers.entries[best]
+        self.counters["hits"] += 1
+        self.latency_saved += max(latency - (time.monotonic() - started), 0.0)
+        return {**answer, "cached": True}, query
+
+    def store(self, user_id: str, query: ChatQuery, answer: Dict[str, Any]):
+        """Remember a fresh answer and how long it took to produce"""
+        answers = self._users.get(user_id)
+        if answers is None:
+            answers = self._users[user_id] = _UserAnswers(query.vector.shape[0])
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+                self.counters["user_evictions"] += 1
+        self._users.move_to_end(user_id)
+
+        # Answers about data that has since changed can never match again
+        current = np.array([entry[0] == query.fingerprint for entry in answers.entries], dtype=bool)
+        if not current.all():
+            self.counters["stale"] += int((~current).sum())
+            answers.remove(current)
+
+        answers.vectors = np.vstack([answers.vectors, query.vector[None, :].astype(np.float32)])
+        answers.entries.append((
+            query.fingerprint,
+            time.monotonic() + self.ttl_seconds,
+            answer,
+            time.monotonic() - query.started
+        ))
+        overflow = len(answers.entries) - self.max_entries_per_user
+        if overflow > 0:
+            answers.vectors = answers.vectors[overflow:]
+            del answers.entries[:overflow]
+            self.counters["evictions"] += overflow
+
+    def invalidate(self, user_id: str):
+        """Forget a user's answers, e.g. once new transactions have landed"""
+        if self._users.pop(user_id, None) is not None:
+            self.counters["invalidations"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.counters["hits"] + self.counters["misses"]
+        return {
+            **self.counters,
+            "users": len(self._users),
+            "entries": sum(len(answers.entries) for answers in self._users.values()),
+            "hit_rate": round(self.counters["hits"] / lookups, 4) if lookups else 0.0,
+            "latency_saved_seconds": round(self.latency_saved, 3)
+        }
+
+    def _expire(self, answers: _UserAnswers):
+        now = time.monotonic()
+        keep = np.array([entry[1] > now for entry in answers.entries], dtype=bool)
+        if not keep.all():
+            self.counters["expirations"] += int((~keep).sum())
+            answers.remove(keep)
+
+
+semantic_cache = SemanticCache(
+    threshold=settings.SEMANTIC_CACHE_THRESHOLD,
+    max_entries_per_user=settings.SEMANTIC_CACHE_MAX_ENTRIES_PER_USER,
+    max_users=settings.SEMANTIC_CACHE_MAX_USERS,
+    ttl_seconds=settings.SEMANTIC_CACHE_TTL_SECONDS
+)
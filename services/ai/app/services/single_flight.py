@@ -0,0 +1,289 @@
+"""Coalesce identical in-flight LLM work so concurrent callers share one upstream call"""
+
+import asyncio
+import json
+import time
+import uuid
+from collections import Counter
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from ..config import settings
+
+
+# Deletes the lock only while it still holds this leader's token
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class _Call:
+    """One in-flight call and the number of callers still waiting on it"""
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class _Broadcast:
+    """One in-flight stream whose chunks are replayed to every subscriber"""
+
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+        self.changed = asyncio.Condition()
+        self.task: Optional[asyncio.Task] = None
+
+
+class SingleFlight:
+    """Share one future per key between concurrent callers, in-process and across workers
+
+    The first caller for a key starts the work as a task; later callers await
+    the same task. The task is cancelled only when every waiter has gone away.
+    With Redis configured, the task first takes a per-key lock: the worker that
+    gets it calls upstream and publishes the result on a per-key channel, and
+    the others wait for that message instead of calling upstream themselves.
+    Values shared across workers must be JSON-serializable.
+    """
+
+    KEY_PREFIX = "single-flight:"
+
+    def __init__(
+        self,
+        redis_url: Optional[str] = None,
+        lease_seconds: float = 60.0,
+        wait_timeout: float = 60.0,
+        result_ttl: float = 2.0
+    ):
+        self.redis_url = redis_url
+        self.lease_seconds = lease_seconds
+        self.wait_timeout = wait_timeout
+        self.result_ttl = result_ttl
+        self.counters: Counter = Counter()
+        self._calls: Dict[str, _Call] = {}
+        self._streams: Dict[str, _Broadcast] = {}
+        self._redis = None
+        self._release = None
+
+    async def do(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """Await ``factory()``, or the identical call already in flight for ``key``"""
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.create_task(self._run(key, factory)))
+            call.task.add_done_callback(lambda _: self._forget(self._calls, key, call))
+            self._calls[key] = call
+            self.counters["leaders"] += 1
+        else:
+            self.counters["coalesced"] += 1
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # Everyone waiting has been cancelled, so nobody needs the answer
+                self._forget(self._calls, key, call)
+                call.task.cancel()
+                self.counters["abandoned"] += 1
+
+    async def stream(self, key: str, factory: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        """Iterate ``factory()``, or join the identical stream already in flight for ``key``
+
+        Late joiners first receive the chunks already produced, then follow live.
+        Streams are shared within this process only.
+        """
+        shared = self._streams.get(key)
+        if shared is None:
+            shared = _Broadcast()
+            shared.task = asyncio.create_task(self._pump(shared, factory))
+            shared.task.add_done_callback(lambda _: self._forget(self._streams, key, shared))
+            self._streams[key] = shared
+            self.counters["stream_leaders"] += 1
+        else:
+            self.counters["stream_coalesced"] += 1
+
+        shared.waiters += 1
+        position = 0
+        try:
+            while True:
+                async with shared.changed:
+                    await shared.changed.wait_for(lambda: position < len(shared.chunks) or shared.done)
+                while position < len(shared.chunks):
+                    position += 1
+                    yield shared.chunks[position - 1]
+                if shared.done and position == len(shared.chunks):
+                    if shared.error is not None:
+                        raise shared.error
+                    return
+        finally:
+            shared.waiters -= 1
+            if shared.waiters == 0 and not shared.task.done():
+                self._forget(self._streams, key, shared)
+                shared.task.cancel()
+                self.counters["abandoned"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "in_flight": len(self._calls),
+            "streams_in_flight": len(self._streams),
+            "shared": bool(self.redis_url)
+        }
+
+    @staticmethod
+    def _forget(calls: Dict[str, Any], key: str, call: Any):
+        """Drop a finished call, unless a newer one already replaced it"""
+        if calls.get(key) is call:
+            del calls[key]
+
+    async def _pump(self, shared: _Broadcast, factory: Callable[[], AsyncIterator[str]]):
+        """Read the upstream stream into the broadcast buffer"""
+        stream = factory()
+        try:
+            async for chunk in stream:
+                async with shared.changed:
+                    shared.chunks.append(chunk)
+                    shared.changed.notify_all()
+        except asyncio.CancelledError:
+            shared.error = asyncio.CancelledError()
+            raise
+        except Exception as e:
+            shared.error = e
+        finally:
+            await stream.aclose()
+            async with shared.changed:
+                shared.done = True
+                shared.changed.notify_all()
+
+    async def _run(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        client = self._get_redis()
+        if client is None:
+            return await factory()
+        try:
+            pubsub = client.pubsub()
+            await pubsub.subscribe(self.KEY_PREFIX + "channel:" + key)
+        except Exception:
+            self.counters["redis_errors"] += 1
+            return await factory()
+
+        try:
+            return await self._run_shared(client, pubsub, key, factory)
+        finally:
+            try:
+                await pubsub.aclose()
+            except Exception:
+                self.counters["redis_errors"] += 1
+
+    async def _run_shared(self, client, pubsub, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """Lead the call if the lock is free, otherwise wait for the leader's published result"""
+        lock_key = self.KEY_PREFIX + "lock:" + key
+        result_key = self.KEY_PREFIX + "result:" + key
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + self.wait_timeout
+
+        while True:
+            try:
+                # Checked after subscribing, so a result published in between is not missed
+                published = await client.get(result_key)
+                leader = published is None and await client.set(
+                    lock_key, token, nx=True, px=int(self.lease_seconds * 1000)
+                )
+            except Exception:
+                self.counters["redis_errors"] += 1
+                return await factory()
+
+            if published is not None:
+                return self._shared_result(published)
+
+            if leader:
+                return await self._lead(client, key, token, factory)
+
+            # Short waits so a leader that died is noticed once its lock lease runs out
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.counters["shared_timeouts"] += 1
+                return await factory()
+            try:
+                message = await pubsub.get_message(
+                    ignore_subscribe_messages=True,
+                    timeout=min(1.0, remaining)
+                )
+            except Exception:
+                self.counters["redis_errors"] += 1
+                return await factory()
+            if message is not None:
+                result = json.loads(message["data"])
+                if "error" in result:
+                    # The leader failed; try upstream rather than share its error
+                    return await factory()
+                self.counters["shared_hits"] += 1
+                return result["value"]
+
+    async def _lead(self, client, key: str, token: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        channel = self.KEY_PREFIX + "channel:" + key
+        try:
+            value = await factory()
+        except asyncio.CancelledError:
+            await self._publish(client, channel, {"error": "cancelled"})
+            await self._unlock(client, key, token)
+            raise
+        except Exception as e:
+            await self._publish(client, channel, {"error": str(e)})
+            await self._unlock(client, key, token)
+            raise
+
+        payload = {"value": value}
+        try:
+            await client.set(
+                self.KEY_PREFIX + "result:" + key,
+                json.dumps(payload),
+                px=int(self.result_ttl * 1000)
+            )
+        except Exception:
+            self.counters["redis_errors"] += 1
+        await self._publish(client, channel, payload)
+        await self._unlock(client, key, token)
+        return value
+
+    def _shared_result(self, published: Any) -> Any:
+        self.counters["shared_hits"] += 1
+        return json.loads(published)["value"]
+
+    async def _publish(self, client, channel: str, payload: Dict[str, Any]):
+        try:
+            await client.publish(channel, json.dumps(payload))
+        except Exception:
+            self.counters["redis_errors"] += 1
+
+    async def _unlock(self, client, key: str, token: str):
+        try:
+            await self._release(keys=[self.KEY_PREFIX + "lock:" + key], args=[token])
+        except Exception:
+            self.counters["redis_errors"] += 1
+
+    def _get_redis(self):
+        """Create the Redis client on first use"""
+        if not self.redis_url:
+            return None
+        if self._redis is None:
+            try:
+                import redis.asyncio as aioredis
+            except ImportError:
+                self.redis_url = None
+                return None
+            self._redis = aioredis.from_url(self.redis_url)
+            self._release = self._redis.register_script(RELEASE_SCRIPT)
+        return self._redis
+
+
+single_flight = SingleFlight(
+    redis_url=settings.REDIS_URL if settings.SINGLE_FLIGHT_REDIS_ENABLED else None,
+    lease_seconds=settings.SINGLE_FLIGHT_LEASE_SECONDS,
+    wait_timeout=settings.SINGLE_FLIGHT_WAIT_TIMEOUT,
+    result_ttl=settings.SINGLE_FLIGHT_RESULT_TTL
+)
@@ -0,0 +1,372 @@
+"""Vectorized spending analytics over columnar transaction arrays"""
+
+import re
+from typing import List, Dict, Any, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+from ..prompts.financial_prompts import INCOME_CATEGORIES
+from .transaction_categorizer import normalize_description
+from .transaction_index import RECURRENCE_WINDOWS
+from .transaction_store import TransactionColumns
+
+
+PERIOD_PATTERN = re.compile(r"last_(\d+)_(day|week|month|year)s?$")
+PERIOD_DAYS = {"day": 1, "week": 7, "month": 30, "year": 365}
+
+
+def period_start(time_period: str, today: Optional[np.datetime64] = None) -> Optional[np.datetime64]:
+    """First day covered by a period like last_30_days; None means all time"""
+    if time_period in ("last_year", "last_month", "last_week"):
+        time_period = f"last_1_{time_period[5:]}s"
+    match = PERIOD_PATTERN.match(time_period)
+    if not match:
+        return None
+    today = today if today is not None else np.datetime64("today", "D")
+    return today - np.timedelta64(int(match.group(1)) * PERIOD_DAYS[match.group(2)], "D")
+
+
+class SpendingAnalytics:
+    """Transactions converted once into NumPy columns for fast group-bys"""
+
+    def __init__(self, transactions: Union[Sequence[Any], TransactionColumns], series: Optional[List[Dict[str, Any]]] = None):
+        # Recurring series from a TransactionIndex, used instead of re-detecting them here
+        self.series = series
+        if isinstance(transactions, TransactionColumns):
+            # Already columnar, straight from the transaction store
+            frame = pd.DataFrame(transactions.columns())
+        else:
+            rows = [t if isinstance(t, dict) else t.dict() for t in transactions]
+            frame = pd.DataFrame.from_records(
+                rows, columns=["description", "amount", "date", "account_id", "category", "type"]
+            )
+        self.size = len(frame)
+
+        signed = pd.to_numeric(frame["amount"], errors="coerce").fillna(0.0).to_numpy(np.float64)
+        self.amounts = np.abs(signed)
+        self.dates = (
+            pd.to_datetime(frame["date"], errors="coerce", utc=True)
+            .dt.tz_localize(None)
+            .to_numpy("datetime64[D]")
+        )
+        self.valid_dates = ~np.isnat(self.dates)
+
+        categories = frame["category"].fillna("uncategorized").astype(str)
+        self.category_codes, category_index = pd.factorize(categories, sort=False)
+        self.category_names = np.asarray(category_index, dtype=object)
+
+        # An explicit type wins, then the category, then the sign of the amount
+        types = frame["type"].fillna("").astype(str).to_numpy()
+        explicit = types != ""
+        has_category = frame["category"].notna().to_numpy()
+        inferred_income = np.where(
+            has_category, categories.isin(INCOME_CATEGORIES).to_numpy(), signed > 0
+        )
+        self.is_income = np.where(explicit, types == "income", inferred_income)
+        self.is_expense = np.where(explicit, types == "expense", ~inferred_income)
+
+        # Normalize each distinct description once, then map back by code
+        raw_codes, raw_descriptions = pd.factorize(frame["description"].fillna("").astype(str))
+        normalized = [normalize_description(d) for d in raw_descriptions]
+        self.merchant_codes, merchant_index = pd.factorize(np.asarray(normalized, dtype=object)[raw_codes])
+        self.merchant_names = np.asarray(merchant_index, dtype=object)
+        self.descriptions = frame["description"].fillna("").astype(str).to_numpy(dtype=object)
+
+        self.account_codes, account_index = pd.factorize(frame["account_id"], sort=False)
+        self.account_names = np.asarray(account_index, dtype=object)
+
+    @classmethod
+    def for_period(
+        cls,
+        transactions: Sequence[Any],
+        time_period: str,
+        series: Optional[List[Dict[str, Any]]] = None
+    ) -> "SpendingAnalytics":
+        """Build analytics over the rows that fall inside a reporting period"""
+        analytics = cls(transactions, series)
+        start = period_start(time_period)
+        if start is None:
+            return analytics
+        return analytics.select(analytics.valid_dates & (analytics.dates >= start))
+
+    def select(self, mask: np.ndarray) -> "SpendingAnalytics":
+        """Row subset sharing this instance's dictionaries"""
+        subset = object.__new__(SpendingAnalytics)
+        for name in (
+            "amounts", "dates", "valid_dates", "category_codes", "is_income",
+            "is_expense", "merchant_codes", "descriptions", "account_codes"
+        ):
+            setattr(subset, name, getattr(self, name)[mask])
+        subset.category_names = self.category_names
+        subset.merchant_names = self.merchant_names
+        subset.account_names = self.account_names
+        subset.series = self.series
+        subset.size = int(mask.sum())
+        return subset
+
+    def totals(self) -> Dict[str, float]:
+        """Income, expenses and net over every row"""
+        income = float(self.amounts[self.is_income].sum())
+        expenses = float(self.amounts[self.is_expense].sum())
+        return {
+            "income": round(income, 2),
+            "expenses": round(expenses, 2),
+            "net": round(income - expenses, 2),
+            "transactions": self.size
+        }
+
+    def category_totals(self, kind: str = "expense") -> Dict[str, float]:
+        """Per-category totals, largest first"""
+        mask = self.is_expense if kind == "expense" else self.is_income
+        sums = np.bincount(
+            self.category_codes[mask],
+            weights=self.amounts[mask],
+            minlength=len(self.category_names)
+        )
+        order = np.argsort(-sums)
+        return {
+            str(self.category_names[i]): round(float(sums[i]), 2)
+            for i in order if sums[i] > 0
+        }
+
+    def monthly_burn(self, window: int = 3) -> List[Dict[str, Any]]:
+        """Income, expenses and rolling average expenses for every month in range"""
+        if not self.valid_dates.any():
+            return []
+
+        months = self.dates[self.valid_dates].astype("datetime64[M]")
+        first = months.min()
+        offsets = (months - first).astype(np.int64)
+        span = int(offsets.max()) + 1
+        amounts = self.amounts[self.valid_dates]
+
+        income = np.bincount(offsets, weights=amounts * self.is_income[self.valid_dates], minlength=span)
+        expenses = np.bincount(offsets, weights=amounts * self.is_expense[self.valid_dates], minlength=span)
+        cumulative = np.concatenate(([0.0], np.cumsum(expenses)))
+        counts = np.minimum(np.arange(1, span + 1), window)
+        rolling = (cumulative[1:] - cumulative[np.maximum(np.arange(1, span + 1) - window, 0)]) / counts
+
+        return [
+            {
+                "month": str(first + np.timedelta64(i, "M")),
+                "income": round(float(income[i]), 2),
+                "expenses": round(float(expenses[i]), 2),
+                "net": round(float(income[i] - expenses[i]), 2),
+                "rolling_expenses": round(float(rolling[i]), 2)
+            }
+            for i in range(span)
+        ]
+
+    def month_category_totals(self) -> Dict[str, Dict[str, Any]]:
+        """Mergeable per-month income, expenses, row count and expense by category"""
+        if not self.valid_dates.any():
+            return {}
+
+        months = self.dates[self.valid_dates].astype("datetime64[M]")
+        month_index, month_codes = np.unique(months, return_inverse=True)
+        amounts = self.amounts[self.valid_dates]
+        is_expense = self.is_expense[self.valid_dates]
+        width = len(self.category_names)
+
+        income = np.bincount(month_codes, weights=amounts * self.is_income[self.valid_dates], minlength=len(month_index))
+        counts = np.bincount(month_codes, minlength=len(month_index))
+        expenses = np.bincount(
+            month_codes * width + self.category_codes[self.valid_dates],
+            weights=amounts * is_expense,
+            minlength=len(month_index) * width
+        ).reshape(len(month_index), width)
+
+        return {
+            str(month): {
+                "income": round(float(income[i]), 2),
+                "expenses": round(float(expenses[i].sum()), 2),
+                "count": int(counts[i]),
+                "categories": {
+                    str(self.category_names[c]): round(float(expenses[i, c]), 2)
+                    for c in np.flatnonzero(expenses[i])
+                }
+            }
+            for i, month in enumerate(month_index)
+        }
+
+    def monthly_averages(self) -> Dict[str, float]:
+        """Average monthly income and expenses across the covered months"""
+        months = self.monthly_burn()
+        if not months:
+            return {"monthly_income": 0.0, "monthly_expenses": 0.0, "savings_rate": 0.0}
+
+        income = np.mean([m["income"] for m in months])
+        expenses = np.mean([m["expenses"] for m in months])
+        return {
+            "monthly_income": round(float(income), 2),
+            "monthly_expenses": round(float(expenses), 2),
+            "savings_rate": float((income - expenses) / income) if income > 0 else 0.0
+        }
+
+    def recurring_charges(self, min_occurrences: int = 3, max_amount_cv: float = 0.15) -> List[Dict[str, Any]]:
+        """Merchants charged at a regular interval with a stable amount"""
+        if self.series is not None:
+            return [r for r in self.series if r["direction"] == "expense"]
+
+        mask = self.is_expense & self.valid_dates
+        if mask.sum() < min_occurrences:
+            return []
+
+        codes = self.merchant_codes[mask]
+        dates = self.dates[mask].astype(np.int64)
+        amounts = self.amounts[mask]
+        order = np.lexsort((dates, codes))
+        codes, dates, amounts = codes[order], dates[order], amounts[order]
+
+        # Gap to the previous charge from the same merchant, NaN at group starts
+        gaps = np.diff(dates, prepend=dates[0]).astype(np.float64)
+        gaps[np.r_[True, codes[1:] != codes[:-1]]] = np.nan
+
+        frame = pd.DataFrame({"code": codes, "amount": amounts, "gap": gaps, "date": dates})
+        grouped = frame.groupby("code").agg(
+            occurrences=("amount", "size"),
+            mean_amount=("amount", "mean"),
+            std_amount=("amount", "std"),
+            median_gap=("gap", "median"),
+            last_date=("date", "max")
+        )
+        grouped = grouped[
+            (grouped["occurrences"] >= min_occurrences)
+            & (grouped["std_amount"].fillna(0) <= max_amount_cv * grouped["mean_amount"])
+        ]
+
+        recurring = []
+        for code, row in grouped.iterrows():
+            frequency = next(
+                (label for label, low, high in RECURRENCE_WINDOWS if low <= row["median_gap"] <= high),
+                None
+            )
+            if frequency is None:
+                continue
+            recurring.append({
+                "merchant": str(self.merchant_names[code]),
+                "frequency": frequency,
+                "average_amount": round(float(row["mean_amount"]), 2),
+                "occurrences": int(row["occurrences"]),
+                "last_date": str(np.datetime64(int(row["last_date"]), "D"))
+            })
+
+        recurring.sort(key=lambda r: r["average_amount"], reverse=True)
+        return recurring
+
+    def recurring_income(self) -> List[Dict[str, Any]]:
+        """Regular income such as salary; only known when built with series"""
+        return [r for r in self.series or [] if r["direction"] == "income"]
+
+    def anomaly_scores(self) -> np.ndarray:
+        """Robust z-score of each expense against its category (median/MAD)"""
+        scores = np.zeros(self.size)
+        if not self.is_expense.any():
+            return scores
+
+        amounts = pd.Series(self.amounts[self.is_expense])
+        groups = self.category_codes[self.is_expense]
+        median = amounts.groupby(groups).transform("median")
+        mad = (amounts - median).abs().groupby(groups).transform("median")
+        robust = np.where(mad > 0, 0.6745 * (amounts - median) / mad.replace(0, np.nan), 0.0)
+        scores[self.is_expense] = np.nan_to_num(robust)
+        return scores
+
+    def anomalies(self, threshold: float = 3.5, limit: int = 5) -> List[Dict[str, Any]]:
+        """Expenses far above what is typical for their category"""
+        scores = self.anomaly_scores()
+        flagged = np.flatnonzero(scores > threshold)
+        flagged = flagged[np.argsort(-scores[flagged])][:limit]
+        return [
+            {
+                "description": str(self.descriptions[i]),
+                "category": str(self.category_names[self.category_codes[i]]),
+                "amount": round(float(self.amounts[i]), 2),
+                "date": str(self.dates[i]) if self.valid_dates[i] else None,
+                "score": round(float(scores[i]), 2)
+            }
+            for i in flagged
+        ]
+
+    def health_score(self) -> float:
+        """0-100 score from savings rate, spending stability and anomalies"""
+        if not self.size:
+            return 0.0
+
+        averages = self.monthly_averages()
+        expenses = np.array([m["expenses"] for m in self.monthly_burn()])
+
+        savings = np.clip(averages["savings_rate"] / 0.2, 0.0, 1.0) * 60
+        volatility = float(expenses.std() / expenses.mean()) if expenses.size and expenses.mean() > 0 else 0.0
+        stability = (1 - np.clip(volatility, 0.0, 1.0)) * 25
+        expense_rows = max(int(self.is_expense.sum()), 1)
+        anomaly_share = float((self.anomaly_scores() > 3.5).sum()) / expense_rows
+        calm = (1 - np.clip(anomaly_share * 10, 0.0, 1.0)) * 15
+
+        return round(float(savings + stability + calm), 1)
+
+    def summary(self, top_k: int = 3, compact: bool = False) -> str:
+        """Plain-text summary used as prompt context
+
+        ``compact`` folds recurring charges and unusual expenses into single
+        bucketed lines for prompts that would otherwise exceed their budget.
+        """
+        if not self.size:
+            return "No recent transactions available."
+
+        totals = self.totals()
+        top_categories = list(self.category_totals().items())[:top_k]
+        lines = [
+            f"- Total Income: ${totals['income']:.2f}",
+            f"- Total Expenses: ${totals['expenses']:.2f}",
+            f"- Number of Transactions: {totals['transactions']}",
+            f"- Top Spending Categories: {', '.join([f'{cat}: ${amt:.2f}' for cat, amt in top_categories])}",
+        ]
+
+        months = self.monthly_burn()
+        if len(months) > 1:
+            lines.append(
+                f"- Rolling Monthly Expenses: ${months[-1]['rolling_expenses']:.2f} "
+                f"(latest month ${months[-1]['expenses']:.2f})"
+            )
+
+        recurring = self.recurring_charges()
+        income = self.recurring_income()
+        anomalies = self.anomalies(limit=top_k)
+        if compact:
+            if recurring:
+                monthly = sum(r["average_amount"] for r in recurring if r["frequency"] == "monthly")
+                lines.append(f"- Recurring Charges: {len(recurring)} (${monthly:.2f}/month)")
+            if income:
+                lines.append(f"- Recurring Income: {len(income)} sources")
+            if anomalies:
+                lines.append(f"- Unusual Expenses: {len(anomalies)} totaling ${sum(a['amount'] for a in anomalies):.2f}")
+            return "\n" + "\n".join(lines) + "\n"
+
+        if recurring:
+            charges = ", ".join(
+                f"{r['merchant']} ${r['average_amount']:.2f} {r['frequency']}" for r in recurring[:top_k]
+            )
+            lines.append(f"- Recurring Charges: {charges}")
+
+        if income:
+            sources = ", ".join(
+                f"{r['merchant']} ${r['average_amount']:.2f} {r['frequency']}" for r in income[:top_k]
+            )
+            lines.append(f"- Recurring Income: {sources}")
+
+        if anomalies:
+            unusual = ", ".join(f"{a['description']} ${a['amount']:.2f}" for a in anomalies)
+            lines.append(f"- Unusual Expenses: {unusual}")
+
+        return "\n" + "\n".join(lines) + "\n"
+
+    def recommendation_data(self, total_balance: float = 0.0, goals: Optional[List[Dict]] = None) -> Dict[str, Any]:
+        """Figures in the shape get_recommendation_prompt expects"""
+        return {
+            "total_balance": total_balance,
+            **self.monthly_averages(),
+            "top_categories": list(self.category_totals())[:3],
+            "goals": goals or []
+        }
@@ -0,0 +1,278 @@
+"""Incremental CSV and OFX statement parsing that feeds categorization in bounded chunks"""
+
+import asyncio
+import codecs
+import csv
+import html
+import re
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from ..config import settings
+
+
+# Lower-cased CSV header names accepted for each transaction field
+CSV_COLUMNS = {
+    "date": ("date", "transaction date", "posted date", "posting date", "posted", "booking date"),
+    "description": ("description", "payee", "name", "merchant", "details", "narrative", "memo"),
+    "amount": ("amount", "value", "transaction amount"),
+    "debit": ("debit", "withdrawal", "withdrawals", "money out"),
+    "credit": ("credit", "deposit", "deposits", "money in"),
+    "category": ("category",),
+    "id": ("id", "transaction id", "reference", "fitid")
+}
+
+CSV_DELIMITERS = ",;\t|"
+
+CONTENT_TYPES = {
+    "text/csv": "csv",
+    "application/csv": "csv",
+    "application/ofx": "ofx",
+    "application/x-ofx": "ofx"
+}
+
+OFX_FIELD = re.compile(r"<(\w+)>([^<\r\n]*)")
+OFX_OPEN = "<STMTTRN>"
+OFX_CLOSE = "</STMTTRN>"
+
+
+class StatementParseError(ValueError):
+    """Raised when an uploaded statement cannot be read"""
+
+
+class CSVStatementParser:
+    """Reads a CSV export one record at a time, holding at most one unfinished record"""
+
+    def __init__(self, max_record_chars: int):
+        self.max_record_chars = max_record_chars
+        self.skipped = 0
+        self._partial = ""
+        self._record: List[str] = []
+        self._quotes = 0
+        self._delimiter: Optional[str] = None
+        self._columns: Optional[Dict[str, int]] = None
+
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        """Consume more text and return the transactions completed by it"""
+        lines = (self._partial + text).split("\n")
+        self._partial = lines.pop()
+        rows = [row for row in map(self._line, lines) if row is not None]
+        if len(self._partial) + sum(map(len, self._record)) > self.max_record_chars:
+            raise StatementParseError(f"CSV record longer than {self.max_record_chars} characters")
+        return rows
+
+    def close(self) -> List[Dict[str, Any]]:
+        """Flush the last line once the upload has ended"""
+        rows = self.feed("\n") if self._partial else []
+        if self._record:
+            raise StatementParseError("CSV ends inside a quoted field")
+        if self._columns is None:
+            raise StatementParseError("CSV statement has no header row")
+        return rows
+
+    def _line(self, line: str) -> Optional[Dict[str, Any]]:
+        # Quotes balance at the end of a record, even with "" escapes inside fields
+        self._record.append(line)
+        self._quotes += line.count('"')
+        if self._quotes % 2:
+            return None
+        record = "\n".join(self._record).rstrip("\r")
+        self._record = []
+        self._quotes = 0
+        if not record.strip():
+            return None
+
+        if self._delimiter is None:
+            self._delimiter = max(CSV_DELIMITERS, key=record.count)
+        fields = next(csv.reader([record], delimiter=self._delimiter))
+        if self._columns is None:
+            self._columns = self._header(fields)
+            return None
+        return self._transaction(fields)
+
+    def _header(self, fields: List[str]) -> Dict[str, int]:
+        names = [field.strip().lower() for field in fields]
+        columns = {}
+        for key, aliases in CSV_COLUMNS.items():
+            index = next((names.index(alias) for alias in aliases if alias in names), None)
+            if index is not None:
+                columns[key] = index
+        if "description" not in columns or not {"amount", "debit", "credit"} & columns.keys():
+            raise StatementParseError(
+                "CSV header needs a description column and an amount or debit/credit column"
+            )
+        return columns
+
+    def _transaction(self, fields: List[str]) -> Optional[Dict[str, Any]]:
+        def value(key: str) -> str:
+            index = self._columns.get(key)
+            return fields[index].strip() if index is not None and index < len(fields) else ""
+
+        amount = parse_amount(value("amount"))
+        if amount is None and ("debit" in self._columns or "credit" in self._columns):
+            debit, credit = parse_amount(value("debit")), parse_amount(value("credit"))
+            if debit is not None or credit is not None:
+                amount = (credit or 0.0) - abs(debit or 0.0)
+
+        description = value("description")
+        if amount is None or not description:
+            self.skipped += 1
+            return None
+        return _row(value("id"), description, amount, value("date"), value("category") or None)
+
+
+class OFXStatementParser:
+    """Reads STMTTRN blocks from OFX 1.x (SGML) or 2.x (XML) as they close"""
+
+    def __init__(self, max_record_chars: int):
+        self.max_record_chars = max_record_chars
+        self.skipped = 0
+        self._buffer = ""
+        self._seen_statement = False
+
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        """Consume more text and return the transactions completed by it"""
+        self._buffer += text
+        rows = []
+        while True:
+            start = self._buffer.find(OFX_OPEN)
+            if start < 0:
+                # Keep just enough to match an opening tag split across chunks
+                self._seen_statement = self._seen_statement or "<OFX>" in self._buffer
+                self._buffer = self._buffer[-len(OFX_OPEN):]
+                break
+            self._seen_statement = True
+            end = self._buffer.find(OFX_CLOSE, start)
+            if end < 0:
+                self._buffer = self._buffer[start:]
+                if len(self._buffer) > self.max_record_chars:
+                    raise StatementParseError(
+                        f"OFX transaction longer than {self.max_record_chars} characters"
+                    )
+                break
+            row = self._transaction(self._buffer[start + len(OFX_OPEN):end])
+            self._buffer = self._buffer[end + len(OFX_CLOSE):]
+            if row is None:
+                self.skipped += 1
+            else:
+                rows.append(row)
+        return rows
+
+    def close(self) -> List[Dict[str, Any]]:
+        """Check the upload ended on a whole statement"""
+        if OFX_OPEN in self._buffer:
+            raise StatementParseError("OFX ends inside a transaction")
+        if not self._seen_statement:
+            raise StatementParseError("Not an OFX statement")
+        return []
+
+    def _transaction(self, block: str) -> Optional[Dict[str, Any]]:
+        fields = {tag.upper(): html.unescape(value.strip()) for tag, value in OFX_FIELD.findall(block)}
+        amount = parse_amount(fields.get("TRNAMT", ""))
+        description = fields.get("NAME") or fields.get("MEMO") or fields.get("PAYEE") or ""
+        if amount is None or not description:
+            return None
+        posted = fields.get("DTPOSTED", "")
+        # OFX dates are YYYYMMDD optionally followed by a time and zone
+        date = f"{posted[:4]}-{posted[4:6]}-{posted[6:8]}" if len(posted) >= 8 else posted
+        return _row(fields.get("FITID"), description, amount, date)
+
+
+def _row(
+    transaction_id: Optional[str],
+    description: str,
+    amount: float,
+    date: str,
+    category: Optional[str] = None
+) -> Dict[str, Any]:
+    """Transaction in the shape the categorization pipeline takes"""
+    row = {"description": description, "amount": amount, "date": date, "category": category}
+    if transaction_id:
+        row["id"] = transaction_id
+    return row
+
+
+def parse_amount(text: str) -> Optional[float]:
+    """Parse '1,234.56', '$-12.00' or '(12.00)' style amounts, None when empty or malformed"""
+    text = text.strip().replace(",", "").replace("$", "").replace(" ", "")
+    negative = text.startswith("(") and text.endswith(")")
+    try:
+        amount = float(text.strip("()"))
+    except ValueError:
+        return None
+    return -abs(amount) if negative else amount
+
+
+def create_parser(statement_format: Optional[str], content_type: Optional[str], head: bytes):
+    """Parser for an explicit format, else the content type, else what the upload starts with"""
+    if not statement_format:
+        statement_format = CONTENT_TYPES.get((content_type or "").split(";")[0].strip().lower())
+    if not statement_format:
+        sniffed = head.lstrip(b"\xef\xbb\xbf \t\r\n")[:1024].upper()
+        statement_format = "ofx" if sniffed.startswith(b"OFXHEADER") or b"<OFX>" in sniffed else "csv"
+
+    parsers = {"csv": CSVStatementParser, "ofx": OFXStatementParser}
+    if statement_format.lower() not in parsers:
+        raise StatementParseError(f"Unsupported statement format: {statement_format}")
+    return parsers[statement_format.lower()](settings.IMPORT_MAX_RECORD_BYTES)
+
+
+async def categorize_statement(
+    chunks: AsyncIterator[bytes],
+    parser: Any,
+    llm_service: Any,
+    admit: Optional[Callable[[int], Awaitable[None]]] = None,
+    user_id: Optional[str] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """Categorize an uploaded statement chunk by chunk, yielding each result as it is ready
+
+    Parsing runs ahead of categorization by at most IMPORT_MAX_PENDING_CHUNKS
+    chunks; beyond that the upload is not read, so memory stays flat however
+    large the file is. ``admit`` is awaited with each chunk's row count before
+    it is categorized and may raise to stop the import.
+    """
+    pending: asyncio.Queue = asyncio.Queue(maxsize=settings.IMPORT_MAX_PENDING_CHUNKS)
+
+    async def read():
+        decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+        rows: List[Dict[str, Any]] = []
+        try:
+            async for chunk in chunks:
+                rows.extend(parser.feed(decoder.decode(chunk)))
+                while len(rows) >= settings.IMPORT_CHUNK_ROWS:
+                    await pending.put(rows[:settings.IMPORT_CHUNK_ROWS])
+                    rows = rows[settings.IMPORT_CHUNK_ROWS:]
+            rows.extend(parser.feed(decoder.decode(b"", final=True)))
+            rows.extend(parser.close())
+            if rows:
+                await pending.put(rows)
+            await pending.put(None)
+        except Exception as e:
+            await pending.put(e)
+
+    reader = asyncio.create_task(read())
+    offset = 0
+    try:
+        while (rows := await pending.get()) is not None:
+            if isinstance(rows, Exception):
+                raise rows
+            if admit is not None:
+                await admit(len(rows))
+
+            results = llm_service.stream_categorizations(rows, user_id=user_id)
+            try:
+                async for index, result in results:
+                    row = rows[index]
+                    yield {
+                        "index": offset + index,
+                        "date": row["date"],
+                        "description": row["description"],
+                        "amount": row["amount"],
+                        **result
+                    }
+            finally:
+                await results.aclose()
+            offset += len(rows)
+
+        yield {"done": True, "rows": offset, "skipped": parser.skipped}
+    finally:
+        reader.cancel()
@@ -0,0 +1,168 @@
+"""JSON schemas for structured LLM output and an incremental parser for streamed responses"""
+
+import json
+from collections import Counter
+from typing import Dict, Any, List, Optional, Tuple
+
+from ..prompts.financial_prompts import INCOME_CATEGORIES, EXPENSE_CATEGORIES
+
+
+CATEGORIES = set(INCOME_CATEGORIES) | set(EXPENSE_CATEGORIES)
+
+# Function definitions sent as forced tool calls, so the provider returns arguments
+# matching the schema instead of free text
+CATEGORIZATION_SCHEMA = {
+    "name": "record_categorizations",
+    "description": "Record the category chosen for each numbered transaction",
+    "parameters": {
+        "type": "object",
+        "properties": {
+            "results": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "index": {"type": "integer", "minimum": 1},
+                        "category": {"type": "string", "enum": sorted(CATEGORIES)},
+                        "confidence": {"type": "number", "minimum": 0, "maximum": 1},
+                        "reasoning": {"type": "string"}
+                    },
+                    "required": ["index", "category", "confidence", "reasoning"]
+                }
+            }
+        },
+        "required": ["results"]
+    }
+}
+
+INSIGHTS_SCHEMA = {
+    "name": "record_insights",
+    "description": "Record financial insights about the user's spending",
+    "parameters": {
+        "type": "object",
+        "properties": {
+            "insights": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "type": {"type": "string"},
+                        "title": {"type": "string"},
+                        "description": {"type": "string"},
+                        "confidence": {"type": "number", "minimum": 0, "maximum": 1}
+                    },
+                    "required": ["type", "title", "description", "confidence"]
+                }
+            }
+        },
+        "required": ["insights"]
+    }
+}
+
+# Items parsed, rejected by validation and rows sent again, since startup
+stats: Counter = Counter()
+
+
+class JSONItemStream:
+    """Incremental parser that yields each object inside a JSON array as soon as it closes
+
+    Text before the first brace is ignored, so it also copes with a short
+    preamble from providers that return JSON as plain text.
+    """
+
+    def __init__(self):
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._item_depth: Optional[int] = None
+        self._item: List[str] = []
+        self._started = False
+
+    @property
+    def complete(self) -> bool:
+        """Whether a whole top-level JSON value has been read"""
+        return self._started and not self._stack
+
+    def feed(self, chunk: str) -> List[Any]:
+        """Consume more text and return the array items completed by it"""
+        items = []
+        for char in chunk:
+            if self._item_depth is not None:
+                self._item.append(char)
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if char == '"':
+                self._in_string = self._started
+            elif char in "{[":
+                if char == "{" and self._stack and self._stack[-1] == "[" and self._item_depth is None:
+                    self._item_depth = len(self._stack)
+                    self._item = [char]
+                self._stack.append(char)
+                self._started = True
+            elif char in "}]" and self._stack:
+                self._stack.pop()
+                if self._item_depth is not None and len(self._stack) == self._item_depth:
+                    try:
+                        items.append(json.loads("".join(self._item)))
+                    except ValueError:
+                        stats["invalid"] += 1
+                    self._item_depth = None
+                    self._item = []
+
+        stats["items"] += len(items)
+        return items
+
+
+def validate_categorization(item: Any, size: int) -> Optional[Tuple[int, Dict[str, Any]]]:
+    """Row number and category data for a valid batch item, otherwise None"""
+    if not isinstance(item, dict):
+        stats["invalid"] += 1
+        return None
+
+    index = item.get("index")
+    category = item.get("category")
+    try:
+        confidence = float(item.get("confidence"))
+    except (TypeError, ValueError):
+        confidence = -1.0
+
+    if (
+        not isinstance(index, int) or isinstance(index, bool) or not 1 <= index <= size
+        or category not in CATEGORIES
+        or not 0.0 <= confidence <= 1.0
+    ):
+        stats["invalid"] += 1
+        return None
+
+    return index, {
+        "category": category,
+        "confidence": confidence,
+        "reasoning": str(item.get("reasoning") or "")
+    }
+
+
+def validate_insight(item: Any) -> Optional[Dict[str, Any]]:
+    """Insight in the response shape, or None when required fields are missing"""
+    if not isinstance(item, dict) or not item.get("title") or not item.get("description"):
+        stats["invalid"] += 1
+        return None
+
+    try:
+        confidence = min(max(float(item.get("confidence", 0.8)), 0.0), 1.0)
+    except (TypeError, ValueError):
+        confidence = 0.8
+
+    return {
+        "type": str(item.get("type") or "insight"),
+        "title": str(item["title"]),
+        "description": str(item["description"]),
+        "confidence": confidence
+    }
@@ -0,0 +1,280 @@
+"""Deterministic and local-model categorization tiers that run ahead of the LLM"""
+
+import asyncio
+import re
+from collections import Counter, deque
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Tuple
+
+from ..config import settings
+from ..prompts.financial_prompts import INCOME_CATEGORIES, EXPENSE_CATEGORIES
+
+
+# Tiers reported back on each categorization result
+TIER_RULES = "rules"
+TIER_LOCAL_MODEL = "local_model"
+TIER_SERIES = "series"
+TIER_LLM = "llm"
+TIER_FALLBACK = "fallback"
+
+# Merchant keywords matched as whole words against normalized descriptions
+MERCHANT_RULES: Dict[str, List[str]] = {
+    "salary": ["payroll", "direct dep", "direct deposit", "salary", "paycheck", "adp"],
+    "freelance": ["upwork", "fiverr", "toptal"],
+    "investment": ["dividend", "interest paid", "vanguard", "fidelity", "schwab", "robinhood"],
+    "food": [
+        "mcdonalds", "starbucks", "chipotle", "subway", "dunkin", "doordash", "grubhub",
+        "uber eats", "ubereats", "postmates", "whole foods", "trader joe", "safeway",
+        "kroger", "instacart", "restaurant", "cafe", "coffee", "pizza"
+    ],
+    "transport": [
+        "uber trip", "uber", "lyft", "shell", "chevron", "exxon", "bp", "parking",
+        "metro", "transit", "mta", "amtrak", "toll"
+    ],
+    "housing": ["rent", "mortgage", "hoa", "property mgmt", "apartments"],
+    "utilities": [
+        "comcast", "xfinity", "verizon", "at t", "t mobile", "pg e", "con ed",
+        "electric", "water bill", "internet", "spectrum"
+    ],
+    "healthcare": ["cvs", "walgreens", "pharmacy", "clinic", "hospital", "dental", "medical"],
+    "entertainment": [
+        "netflix", "spotify", "hulu", "disney plus", "hbo", "youtube premium",
+        "steam", "playstation", "xbox", "cinema", "amc", "ticketmaster"
+    ],
+    "shopping": ["amazon", "amzn", "target", "walmart", "costco", "best buy", "ebay", "etsy", "ikea"],
+    "education": ["coursera", "udemy", "tuition", "university", "college", "bookstore"],
+    "savings": ["transfer to savings", "savings transfer"],
+}
+
+# Patterns that keyword matching cannot express
+REGEX_RULES: List[Tuple[str, str, float]] = [
+    (r"\b(payroll\w*|direct dep\w*)\b", "salary", 0.97),
+    (r"\binvoice\b.*\b(payment|paid)\b", "freelance", 0.85),
+    (r"\b(zelle|venmo|paypal) from\b", "other_income", 0.8),
+    (r"\b(atm|cash) withdrawal\b", "other_expense", 0.9),
+]
+
+# Short descriptions used by the local classifier to embed each category
+CATEGORY_DESCRIPTIONS: Dict[str, str] = {
+    "salary": "salary payroll paycheck direct deposit from employer",
+    "freelance": "freelance contract client payment invoice",
+    "investment": "investment dividend interest brokerage returns",
+    "business": "business revenue sales income",
+    "other_income": "refund reimbursement gift other income",
+    "food": "restaurant groceries coffee food delivery dining",
+    "transport": "rideshare taxi fuel gas station parking public transit",
+    "housing": "rent mortgage landlord property",
+    "utilities": "electricity water internet phone bill utilities",
+    "healthcare": "pharmacy doctor hospital dental medical",
+    "entertainment": "streaming movies music games concerts subscription",
+    "shopping": "retail store online shopping clothing electronics",
+    "education": "tuition course books school university",
+    "savings": "transfer to savings account",
+    "other_expense": "miscellaneous expense",
+}
+
+# Card-processor noise stripped before matching
+NOISE_PATTERN = re.compile(r"\b(pos|purchase|debit|credit|card|checkcard|recurring|pending|ach|www|com|inc|llc)\b")
+
+
+def normalize_description(description: str) -> str:
+    """Lowercase a description and strip punctuation, digits and processor noise"""
+    text = re.sub(r"[^a-z ]+", " ", description.lower())
+    text = NOISE_PATTERN.sub(" ", text)
+    return " ".join(text.split())
+
+
+class MerchantRuleIndex:
+    """Aho-Corasick automaton over merchant keywords plus a regex fallback"""
+
+    def __init__(
+        self,
+        merchant_rules: Dict[str, List[str]],
+        regex_rules: List[Tuple[str, str, float]],
+        confidence: float = 0.95
+    ):
+        self.confidence = confidence
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[Tuple[str, str]]] = [[]]
+
+        for category, keywords in merchant_rules.items():
+            for keyword in keywords:
+                self._add(f" {normalize_description(keyword)} ", category)
+        self._build_fail_links()
+
+        self.regex_rules = [
+            (re.compile(pattern), category, confidence)
+            for pattern, category, confidence in regex_rules
+        ]
+
+    def _add(self, keyword: str, category: str):
+        """Insert a keyword into the trie"""
+        node = 0
+        for char in keyword:
+            if char not in self._goto[node]:
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+                self._goto[node][char] = len(self._goto) - 1
+            node = self._goto[node][char]
+        self._output[node].append((keyword, category))
+
+    def _build_fail_links(self):
+        """Compute failure links breadth-first so matching is a single pass"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(char, 0)
+                self._fail[child] = target if target != child else 0
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+    def match(self, description: str) -> Optional[Dict[str, Any]]:
+        """Return the most specific rule that matches a description"""
+        text = f" {normalize_description(description)} "
+        best: Optional[Tuple[str, str]] = None
+
+        node = 0
+        for char in text:
+            while node and char not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(char, 0)
+            for keyword, category in self._output[node]:
+                if best is None or len(keyword) > len(best[0]):
+                    best = (keyword, category)
+
+        if best:
+            return {
+                "category": best[1],
+                "confidence": self.confidence,
+                "reasoning": f"Matched merchant rule \"{best[0].strip()}\""
+            }
+
+        for pattern, category, confidence in self.regex_rules:
+            if pattern.search(text):
+                return {
+                    "category": category,
+                    "confidence": confidence,
+                    "reasoning": f"Matched pattern rule \"{pattern.pattern}\""
+                }
+
+        return None
+
+
+class LocalCategoryClassifier:
+    """Nearest-category classifier over sentence-transformers embeddings"""
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+        import numpy as np
+
+        self._np = np
+        self.model = SentenceTransformer(model_name)
+        self.categories = INCOME_CATEGORIES + EXPENSE_CATEGORIES
+        self.category_vectors = self.model.encode(
+            [f"{c}: {CATEGORY_DESCRIPTIONS[c]}" for c in self.categories],
+            normalize_embeddings=True
+        )
+
+    def classify(self, descriptions: List[str]) -> List[Dict[str, Any]]:
+        """Score descriptions against every category in one matrix product"""
+        np = self._np
+        vectors = self.model.encode(descriptions, normalize_embeddings=True, batch_size=64)
+        scores = vectors @ self.category_vectors.T
+        best = scores.argmax(axis=1)
+        # Squash cosine similarity into a confidence comparable with the LLM's
+        confidence = np.clip((scores[np.arange(len(best)), best] - 0.2) / 0.6, 0.0, 1.0)
+
+        return [
+            {
+                "category": self.categories[index],
+                "confidence": round(float(conf), 3),
+                "reasoning": f"Closest category by local model ({self.categories[index]})"
+            }
+            for index, conf in zip(best, confidence)
+        ]
+
+
+@lru_cache(maxsize=1)
+def get_rule_index() -> MerchantRuleIndex:
+    """Compile the merchant rule table once per process"""
+    return MerchantRuleIndex(MERCHANT_RULES, REGEX_RULES)
+
+
+@lru_cache(maxsize=1)
+def get_local_classifier() -> Optional[LocalCategoryClassifier]:
+    """Load the optional local model once per process"""
+    if not settings.CATEGORIZATION_LOCAL_MODEL:
+        return None
+    try:
+        return LocalCategoryClassifier(settings.CATEGORIZATION_LOCAL_MODEL)
+    except ImportError:
+        return None
+
+
+class TransactionCategorizer:
+    """Answers what it can without the LLM and reports which tier answered"""
+
+    stats: Counter = Counter()
+
+    def __init__(self, confidence_threshold: Optional[float] = None):
+        self.confidence_threshold = (
+            confidence_threshold
+            if confidence_threshold is not None
+            else settings.CATEGORIZATION_CONFIDENCE_THRESHOLD
+        )
+        self.rules = get_rule_index()
+
+    async def categorize(self, transactions: List[Dict[str, Any]]) -> List[Optional[Dict[str, Any]]]:
+        """Return category data per row, or None where the LLM must decide"""
+        results: List[Optional[Dict[str, Any]]] = []
+        for transaction in transactions:
+            match = self.rules.match(transaction["description"])
+            if match and match["confidence"] >= self.confidence_threshold and _fits_direction(transaction, match):
+                results.append({**match, "tier": TIER_RULES})
+            else:
+                results.append(None)
+
+        remaining = [i for i, result in enumerate(results) if result is None]
+        classifier = get_local_classifier() if remaining else None
+        if classifier:
+            predictions = await asyncio.to_thread(
+                classifier.classify,
+                [transactions[i]["description"] for i in remaining]
+            )
+            for index, prediction in zip(remaining, predictions):
+                if prediction["confidence"] >= self.confidence_threshold and _fits_direction(
+                    transactions[index], prediction
+                ):
+                    results[index] = {**prediction, "tier": TIER_LOCAL_MODEL}
+
+        for result in results:
+            if result:
+                self.stats[result["tier"]] += 1
+        return results
+
+    @classmethod
+    def record(cls, tier: str, count: int = 1):
+        """Count rows answered outside the fast path"""
+        cls.stats[tier] += count
+
+
+def _fits_direction(transaction: Dict[str, Any], category_data: Dict[str, Any]) -> bool:
+    """Whether a category matches the row's direction, e.g. so an "AMAZON REFUND" credit is not shopping
+
+    An explicit type wins, then the sign of the amount; a zero amount fits either.
+    """
+    kind = transaction.get("type")
+    if kind in ("income", "expense"):
+        income = kind == "income"
+    else:
+        amount = float(transaction.get("amount") or 0)
+        if amount == 0:
+            return True
+        income = amount > 0
+    return (category_data["category"] in INCOME_CATEGORIES) == income
@@ -0,0 +1,225 @@
+"""Hash index that spots duplicate transactions and groups recurring series"""
+
+import datetime
+from collections import OrderedDict
+from statistics import mean, median, pstdev
+from typing import List, Dict, Any, Optional, Tuple
+
+from ..config import settings
+from ..prompts.financial_prompts import INCOME_CATEGORIES
+from .transaction_categorizer import normalize_description
+
+
+# Median gap in days -> recurrence label
+RECURRENCE_WINDOWS = [
+    ("weekly", 5, 9),
+    ("biweekly", 12, 16),
+    ("monthly", 26, 35),
+    ("quarterly", 85, 97),
+    ("yearly", 350, 380),
+]
+
+# Unpaired pending/posted rows kept per key, occurrences per series and ids remembered
+MAX_DUPLICATE_DATES = 8
+MAX_SERIES_OCCURRENCES = 36
+MAX_IDS = 50000
+
+
+def _day(date: Any) -> Optional[int]:
+    """Day number of an ISO date or datetime string, None when it cannot be read"""
+    try:
+        return datetime.date.fromisoformat(str(date)[:10]).toordinal()
+    except ValueError:
+        return None
+
+
+def _is_income(transaction: Dict[str, Any]) -> bool:
+    """An explicit type wins, then the category, then the sign of the amount"""
+    if transaction.get("type"):
+        return transaction["type"] == "income"
+    if transaction.get("category"):
+        return transaction["category"] in INCOME_CATEGORIES
+    return float(transaction.get("amount") or 0) > 0
+
+
+class _Series:
+    """Transactions from one account to or from one normalized merchant"""
+
+    __slots__ = ("description", "income", "days", "amounts", "label")
+
+    def __init__(self, description: str, income: bool):
+        self.description = description
+        self.income = income
+        self.days: List[int] = []
+        self.amounts: List[float] = []
+        self.label: Optional[Dict[str, Any]] = None
+
+    def add(self, day: Optional[int], amount: float):
+        if day is not None:
+            self.days.append(day)
+            self.amounts.append(abs(amount))
+            if len(self.days) > MAX_SERIES_OCCURRENCES:
+                del self.days[0], self.amounts[0]
+
+
+class TransactionIndex:
+    """Duplicate detection in O(1) per row and recurring-series grouping
+
+    Only exact evidence makes a row a duplicate: an id already seen, or for
+    rows without an id, the same account, raw description, date and amount
+    already seen by this index, i.e. within one payload. The one fuzzy match
+    is an explicit pending/posted pair: a ``pending`` row and a posted row
+    on the same account, normalized merchant and amount, posted up to
+    ``date_window_days`` later. Repeat purchases otherwise all count.
+    Each (account, normalized description, direction) forms a series whose
+    category label is reused for later rows.
+    """
+
+    def __init__(self, date_window_days: Optional[int] = None):
+        self.date_window_days = (
+            date_window_days if date_window_days is not None else settings.DEDUP_DATE_WINDOW_DAYS
+        )
+        self._ids: "OrderedDict[Any, None]" = OrderedDict()
+        # Pending and posted rows not yet paired, by (account, normalized description, cents)
+        self._unpaired: Dict[Tuple[str, str, int], List[Tuple[Optional[int], bool]]] = {}
+        self._series: Dict[Tuple[str, str, bool], _Series] = {}
+
+    @staticmethod
+    def series_key(transaction: Dict[str, Any]) -> Tuple[str, str, bool]:
+        return (
+            str(transaction.get("account_id") or ""),
+            normalize_description(str(transaction.get("description") or "")),
+            _is_income(transaction)
+        )
+
+    def add(self, transaction: Dict[str, Any]) -> Tuple[bool, Tuple[str, str, bool]]:
+        """Index a row; returns whether it duplicates an earlier one, and its series key"""
+        series_key = self.series_key(transaction)
+        amount = float(transaction.get("amount") or 0)
+        cents = round(amount * 100)
+        transaction_id = transaction.get("id")
+        if transaction_id in (None, "", "unknown"):
+            # Without an id only an identical row is the same transaction
+            identity: Any = (
+                series_key[0],
+                str(transaction.get("description") or ""),
+                str(transaction.get("date") or "")[:10],
+                cents
+            )
+        else:
+            identity = str(transaction_id)
+        if identity in self._ids:
+            return True, series_key
+        self._ids[identity] = None
+        if len(self._ids) > MAX_IDS:
+            self._ids.popitem(last=False)
+
+        day = _day(transaction.get("date"))
+        pending = bool(transaction.get("pending"))
+        unpaired = self._unpaired.setdefault((series_key[0], series_key[1], cents), [])
+        for position, (other_day, other_pending) in enumerate(unpaired):
+            if other_pending == pending or day is None or other_day is None:
+                continue
+            posted_after = day - other_day if other_pending else other_day - day
+            if 0 <= posted_after <= self.date_window_days:
+                del unpaired[position]
+                return True, series_key
+        unpaired.append((day, pending))
+        if len(unpaired) > MAX_DUPLICATE_DATES:
+            del unpaired[0]
+
+        series = self._series.get(series_key)
+        if series is None:
+            series = self._series[series_key] = _Series(
+                str(transaction.get("description") or ""), series_key[2]
+            )
+        series.add(day, amount)
+        return False, series_key
+
+    @property
+    def series_count(self) -> int:
+        return len(self._series)
+
+    def deduplicate(self, transactions: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], int]:
+        """Index rows and return those that are not duplicates, with the number dropped
+
+        Posted rows are indexed first, so of a pending/posted pair the posted one is kept.
+        """
+        order = sorted(range(len(transactions)), key=lambda i: bool(transactions[i].get("pending")))
+        duplicate = [False] * len(transactions)
+        for position in order:
+            duplicate[position] = self.add(transactions[position])[0]
+        kept = [t for t, dropped in zip(transactions, duplicate) if not dropped]
+        return kept, len(transactions) - len(kept)
+
+    def label(self, series_key: Tuple[str, str, bool]) -> Optional[Dict[str, Any]]:
+        """Category data already chosen for a series"""
+        series = self._series.get(series_key)
+        return series.label if series is not None else None
+
+    def set_label(self, series_key: Tuple[str, str, bool], category_data: Dict[str, Any]):
+        series = self._series.get(series_key)
+        if series is not None and series_key[1]:
+            series.label = {
+                "category": category_data["category"],
+                "confidence": category_data["confidence"],
+                "reasoning": category_data["reasoning"]
+            }
+
+    def recurring(self, min_occurrences: int = 3, max_amount_cv: float = 0.15) -> List[Dict[str, Any]]:
+        """Series repeating at a regular interval with a stable amount, e.g. salary and subscriptions"""
+        recurring = []
+        for series in self._series.values():
+            if len(series.days) < min_occurrences:
+                continue
+            order = sorted(range(len(series.days)), key=series.days.__getitem__)
+            days = [series.days[i] for i in order]
+            amounts = [series.amounts[i] for i in order]
+            average = mean(amounts)
+            if average <= 0 or pstdev(amounts) > max_amount_cv * average:
+                continue
+            gap = median(b - a for a, b in zip(days, days[1:]))
+            frequency = next(
+                (label for label, low, high in RECURRENCE_WINDOWS if low <= gap <= high),
+                None
+            )
+            if frequency is None:
+                continue
+            recurring.append({
+                "merchant": series.description,
+                "direction": "income" if series.income else "expense",
+                "frequency": frequency,
+                "average_amount": round(average, 2),
+                "occurrences": len(days),
+                "last_date": datetime.date.fromordinal(days[-1]).isoformat(),
+                "category": series.label["category"] if series.label else None
+            })
+
+        recurring.sort(key=lambda r: r["average_amount"], reverse=True)
+        return recurring
+
+
+class TransactionIndexRegistry:
+    """One index per user, least recently used users dropped past ``max_users``"""
+
+    def __init__(self, max_users: int):
+        self.max_users = max_users
+        self._indexes: "OrderedDict[str, TransactionIndex]" = OrderedDict()
+
+    def get(self, user_id: str) -> TransactionIndex:
+        index = self._indexes.get(user_id)
+        if index is None:
+            index = self._indexes[user_id] = TransactionIndex()
+            while len(self._indexes) > self.max_users:
+                self._indexes.popitem(last=False)
+        self._indexes.move_to_end(user_id)
+        return index
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "users": len(self._indexes),
+            "series": sum(index.series_count for index in self._indexes.values())
+        }
+
+
+transaction_indexes = TransactionIndexRegistry(settings.DEDUP_MAX_USERS)
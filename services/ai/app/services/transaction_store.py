@@ -0,0 +1,371 @@
+"""Per-user append-only columnar transaction store with watermark-based delta sync"""
+
+import fcntl
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional, Set, Tuple
+
+import numpy as np
+
+from ..config import settings
+
+
+# One record per transaction; strings are codes into the segment's dictionaries, -1 for None
+ROW_DTYPE = np.dtype([
+    ("day", "<i4"),
+    ("amount", "<f8"),
+    ("account", "<i4"),
+    ("description", "<i4"),
+    ("category", "<i4"),
+    ("type", "<i4"),
+    ("id", "<i4"),
+])
+STRING_COLUMNS = {
+    "account": "account_id",
+    "description": "description",
+    "category": "category",
+    "type": "type",
+    "id": "id",
+}
+EPOCH = np.datetime64("1970-01-01", "D")
+
+# Open segment maps kept across reads; segments never change once written
+MAX_OPEN_SEGMENTS = 256
+
+
+class WatermarkConflict(Exception):
+    """Raised when a sync is based on a watermark the store has already moved past"""
+
+    def __init__(self, current: Optional[str]):
+        super().__init__(f"Store is at watermark {current!r}; fetch it and resend the rows after it")
+        self.current = current
+
+
+class TransactionColumns:
+    """A time range of one user's transactions as NumPy columns
+
+    Numeric columns are views of the memory-mapped segments when the range
+    falls in a single segment, so reading a period copies nothing.
+    """
+
+    def __init__(self, dates: np.ndarray, amounts: np.ndarray, strings: Dict[str, np.ndarray]):
+        self.dates = dates
+        self.amounts = amounts
+        self.account_ids = strings["account_id"]
+        self.descriptions = strings["description"]
+        self.categories = strings["category"]
+        self.types = strings["type"]
+        self.ids = strings["id"]
+
+    def __len__(self) -> int:
+        return len(self.amounts)
+
+    def columns(self) -> Dict[str, np.ndarray]:
+        """Columns in the shape SpendingAnalytics builds its frame from"""
+        return {
+            "description": self.descriptions,
+            "amount": self.amounts,
+            "date": self.dates,
+            "account_id": self.account_ids,
+            "category": self.categories,
+            "type": self.types
+        }
+
+    def rows(self) -> List[Dict[str, Any]]:
+        """Materialize plain transaction dicts, for code paths that need rows"""
+        dates = self.dates.astype(str).tolist()
+        return [
+            {
+                "description": description,
+                "amount": float(amount),
+                "date": date,
+                "account_id": account_id,
+                "category": category,
+                "type": kind,
+                "id": transaction_id
+            }
+            for description, amount, date, account_id, category, kind, transaction_id in zip(
+                self.descriptions, self.amounts, dates, self.account_ids, self.categories, self.types, self.ids
+            )
+        ]
+
+
+class TransactionStore:
+    """Immutable, date-sorted NumPy segments per user, memory-mapped on read
+
+    Each sync appends one segment; a manifest records each segment's date
+    range and accounts, so a range read opens only overlapping segments and
+    binary-searches their sorted day column. Past ``max_segments`` a sync
+    compacts everything into one segment. The manifest also carries the
+    client's watermark: a sync must name the watermark it continues from, so
+    a retried or concurrent upload cannot append the same rows twice. Beyond
+    that, rows are only ever matched on their id.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_segments: Optional[int] = None):
+        self.path = path or settings.TRANSACTION_STORE_PATH
+        self.max_segments = max_segments or settings.TRANSACTION_STORE_MAX_SEGMENTS
+        os.makedirs(self.path, exist_ok=True)
+        self._segments: "OrderedDict[str, Tuple[np.ndarray, Dict[str, List[Any]]]]" = OrderedDict()
+        self._segments_lock = threading.Lock()
+
+    def state(self, user_id: str) -> Dict[str, Any]:
+        """Watermark, size and covered dates of a user's store"""
+        manifest = self._manifest(user_id)
+        segments = manifest["segments"]
+        return {
+            "watermark": manifest["watermark"],
+            "rows": sum(segment["rows"] for segment in segments),
+            "segments": len(segments),
+            "first_date": _date(min(s["min_day"] for s in segments)) if segments else None,
+            "last_date": _date(max(s["max_day"] for s in segments)) if segments else None
+        }
+
+    def append(
+        self,
+        user_id: str,
+        transactions: List[Dict[str, Any]],
+        since: Optional[str],
+        watermark: str
+    ) -> Dict[str, Any]:
+        """Append the rows a client added after ``since`` and move the watermark on
+
+        Rows whose id is already stored or repeats within the batch are dropped.
+        Pending rows are left out, since they come back posted under a new id,
+        and rows without a readable date are skipped.
+        """
+        posted = [t for t in transactions if not t.get("pending")]
+        with self._user_lock(user_id):
+            manifest = self._manifest(user_id)
+            if manifest["watermark"] != since:
+                raise WatermarkConflict(manifest["watermark"])
+
+            records, dictionaries = self._encode(posted)
+            readable = kept = len(records)
+            if dictionaries["id"]:
+                stored = self._stored_ids(manifest)
+                # Code -1 (no id) indexes the trailing False
+                known = np.array([value in stored for value in dictionaries["id"]] + [False])
+                codes = records["id"]
+                first = np.zeros(readable, dtype=bool)
+                first[np.unique(codes, return_index=True)[1]] = True
+                records = records[~known[codes] & (first | (codes == -1))]
+                kept = len(records)
+
+            if kept:
+                manifest["segments"].append(self._write_segment(manifest, records, dictionaries))
+            manifest["watermark"] = watermark
+            if len(manifest["segments"]) > self.max_segments:
+                self._compact(manifest)
+            self._write_manifest(manifest)
+
+        return {
+            "appended": kept,
+            "duplicates": readable - kept,
+            "pending": len(transactions) - len(posted),
+            "skipped": len(posted) - readable,
+            **self.state(user_id)
+        }
+
+    def read(
+        self,
+        user_id: str,
+        start: Optional[np.datetime64] = None,
+        end: Optional[np.datetime64] = None,
+        account_id: Optional[str] = None
+    ) -> TransactionColumns:
+        """Transactions dated within [start, end], optionally for one account"""
+        return self._read(self._manifest(user_id), start, end, account_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"open_segments": len(self._segments)}
+
+    def _read(
+        self,
+        manifest: Dict[str, Any],
+        start: Optional[np.datetime64],
+        end: Optional[np.datetime64],
+        account_id: Optional[str] = None
+    ) -> TransactionColumns:
+        low = int((start - EPOCH).astype(int)) if start is not None else None
+        high = int((end - EPOCH).astype(int)) if end is not None else None
+
+        parts = []
+        for segment in manifest["segments"]:
+            if (low is not None and segment["max_day"] < low) or (high is not None and segment["min_day"] > high):
+                continue
+            if account_id is not None and account_id not in segment["accounts"]:
+                continue
+            records, dictionaries = self._open(manifest["directory"], segment["name"])
+            days = records["day"]
+            first = int(np.searchsorted(days, low, side="left")) if low is not None else 0
+            last = int(np.searchsorted(days, high, side="right")) if high is not None else len(days)
+            selected = records[first:last]
+            if account_id is not None:
+                selected = selected[selected["account"] == dictionaries["account"].index(account_id)]
+            parts.append((selected, dictionaries))
+
+        if len(parts) == 1:
+            records, dictionaries = parts[0]
+            strings = self._strings(records, dictionaries)
+        elif parts:
+            records = np.concatenate([records for records, _ in parts])
+            decoded = [self._strings(records, dictionaries) for records, dictionaries in parts]
+            strings = {name: np.concatenate([d[name] for d in decoded]) for name in STRING_COLUMNS.values()}
+        else:
+            records = np.zeros(0, dtype=ROW_DTYPE)
+            strings = {name: np.zeros(0, dtype=object) for name in STRING_COLUMNS.values()}
+
+        dates = EPOCH + records["day"].astype("timedelta64[D]")
+        return TransactionColumns(dates, records["amount"], strings)
+
+    @staticmethod
+    def _strings(records: np.ndarray, dictionaries: Dict[str, List[Any]]) -> Dict[str, np.ndarray]:
+        """Decode string codes; each dictionary gets a trailing None that code -1 picks"""
+        return {
+            name: np.asarray(dictionaries[column] + [None], dtype=object)[records[column]]
+            for column, name in STRING_COLUMNS.items()
+        }
+
+    def _encode(self, transactions: List[Dict[str, Any]]) -> Tuple[np.ndarray, Dict[str, List[Any]]]:
+        """Rows with a readable date as a date-sorted record array, plus its string dictionaries"""
+        columns: Dict[str, List[Any]] = {column: [] for column in ROW_DTYPE.names}
+        dictionaries: Dict[str, List[Any]] = {column: [] for column in STRING_COLUMNS}
+        codes: Dict[str, Dict[Any, int]] = {column: {} for column in STRING_COLUMNS}
+        for transaction in transactions:
+            try:
+                day = np.datetime64(str(transaction.get("date"))[:10], "D")
+            except ValueError:
+                continue
+            if np.isnat(day):
+                continue
+            columns["day"].append(int((day - EPOCH).astype(int)))
+            columns["amount"].append(float(transaction.get("amount") or 0))
+            for column, name in STRING_COLUMNS.items():
+                value = transaction.get(name)
+                code = -1
+                if value is not None:
+                    code = codes[column].get(value)
+                    if code is None:
+                        code = codes[column][value] = len(dictionaries[column])
+                        dictionaries[column].append(value)
+                columns[column].append(code)
+
+        records = np.zeros(len(columns["day"]), dtype=ROW_DTYPE)
+        for column, values in columns.items():
+            records[column] = values
+        return records[np.argsort(records["day"], kind="stable")], dictionaries
+
+    def _stored_ids(self, manifest: Dict[str, Any]) -> Set[Any]:
+        """Ids of every stored row, from the segment dictionaries"""
+        ids: Set[Any] = set()
+        for segment in manifest["segments"]:
+            ids.update(self._open(manifest["directory"], segment["name"])[1]["id"])
+        return ids
+
+    def _write_segment(
+        self,
+        manifest: Dict[str, Any],
+        records: np.ndarray,
+        dictionaries: Dict[str, List[Any]]
+    ) -> Dict[str, Any]:
+        name = f"segment-{manifest['next_segment']:06d}"
+        manifest["next_segment"] += 1
+        directory = manifest["directory"]
+        np.save(os.path.join(directory, name + ".npy"), records)
+        _write_json(os.path.join(directory, name + ".json"), dictionaries)
+        return {
+            "name": name,
+            "rows": len(records),
+            "min_day": int(records["day"][0]),
+            "max_day": int(records["day"][-1]),
+            "accounts": list(dictionaries["account"])
+        }
+
+    def _compact(self, manifest: Dict[str, Any]):
+        """Merge every segment into one, so reads open a single map again"""
+        columns = self._read(manifest, None, None)
+        records, dictionaries = self._encode(columns.rows())
+        old = manifest["segments"]
+        manifest["segments"] = [self._write_segment(manifest, records, dictionaries)]
+        # Readers holding an old map keep it valid after the unlink
+        for segment in old:
+            for suffix in (".npy", ".json"):
+                try:
+                    os.remove(os.path.join(manifest["directory"], segment["name"] + suffix))
+                except OSError:
+                    pass
+
+    def _open(self, directory: str, name: str) -> Tuple[np.ndarray, Dict[str, List[Any]]]:
+        path = os.path.join(directory, name)
+        with self._segments_lock:
+            segment = self._segments.get(path)
+            if segment is not None:
+                self._segments.move_to_end(path)
+                return segment
+
+        with open(path + ".json", encoding="utf-8") as handle:
+            dictionaries = json.load(handle)
+        segment = (np.load(path + ".npy", mmap_mode="r"), dictionaries)
+        with self._segments_lock:
+            self._segments[path] = segment
+            while len(self._segments) > MAX_OPEN_SEGMENTS:
+                self._segments.popitem(last=False)
+        return segment
+
+    def _directory(self, user_id: str) -> str:
+        # Hashed so any user id is a safe directory name
+        return os.path.join(self.path, hashlib.sha256(user_id.encode("utf-8")).hexdigest()[:32])
+
+    def _manifest(self, user_id: str) -> Dict[str, Any]:
+        directory = self._directory(user_id)
+        try:
+            with open(os.path.join(directory, "manifest.json"), encoding="utf-8") as handle:
+                manifest = json.load(handle)
+        except FileNotFoundError:
+            manifest = {"watermark": None, "next_segment": 0, "segments": []}
+        manifest["directory"] = directory
+        return manifest
+
+    def _write_manifest(self, manifest: Dict[str, Any]):
+        stored = {key: value for key, value in manifest.items() if key != "directory"}
+        _write_json(os.path.join(manifest["directory"], "manifest.json"), stored)
+
+    @contextmanager
+    def _user_lock(self, user_id: str):
+        """Serialize syncs for a user across threads and worker processes"""
+        directory = self._directory(user_id)
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, "lock"), "w") as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def _date(day: int) -> str:
+    return str(EPOCH + np.timedelta64(day, "D"))
+
+
+def _write_json(path: str, value: Any):
+    """Write then rename, so readers never see a partial file"""
+    temporary = path + ".tmp"
+    with open(temporary, "w", encoding="utf-8") as handle:
+        json.dump(value, handle)
+    os.replace(temporary, path)
+
+
+_store: Optional[TransactionStore] = None
+
+
+def get_transaction_store() -> TransactionStore:
+    """Process-wide store, opened on first use"""
+    global _store
+    if _store is None:
+        _store = TransactionStore()
+    return _store
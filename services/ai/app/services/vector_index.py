@@ -0,0 +1,265 @@
+"""Persistent vector index on a memory-mapped float32 matrix"""
+
+import fcntl
+import json
+import os
+import threading
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+
+class VectorIndex:
+    """Cosine-similarity index with an IVF coarse quantizer for large collections
+
+    Safe to share between worker processes: one writer at a time holds a file
+    lock, and every process replays log entries the others appended before
+    it writes or searches.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        dimension: int,
+        nlist: int = 256,
+        nprobe: int = 8,
+        train_threshold: int = 4096,
+        initial_capacity: int = 1024
+    ):
+        self.path = path
+        self.dimension = dimension
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.train_threshold = train_threshold
+        self.count = 0
+        self._lock = threading.RLock()
+
+        self._ids: Dict[str, int] = {}
+        self._metadata: List[Dict[str, Any]] = []
+        self._owners: Dict[str, int] = {}
+        self._owner_codes = np.zeros(0, dtype=np.int32)
+
+        self.centroids: Optional[np.ndarray] = None
+        self._assignments = np.zeros(0, dtype=np.int32)
+        self._trained_at = 0
+        self._lists_dirty = True
+        self._list_order = np.zeros(0, dtype=np.int64)
+        self._list_offsets = np.zeros(1, dtype=np.int64)
+
+        os.makedirs(path, exist_ok=True)
+        self._vectors_path = os.path.join(path, "vectors.f32")
+        self._metadata_path = os.path.join(path, "metadata.jsonl")
+        self._lock_path = os.path.join(path, "lock")
+        self._log_offset = 0
+        self._capacity = 0
+        self._vectors = None
+        self._load(initial_capacity)
+
+    def upsert(self, ids: List[str], vectors: np.ndarray, metadata: List[Dict[str, Any]], owner: str):
+        """Insert or overwrite vectors, appending their metadata to the log"""
+        vectors = self._normalize(np.asarray(vectors, dtype=np.float32))
+        with self._lock, self._writer():
+            self._catch_up()
+            rows = []
+            for item_id in ids:
+                row = self._ids.get(item_id)
+                if row is None:
+                    row = self.count
+                    self.count += 1
+                    self._ids[item_id] = row
+                    self._metadata.append({})
+                rows.append(row)
+
+            self._ensure_capacity(self.count)
+            rows = np.asarray(rows, dtype=np.int64)
+            self._vectors[rows] = vectors
+            self._vectors.flush()
+
+            owner_code = self._owners.setdefault(owner, len(self._owners))
+            self._owner_codes = self._grow(self._owner_codes, self.count)
+            self._owner_codes[rows] = owner_code
+
+            # Vectors are flushed first, so a process replaying these lines can read them
+            with open(self._metadata_path, "a", encoding="utf-8") as log:
+                lines = []
+                for item_id, row, meta in zip(ids, rows, metadata):
+                    entry = {"id": item_id, "row": int(row), "owner": owner, "metadata": meta}
+                    self._metadata[row] = meta
+                    lines.append(json.dumps(entry) + "\n")
+                log.write("".join(lines))
+            self._log_offset = os.path.getsize(self._metadata_path)
+
+            if self.centroids is not None:
+                self._assignments = self._grow(self._assignments, self.count)
+                self._assignments[rows] = np.argmax(vectors @ self.centroids.T, axis=1)
+                self._lists_dirty = True
+            self._maybe_train()
+
+    def search(self, query: np.ndarray, k: int = 5, owner: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Top-k rows by cosine similarity, optionally restricted to one owner"""
+        query = self._normalize(np.asarray(query, dtype=np.float32).reshape(1, -1))[0]
+        with self._lock:
+            self._catch_up()
+            if owner is not None and owner not in self._owners:
+                return []
+
+            candidates = self._candidates(query)
+            if owner is not None:
+                candidates = candidates[self._owner_codes[candidates] == self._owners[owner]]
+            if candidates.size == 0:
+                return []
+
+            scores = self._vectors[candidates] @ query
+            top = np.argpartition(-scores, min(k, scores.size) - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [
+                {**self._metadata[candidates[i]], "score": round(float(scores[i]), 4)}
+                for i in top
+            ]
+
+    def stats(self) -> Dict[str, Any]:
+        """Index size and ANN state"""
+        return {
+            "vectors": self.count,
+            "capacity": self._capacity,
+            "owners": len(self._owners),
+            "trained": self.centroids is not None,
+            "nlist": 0 if self.centroids is None else len(self.centroids)
+        }
+
+    def _candidates(self, query: np.ndarray) -> np.ndarray:
+        """Rows in the nprobe closest IVF lists, or every row before training"""
+        if self.centroids is None:
+            return np.arange(self.count)
+
+        if self._lists_dirty:
+            self._list_order = np.argsort(self._assignments[:self.count], kind="stable")
+            counts = np.bincount(self._assignments[:self.count], minlength=len(self.centroids))
+            self._list_offsets = np.concatenate(([0], np.cumsum(counts)))
+            self._lists_dirty = False
+
+        probes = np.argsort(-(self.centroids @ query))[:self.nprobe]
+        return np.concatenate([
+            self._list_order[self._list_offsets[p]:self._list_offsets[p + 1]] for p in probes
+        ])
+
+    def _train(self, iterations: int = 10):
+        """Fit IVF centroids with spherical k-means on a sample of the rows"""
+        rng = np.random.default_rng(0)
+        nlist = max(1, min(self.nlist, int(np.sqrt(self.count))))
+        sample_rows = rng.choice(self.count, size=min(self.count, nlist * 64), replace=False)
+        sample = np.asarray(self._vectors[np.sort(sample_rows)])
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)]
+
+        for _ in range(iterations):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            filled = np.bincount(assignment, minlength=nlist) > 0
+            centroids[filled] = self._normalize(sums[filled])
+
+        self.centroids = centroids
+        assignments = np.empty(self.count, dtype=np.int32)
+        for start in range(0, self.count, 65536):
+            block = np.asarray(self._vectors[start:min(start + 65536, self.count)])
+            assignments[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+        self._assignments = assignments
+        self._trained_at = self.count
+        self._lists_dirty = True
+
+    def _load(self, initial_capacity: int):
+        """Reopen the matrix and replay the metadata log"""
+        self._replay()
+        self._ensure_capacity(max(initial_capacity, self.count))
+        self._maybe_train()
+
+    def _catch_up(self):
+        """Replay entries other processes appended to the log since this one last read it"""
+        try:
+            size = os.path.getsize(self._metadata_path)
+        except FileNotFoundError:
+            return
+        if size <= self._log_offset:
+            return
+
+        first_new = self.count
+        self._replay()
+        if self.count > first_new:
+            self._ensure_capacity(self.count)
+            if self.centroids is not None:
+                block = np.asarray(self._vectors[first_new:self.count])
+                self._assignments = self._grow(self._assignments, self.count)
+                self._assignments[first_new:self.count] = np.argmax(block @ self.centroids.T, axis=1)
+                self._lists_dirty = True
+            self._maybe_train()
+
+    def _replay(self):
+        """Apply complete log lines from the last read offset onwards"""
+        if not os.path.exists(self._metadata_path):
+            return
+        with open(self._metadata_path, "rb") as log:
+            log.seek(self._log_offset)
+            data = log.read()
+        # A line still being written by another process is picked up next time
+        complete = data[:data.rfind(b"\n") + 1]
+        for line in complete.decode("utf-8").splitlines():
+            entry = json.loads(line)
+            row = entry["row"]
+            self._ids[entry["id"]] = row
+            while len(self._metadata) <= row:
+                self._metadata.append({})
+            self._metadata[row] = entry["metadata"]
+            owner_code = self._owners.setdefault(entry["owner"], len(self._owners))
+            self._owner_codes = self._grow(self._owner_codes, row + 1)
+            self._owner_codes[row] = owner_code
+        self._log_offset += len(complete)
+        self.count = len(self._metadata)
+
+    def _maybe_train(self):
+        if self.count >= self.train_threshold and self.count >= 2 * max(self._trained_at, 1):
+            self._train()
+
+    @contextmanager
+    def _writer(self):
+        """Hold the index's write lock across threads and worker processes"""
+        with open(self._lock_path, "w") as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def _ensure_capacity(self, rows: int):
+        """Grow the backing file geometrically and remap it"""
+        if rows <= self._capacity and self._vectors is not None:
+            return
+
+        # Another process may have grown the file already; never shrink it
+        existing = 0
+        if os.path.exists(self._vectors_path):
+            existing = os.path.getsize(self._vectors_path) // (4 * self.dimension)
+        capacity = max(rows, 2 * self._capacity, existing, 1)
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._vectors = None
+        if existing < capacity:
+            with open(self._vectors_path, "ab") as backing:
+                backing.truncate(capacity * self.dimension * 4)
+        self._vectors = np.memmap(
+            self._vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dimension)
+        )
+        self._capacity = capacity
+
+    @staticmethod
+    def _grow(array: np.ndarray, size: int) -> np.ndarray:
+        if array.size >= size:
+            return array
+        grown = np.zeros(max(size, 2 * array.size), dtype=array.dtype)
+        grown[:array.size] = array
+        return grown
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms > 0, norms, 1.0)
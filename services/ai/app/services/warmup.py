@@ -0,0 +1,127 @@
+"""Startup work: models preloaded once per server, per-worker warm-up and startup stats"""
+
+import asyncio
+import logging
+import os
+import resource
+import time
+from typing import Dict, Any, Optional
+
+from ..config import settings
+
+
+logger = logging.getLogger("uvicorn.error")
+
+# Small enough to be instant, wide enough to touch every analytics code path
+SAMPLE_TRANSACTIONS = [
+    {"description": "Warm-up payroll", "amount": 3000.0, "date": "2024-01-01", "category": "salary"},
+    {"description": "Warm-up grocer", "amount": -42.5, "date": "2024-01-03", "category": "food"},
+    {"description": "Warm-up streaming", "amount": -9.99, "date": "2024-01-05", "category": "entertainment"},
+    {"description": "Warm-up streaming", "amount": -9.99, "date": "2024-02-05", "category": "entertainment"}
+]
+
+# smaps_rollup lines summed into memory_usage(), in KiB
+MEMORY_FIELDS = {
+    "Rss": "rss_bytes",
+    "Pss": "pss_bytes",
+    "Private_Clean": "private_bytes",
+    "Private_Dirty": "private_bytes"
+}
+
+_process_started = time.monotonic()
+_preload_seconds: Optional[float] = None
+
+# Filled in once this process has warmed up; served by /health/ready
+startup: Dict[str, Any] = {}
+
+
+def mark_process_start():
+    """Restart the startup clock, e.g. in a freshly forked worker"""
+    global _process_started
+    _process_started = time.monotonic()
+
+
+def preload() -> str:
+    """Load heavy modules and models in the parent so forked workers share them copy-on-write
+
+    Returns a line for the server log, since the parent has no uvicorn logging set up.
+    """
+    global _preload_seconds
+    start = time.monotonic()
+    _load_models()
+    _preload_seconds = round(time.monotonic() - start, 3)
+    return f"Preloaded models in {_preload_seconds:.2f}s ({_format_memory(memory_usage())})"
+
+
+async def warm_up(embedding_service: Any) -> Dict[str, Any]:
+    """Bring this worker to full speed before it accepts traffic, then record startup stats"""
+    from .spending_analytics import SpendingAnalytics
+
+    # A no-op for whatever the parent already preloaded
+    await asyncio.to_thread(_load_models)
+    SpendingAnalytics(SAMPLE_TRANSACTIONS).summary()
+    if settings.SERVER_PRELOAD_MODELS:
+        try:
+            await embedding_service.start()
+        except ImportError:
+            pass
+
+    startup.update({
+        "pid": os.getpid(),
+        "startup_seconds": round(time.monotonic() - _process_started, 3),
+        "preload_seconds": _preload_seconds,
+        **memory_usage()
+    })
+    logger.info(
+        "Worker %s warmed up in %.2fs (%s)",
+        startup["pid"], startup["startup_seconds"], _format_memory(startup)
+    )
+    return startup
+
+
+def memory_usage() -> Dict[str, int]:
+    """Resident memory of this process in bytes
+
+    ``pss_bytes`` splits pages shared copy-on-write with the preforking parent
+    and the other workers between them, so it sums to the real total across workers.
+    """
+    usage: Dict[str, int] = {}
+    try:
+        with open("/proc/self/smaps_rollup") as rollup:
+            for line in rollup:
+                name, _, value = line.partition(":")
+                if name in MEMORY_FIELDS:
+                    key = MEMORY_FIELDS[name]
+                    usage[key] = usage.get(key, 0) + int(value.split()[0]) * 1024
+    except (OSError, ValueError):
+        usage = {}
+    if "rss_bytes" not in usage:
+        # No procfs: report the peak instead, which getrusage gives in KiB on Linux
+        usage = {"rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024}
+    return usage
+
+
+def _load_models():
+    """Import pandas and load tokenizer, rule index and, when enabled, the local models"""
+    from . import spending_analytics  # noqa: F401
+    from ..prompts.prompt_compiler import count_tokens
+    from .embedding_service import load_embedding_model
+    from .transaction_categorizer import get_local_classifier, get_rule_index
+
+    count_tokens("warm up")
+    get_rule_index()
+    if not settings.SERVER_PRELOAD_MODELS:
+        return
+    get_local_classifier()
+    try:
+        load_embedding_model(settings.EMBEDDING_MODEL)
+    except ImportError:
+        pass
+
+
+def _format_memory(usage: Dict[str, Any]) -> str:
+    text = f"RSS {usage['rss_bytes'] / 2 ** 20:.1f} MiB"
+    if "pss_bytes" in usage:
+        text += f", PSS {usage['pss_bytes'] / 2 ** 20:.1f} MiB"
+        text += f", private {usage.get('private_bytes', 0) / 2 ** 20:.1f} MiB"
+    return text
@@ -0,0 +1,60 @@
+"""Seeded synthetic transaction histories for benchmark payloads"""
+
+import random
+from datetime import date, timedelta
+from typing import Dict, Any, List
+
+
+# Merchants the rule tier recognises, so requests mix local and LLM answers
+KNOWN_MERCHANTS = [
+    ("STARBUCKS STORE", 6.5), ("WHOLE FOODS MKT", 85.0), ("UBER TRIP", 18.0), ("SHELL OIL", 45.0),
+    ("AMAZON MKTP", 40.0), ("NETFLIX.COM", 15.49), ("COMCAST CABLE", 89.99), ("CVS PHARMACY", 22.0),
+    ("CHIPOTLE", 12.5), ("TARGET", 60.0), ("RENT PAYMENT", 1850.0), ("SPOTIFY", 10.99)
+]
+# Merchants no rule matches, forcing the LLM tier
+UNKNOWN_MERCHANTS = [
+    "SQ *BLUE HERON", "TST* OAKWOOD", "PAYPAL *KLMNOP", "POS 4411 NORTHSIDE", "ACH WDL QRT SERV",
+    "CKO*LUMA STUDIO", "SP * FERNLEAF", "MERCHANT 8821", "DD *HARBORVIEW", "IC* MARKETPLACE"
+]
+
+
+def transactions(count: int, seed: int = 0, months: int = 6, unknown_share: float = 0.3) -> List[Dict[str, Any]]:
+    """A history of ``count`` transactions spread over the last ``months`` months"""
+    rng = random.Random(seed)
+    today = date.today()
+    rows = []
+    for month in range(months):
+        payday = today - timedelta(days=30 * month + 1)
+        rows.append({
+            "description": "ACME CORP PAYROLL DIRECT DEP",
+            "amount": 5200.0,
+            "date": payday.isoformat(),
+            "account_id": "checking",
+            "type": "income"
+        })
+
+    while len(rows) < count:
+        if rng.random() < unknown_share:
+            description = f"{rng.choice(UNKNOWN_MERCHANTS)} {rng.randint(100, 999)}"
+            amount = round(rng.uniform(5, 250), 2)
+        else:
+            merchant, typical = rng.choice(KNOWN_MERCHANTS)
+            description = f"{merchant} #{rng.randint(1000, 9999)}"
+            amount = round(typical * rng.uniform(0.7, 1.3), 2)
+        rows.append({
+            "description": description,
+            "amount": -amount,
+            "date": (today - timedelta(days=rng.randint(0, 30 * months - 1))).isoformat(),
+            "account_id": rng.choice(["checking", "credit"]),
+            "type": "expense"
+        })
+    return rows[:count]
+
+
+CHAT_QUESTIONS = [
+    "How much did I spend on food last month?",
+    "Can I afford a $300 monthly car payment?",
+    "Which subscriptions should I cancel?",
+    "How do I build a three month emergency fund?",
+    "Why were my expenses higher this month?"
+]
@@ -0,0 +1,205 @@
+"""Fake OpenAI and Anthropic endpoints with configurable latency, errors and token rate
+
+Serves just enough of ``/v1/chat/completions`` and ``/v1/messages`` (plain,
+streamed and forced tool calls) for LLMService to run unchanged against it.
+
+    python -m benchmarks.fake_provider --port 9100 --latency-ms 400 --error-rate 0.01
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import re
+import time
+from typing import Dict, Any, AsyncIterator, List
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from app.prompts.financial_prompts import EXPENSE_CATEGORIES
+
+
+config: Dict[str, Any] = {
+    # Time to first token is log-normal around this median
+    "latency_ms": 400.0,
+    "latency_sigma": 0.5,
+    "error_rate": 0.0,
+    "tokens_per_second": 80.0,
+    "seed": 0
+}
+
+ROW_PATTERN = re.compile(r"^\[(\d+)\] Description: (.*?) \|", re.MULTILINE)
+
+app = FastAPI(title="Fake LLM provider")
+rng = random.Random(0)
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    system = next((m["content"] for m in body["messages"] if m["role"] == "system"), "")
+    user = body["messages"][-1]["content"]
+    tool = body.get("tool_choice", {}).get("function", {}).get("name") if body.get("tools") else None
+    text = _answer(system, user, tool, body.get("max_tokens", 500))
+
+    if rng.random() < config["error_rate"]:
+        await asyncio.sleep(_first_token_delay())
+        return JSONResponse({"error": {"message": "fake provider error", "type": "server_error"}}, status_code=500)
+
+    model = body.get("model", "gpt-4")
+    if body.get("stream"):
+        def chunk(delta: Dict[str, Any], finish=None) -> str:
+            return "data: " + json.dumps({
+                "id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": int(time.time()),
+                "model": model, "choices": [{"index": 0, "delta": delta, "finish_reason": finish}]
+            }) + "\n\n"
+
+        async def events() -> AsyncIterator[str]:
+            async for piece in _paced(text):
+                if tool:
+                    yield chunk({"tool_calls": [{
+                        "index": 0, "id": "call_fake", "type": "function",
+                        "function": {"name": tool, "arguments": piece}
+                    }]})
+                else:
+                    yield chunk({"content": piece})
+            yield chunk({}, "tool_calls" if tool else "stop")
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    await asyncio.sleep(_first_token_delay() + _tokens(text) / config["tokens_per_second"])
+    message = {"role": "assistant", "content": text}
+    if tool:
+        message = {"role": "assistant", "content": None, "tool_calls": [{
+            "id": "call_fake", "type": "function", "function": {"name": tool, "arguments": text}
+        }]}
+    return {
+        "id": "chatcmpl-fake", "object": "chat.completion", "created": int(time.time()), "model": model,
+        "choices": [{"index": 0, "message": message, "finish_reason": "tool_calls" if tool else "stop"}],
+        "usage": {
+            "prompt_tokens": _tokens(system + user),
+            "completion_tokens": _tokens(text),
+            "total_tokens": _tokens(system + user + text)
+        }
+    }
+
+
+@app.post("/v1/messages")
+async def messages(request: Request):
+    body = await request.json()
+    system = body.get("system", "")
+    user = body["messages"][-1]["content"]
+    text = _answer(system, user, None, body.get("max_tokens", 500))
+
+    if rng.random() < config["error_rate"]:
+        await asyncio.sleep(_first_token_delay())
+        return JSONResponse({"type": "error", "error": {"type": "api_error", "message": "fake provider error"}}, status_code=500)
+
+    usage = {"input_tokens": _tokens(system + user), "output_tokens": _tokens(text)}
+    if body.get("stream"):
+        def event(name: str, data: Dict[str, Any]) -> str:
+            return f"event: {name}\ndata: {json.dumps({'type': name, **data})}\n\n"
+
+        async def events() -> AsyncIterator[str]:
+            yield event("message_start", {"message": {
+                "id": "msg_fake", "type": "message", "role": "assistant", "content": [],
+                "model": body.get("model"), "stop_reason": None, "stop_sequence": None,
+                "usage": {"input_tokens": usage["input_tokens"], "output_tokens": 0}
+            }})
+            yield event("content_block_start", {"index": 0, "content_block": {"type": "text", "text": ""}})
+            async for piece in _paced(text):
+                yield event("content_block_delta", {"index": 0, "delta": {"type": "text_delta", "text": piece}})
+            yield event("content_block_stop", {"index": 0})
+            yield event("message_delta", {
+                "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                "usage": {"output_tokens": usage["output_tokens"]}
+            })
+            yield event("message_stop", {})
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    await asyncio.sleep(_first_token_delay() + usage["output_tokens"] / config["tokens_per_second"])
+    return {
+        "id": "msg_fake", "type": "message", "role": "assistant", "model": body.get("model"),
+        "content": [{"type": "text", "text": text}],
+        "stop_reason": "end_turn", "stop_sequence": None, "usage": usage
+    }
+
+
+def _answer(system: str, user: str, tool: str, max_tokens: int) -> str:
+    """Canned response in whatever shape the prompt asks for"""
+    if tool == "record_categorizations" or '"results"' in system:
+        results = []
+        for index, description in ROW_PATTERN.findall(user):
+            digest = int(hashlib.md5(description.encode("utf-8")).hexdigest(), 16)
+            results.append({
+                "index": int(index),
+                "category": EXPENSE_CATEGORIES[digest % len(EXPENSE_CATEGORIES)],
+                "confidence": 0.9,
+                "reasoning": "Matched the merchant name."
+            })
+        return json.dumps({"results": results})
+
+    if tool == "record_insights" or '"insights"' in system:
+        return json.dumps({"insights": [
+            {
+                "type": "spending_pattern",
+                "title": f"Insight {i}",
+                "description": "Spending in your top category rose compared with last month; set a cap.",
+                "confidence": 0.8
+            }
+            for i in range(1, 4)
+        ]})
+
+    words = min(max_tokens, 150)
+    return " ".join(["Consider"] + ["reviewing your recurring spending this month."] * (words // 6))
+
+
+async def _paced(text: str) -> AsyncIterator[str]:
+    """Emit roughly one token (four characters) at a time at the configured token rate"""
+    await asyncio.sleep(_first_token_delay())
+    interval = 1.0 / config["tokens_per_second"]
+    started = time.monotonic()
+    for sent, start in enumerate(range(0, len(text), 4), start=1):
+        yield text[start:start + 4]
+        delay = started + sent * interval - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+def _first_token_delay() -> float:
+    return rng.lognormvariate(0.0, config["latency_sigma"]) * config["latency_ms"] / 1000
+
+
+def _tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-ms", type=float, default=config["latency_ms"])
+    parser.add_argument("--latency-sigma", type=float, default=config["latency_sigma"])
+    parser.add_argument("--error-rate", type=float, default=config["error_rate"])
+    parser.add_argument("--tokens-per-second", type=float, default=config["tokens_per_second"])
+    parser.add_argument("--seed", type=int, default=config["seed"])
+    args = parser.parse_args(argv)
+
+    config.update(
+        latency_ms=args.latency_ms,
+        latency_sigma=args.latency_sigma,
+        error_rate=args.error_rate,
+        tokens_per_second=args.tokens_per_second,
+        seed=args.seed
+    )
+    rng.seed(args.seed)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+"""Drive the AI service against the fake provider and compare with stored baselines
+
+Starts the fake provider and the service as subprocesses, replays synthetic
+requests at increasing concurrency and reports p50/p95/p99 latency,
+throughput, errors and service memory per scenario.
+
+    python -m benchmarks.run --save-baseline benchmarks/baselines/baseline.json
+    python -m benchmarks.run --compare benchmarks/baselines/baseline.json
+
+A comparison exits with status 1 when any scenario's p95 latency or
+throughput is worse than the baseline by more than ``--tolerance``.
+"""
+
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+import httpx
+import numpy as np
+
+from . import corpus
+
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+Payload = Callable[[int], Tuple[str, str, Dict[str, Any]]]
+
+
+def scenarios(rows: int) -> Dict[str, Payload]:
+    """Request builders per scenario, each returning (method, path, kwargs) for request i"""
+    history = corpus.transactions(rows)
+    batch = corpus.transactions(25, seed=1, unknown_share=0.6)
+
+    return {
+        "categorize": lambda i: ("POST", "/api/v1/ai/categorize", {"json": {
+            # Vary one row so LLM cache keys differ between requests
+            "transactions": batch[:-1] + [{**batch[-1], "description": f"{batch[-1]['description']} {i}"}]
+        }}),
+        "analyze": lambda i: ("POST", "/api/v1/ai/analyze", {"json": {
+            "user_id": f"bench-{i % 50}", "transactions": history, "time_period": "last_90_days"
+        }}),
+        "chat": lambda i: ("POST", "/api/v1/ai/chat", {"json": {
+            "user_id": f"bench-{i % 50}", "message": corpus.CHAT_QUESTIONS[i % len(corpus.CHAT_QUESTIONS)]
+        }}),
+        "embed": lambda i: ("POST", "/api/v1/ai/embed", {"params": {
+            "text": f"{history[i % len(history)]['description']} {i}"
+        }})
+    }
+
+
+async def run_level(
+    client: httpx.AsyncClient,
+    build: Payload,
+    concurrency: int,
+    requests: int
+) -> Dict[str, Any]:
+    """Send ``requests`` requests with ``concurrency`` in flight and summarise them"""
+    latencies: List[float] = []
+    errors = 0
+    counter = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            method, path, kwargs = build(i)
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, path, **kwargs)
+                ok = response.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            latencies.append(time.perf_counter() - start)
+            errors += not ok
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    p50, p95, p99 = np.percentile(np.asarray(latencies) * 1000, [50, 95, 99])
+    return {
+        "requests": requests,
+        "errors": errors,
+        "p50_ms": round(float(p50), 2),
+        "p95_ms": round(float(p95), 2),
+        "p99_ms": round(float(p99), 2),
+        "throughput_rps": round((requests - errors) / elapsed, 2)
+    }
+
+
+def rss_mb(pid: int) -> Dict[str, Optional[float]]:
+    """Current and peak resident memory of a process, from /proc where available"""
+    values = {"rss_mb": None, "peak_rss_mb": None}
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    values["rss_mb"] = round(int(line.split()[1]) / 1024, 1)
+                elif line.startswith("VmHWM:"):
+                    values["peak_rss_mb"] = round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        try:
+            import psutil
+            values["rss_mb"] = round(psutil.Process(pid).memory_info().rss / 2 ** 20, 1)
+        except ImportError:
+            pass
+    return values
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Scenario/concurrency pairs that regressed beyond the tolerance"""
+    regressions = []
+    for scenario, levels in current["results"].items():
+        for level, result in levels.items():
+            base = baseline["results"].get(scenario, {}).get(level)
+            if base is None:
+                continue
+            if result["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+                regressions.append(
+                    f"{scenario} @ {level}: p95 {result['p95_ms']}ms vs baseline {base['p95_ms']}ms"
+                )
+            if result["throughput_rps"] < base["throughput_rps"] * (1 - tolerance):
+                regressions.append(
+                    f"{scenario} @ {level}: throughput {result['throughput_rps']}/s "
+                    f"vs baseline {base['throughput_rps']}/s"
+                )
+            if result["errors"] > base["errors"] + tolerance * result["requests"]:
+                regressions.append(f"{scenario} @ {level}: {result['errors']} errors vs baseline {base['errors']}")
+    return regressions
+
+
+async def wait_until_up(url: str, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                await client.get(url)
+                return
+            except httpx.HTTPError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout:.0f}s")
+
+
+async def benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    data_dir = tempfile.mkdtemp(prefix="ai-bench-")
+    provider_url = f"http://127.0.0.1:{args.provider_port}"
+    service_url = f"http://127.0.0.1:{args.service_port}"
+    env = {
+        **os.environ,
+        "OPENAI_API_KEY": "bench",
+        "OPENAI_BASE_URL": f"{provider_url}/v1",
+        "ANTHROPIC_API_KEY": "bench",
+        "ANTHROPIC_BASE_URL": provider_url,
+        "LLM_PROVIDER_ORDER": args.providers,
+        "LLM_MAX_RETRIES": "0",
+        # Measure LLMService itself rather than cache hits
+        "LLM_CACHE_ENABLED": "false",
+        "INSIGHTS_DB_PATH": os.path.join(data_dir, "insights.db"),
+        "JOB_DB_PATH": os.path.join(data_dir, "jobs.db"),
+        "VECTOR_INDEX_PATH": os.path.join(data_dir, "vector_index"),
+        "ENVIRONMENT": "benchmark"
+    }
+
+    provider = subprocess.Popen([
+        sys.executable, "-m", "benchmarks.fake_provider",
+        "--port", str(args.provider_port),
+        "--latency-ms", str(args.latency_ms),
+        "--latency-sigma", str(args.latency_sigma),
+        "--error-rate", str(args.error_rate),
+        "--tokens-per-second", str(args.tokens_per_second)
+    ], cwd=SERVICE_DIR, env=env)
+    service = subprocess.Popen([
+        sys.executable, "-m", "uvicorn", "main:app",
+        "--port", str(args.service_port), "--log-level", "warning"
+    ], cwd=SERVICE_DIR, env=env)
+
+    results: Dict[str, Dict[str, Any]] = {}
+    try:
+        await wait_until_up(f"{provider_url}/docs")
+        await wait_until_up(f"{service_url}/health/")
+
+        selected = scenarios(args.rows)
+        names = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+        if "embed" in names and importlib.util.find_spec("sentence_transformers") is None:
+            print("skipping embed: sentence-transformers is not installed", file=sys.stderr)
+            names.remove("embed")
+
+        limits = httpx.Limits(max_connections=max(args.concurrency) * 2)
+        async with httpx.AsyncClient(base_url=service_url, timeout=args.timeout, limits=limits) as client:
+            for name in names:
+                results[name] = {}
+                # One untimed request so model loading and imports don't land in the numbers
+                method, path, kwargs = selected[name](-1)
+                await client.request(method, path, **kwargs)
+                for concurrency in args.concurrency:
+                    result = await run_level(client, selected[name], concurrency, args.requests)
+                    result.update(rss_mb(service.pid))
+                    results[name][str(concurrency)] = result
+                    print(f"{name:>10} c={concurrency:<4} {json.dumps(result)}", file=sys.stderr)
+    finally:
+        for process in (service, provider):
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    return {
+        "meta": {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "provider": {
+                "latency_ms": args.latency_ms,
+                "latency_sigma": args.latency_sigma,
+                "error_rate": args.error_rate,
+                "tokens_per_second": args.tokens_per_second,
+                "providers": args.providers
+            },
+            "rows": args.rows,
+            "requests_per_level": args.requests
+        },
+        "results": results
+    }
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenarios", default="categorize,analyze,chat,embed")
+    parser.add_argument("--concurrency", type=lambda v: [int(c) for c in v.split(",")], default=[1, 8, 32, 64])
+    parser.add_argument("--requests", type=int, default=200, help="requests per concurrency level")
+    parser.add_argument("--rows", type=int, default=500, help="transactions in analysis payloads")
+    parser.add_argument("--providers", default="openai", help="LLM_PROVIDER_ORDER for the service")
+    parser.add_argument("--latency-ms", type=float, default=400.0)
+    parser.add_argument("--latency-sigma", type=float, default=0.5)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--tokens-per-second", type=float, default=80.0)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--provider-port", type=int, default=9100)
+    parser.add_argument("--service-port", type=int, default=8101)
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--save-baseline", help="write results as the baseline to compare against")
+    parser.add_argument("--compare", help="baseline JSON to compare the results with")
+    parser.add_argument("--tolerance", type=float, default=0.15)
+    args = parser.parse_args(argv)
+
+    current = asyncio.run(benchmark(args))
+    output = json.dumps(current, indent=2)
+    print(output)
+
+    for path in filter(None, (args.output, args.save_baseline)):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w") as handle:
+            handle.write(output + "\n")
+
+    if args.compare:
+        with open(args.compare) as handle:
+            regressions = compare(current, json.load(handle), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
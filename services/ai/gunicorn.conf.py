@@ -0,0 +1,48 @@
+"""Production server: preforked uvicorn workers sharing models loaded once in the parent
+
+    gunicorn -c gunicorn.conf.py main:app
+"""
+
+import multiprocessing
+import os
+import shutil
+
+from app.config import settings
+from app.services import warmup
+
+
+bind = f"0.0.0.0:{settings.PORT}"
+workers = settings.SERVER_WORKERS or multiprocessing.cpu_count()
+worker_class = "uvicorn.workers.UvicornWorker"
+# Import the app in the parent; workers fork from it and share its pages copy-on-write
+preload_app = True
+# Workers warm up before serving, so allow for that before the heartbeat check
+timeout = settings.SERVER_WORKER_TIMEOUT
+graceful_timeout = int(settings.SHUTDOWN_DRAIN_TIMEOUT)
+
+# In-process token buckets would each grant a user the full limit
+if workers > 1 and settings.RATE_LIMIT_ENABLED and not settings.RATE_LIMIT_REDIS_ENABLED:
+    raise RuntimeError(
+        f"{workers} workers need shared rate limits: set RATE_LIMIT_REDIS_ENABLED=true or SERVER_WORKERS=1"
+    )
+
+# Set before the app imports prometheus_client, so every worker writes its
+# metrics to files that /metrics merges with a MultiProcessCollector
+os.environ["PROMETHEUS_MULTIPROC_DIR"] = settings.PROMETHEUS_MULTIPROC_DIR
+shutil.rmtree(settings.PROMETHEUS_MULTIPROC_DIR, ignore_errors=True)
+os.makedirs(settings.PROMETHEUS_MULTIPROC_DIR)
+
+
+def when_ready(server):
+    # Runs in the parent after the app is imported and before any worker forks
+    server.log.info(warmup.preload())
+
+
+def post_fork(server, worker):
+    warmup.mark_process_start()
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -3,17 +3,56 @@ AI Service for Budget Tracker
 FastAPI-based microservice for LLM integration and financial AI features
 """
 
+import os
+from contextlib import asynccontextmanager
+
 import uvicorn
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, generate_latest, multiprocess
 from app.config import settings
 from app.routes import ai_router, health_router
+from app.services.llm_clients import LLMClientPool
+from app.services.embedding_service import EmbeddingService
+from app.services.financial_analyzer import FinancialAnalyzer
+from app.services.job_queue import JobQueue
+from app.services.llm_service import LLMService
+from app.services.metrics import RequestLatencyMiddleware, ServiceCollector
+from app.services.warmup import warm_up
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Shared provider clients keep their connection pools across requests
+    app.state.llm_clients = LLMClientPool()
+    # One embedding service per process so concurrent requests share model batches
+    app.state.embedding_service = EmbeddingService()
+    # Long-running analysis is drained by a bounded worker pool in the background
+    analyzer = FinancialAnalyzer(LLMService(clients=app.state.llm_clients))
+    app.state.job_queue = JobQueue(analyzer.job_handlers())
+    await app.state.job_queue.start()
+    collector = ServiceCollector({
+        "llm_in_flight": lambda: app.state.llm_clients.in_flight,
+        "llm_concurrency_limit": lambda: app.state.llm_clients.concurrency.limit,
+        "job_queue_depth": lambda: app.state.job_queue.stats()["queued"],
+        "job_queue_workers": lambda: app.state.job_queue.stats()["workers"]
+    })
+    REGISTRY.register(collector)
+    app.state.metrics_collector = collector
+    # Serving starts only after this, so no request lands on a cold worker
+    await warm_up(app.state.embedding_service)
+    yield
+    REGISTRY.unregister(collector)
+    await app.state.job_queue.stop()
+    await app.state.llm_clients.aclose(drain_timeout=settings.SHUTDOWN_DRAIN_TIMEOUT)
+    await app.state.embedding_service.aclose()
 
 # Create FastAPI app
 app = FastAPI(
     title="Budget Tracker AI Service",
     description="LLM-powered financial insights and analysis",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS middleware
@@ -25,6 +64,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Plain ASGI rather than @app.middleware("http"), which would read the request
+# body behind the back of endpoints that stream their uploads
+app.add_middleware(RequestLatencyMiddleware)
+
 # Include routers
 app.include_router(health_router, prefix="/health", tags=["health"])
 app.include_router(ai_router, prefix="/api/v1/ai", tags=["ai"])
@@ -33,10 +76,22 @@ app.include_router(ai_router, prefix="/api/v1/ai", tags=["ai"])
 async def root():
     return {"message": "Budget Tracker AI Service", "version": "1.0.0"}
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
+    # Counters and histograms summed over every worker; service state is this worker's
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    registry.register(app.state.metrics_collector)
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+
+# Development server; production runs `gunicorn -c gunicorn.conf.py main:app`
 if __name__ == "__main__":
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
         port=settings.PORT,
-        reload=settings.ENVIRONMENT == "development"
+        reload=settings.ENVIRONMENT == "development",
+        timeout_graceful_shutdown=int(settings.SHUTDOWN_DRAIN_TIMEOUT)
     )
\ No newline at end of file
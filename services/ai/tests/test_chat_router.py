@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from app.services.chat_router import ChatQueryRouter
+from app.services.spending_analytics import SpendingAnalytics
+
+TODAY = np.datetime64("2024-06-15")
+
+
+def parse(message):
+    return ChatQueryRouter().parse(message, TODAY)
+
+
+@pytest.mark.parametrize("message", [
+    "What was my biggest expense last month?",
+    "What is my average spending per month?",
+    "What percentage of my income did I spend?",
+    "How much did I spend on food compared to last month?",
+    "What did I spend the most on this year?",
+    "How much more did I spend on food than on transport?",
+    "How much did I spend on food vs transport?",
+    "What was my spending by category?",
+    "How much did I spend per week on groceries?",
+    "What is my income to expense ratio?",
+    "How much did I spend each month?",
+    "When did I spend the least?",
+    "Should I spend less on food?",
+    "How much did I spend on that last month?",
+    "What did I spend there this week?",
+])
+def test_questions_beyond_one_total_go_to_the_llm(message):
+    assert parse(message) is None
+
+
+@pytest.mark.parametrize("message, metric, label", [
+    ("How much did I spend on food last month?", "expense", "in May 2024"),
+    ("How many transactions at Starbucks this week?", "count", "this week"),
+    ("What was my income in March?", "income", "in March 2024"),
+    ("How much did I earn so far this year?", "income", "in 2024"),
+    ("What was my net cash flow last month?", "net", "in May 2024"),
+    ("What's my balance?", "balance", "in total"),
+    ("Tell me how much I spent on groceries in the last 3 months", "expense", "in the last 3 months"),
+    ("How much did I spend at Trader Joe's last week?", "expense", "last week"),
+])
+def test_single_aggregate_questions_parse(message, metric, label):
+    intent = parse(message)
+    assert intent is not None
+    assert (intent.metric, intent.period.label) == (metric, label)
+
+
+def food_rows(category=None):
+    return [
+        {"description": "WHOLE FOODS MARKET #10", "amount": -60.0, "date": "2024-05-03", "category": category},
+        {"description": "CHIPOTLE 1234", "amount": -32.0, "date": "2024-05-10", "category": category},
+    ]
+
+
+def test_category_question_over_uncategorized_rows_goes_to_the_llm():
+    intent = parse("How much did I spend on food last month?")
+    assert ChatQueryRouter()._aggregate(intent, SpendingAnalytics(food_rows())) is None
+
+
+def test_category_question_over_categorized_rows_is_answered():
+    intent = parse("How much did I spend on food last month?")
+    answer = ChatQueryRouter()._aggregate(intent, SpendingAnalytics(food_rows("food")))
+    assert answer == "You spent $92.00 on food in May 2024, across 2 transactions."
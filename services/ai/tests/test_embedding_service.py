@@ -0,0 +1,47 @@
+import asyncio
+
+import numpy as np
+
+from app.config import settings
+from app.services.embedding_service import EmbeddingService
+
+
+class KeywordModel:
+    """Stands in for the sentence-transformers model: one dimension per known word"""
+
+    WORDS = ["coffee", "rent", "netflix"]
+
+    def encode(self, texts, **kwargs):
+        vectors = np.zeros((len(texts), settings.EMBEDDING_DIMENSION), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for column, word in enumerate(self.WORDS):
+                vectors[row, column] = word in text.lower()
+        vectors[:, -1] = 0.01
+        return vectors
+
+
+def service(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "VECTOR_INDEX_PATH", str(tmp_path))
+    embedding_service = EmbeddingService()
+    monkeypatch.setattr(embedding_service, "load_model", KeywordModel)
+    return embedding_service
+
+
+def test_search_before_start_opens_the_index(tmp_path, monkeypatch):
+    async def scenario():
+        writer = service(tmp_path, monkeypatch)
+        await writer.index_transactions("u1", [
+            {"description": "Blue Bottle Coffee", "amount": -4.5, "date": "2024-03-01"},
+            {"description": "Rent March", "amount": -1500.0, "date": "2024-03-01"},
+        ])
+        await writer.aclose()
+
+        reader = service(tmp_path, monkeypatch)
+        try:
+            return await reader.search("u1", "coffee", k=1), await reader.search("u2", "coffee")
+        finally:
+            await reader.aclose()
+
+    matches, other_user = asyncio.run(scenario())
+    assert [match["description"] for match in matches] == ["Blue Bottle Coffee"]
+    assert other_user == []
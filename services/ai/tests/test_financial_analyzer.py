@@ -0,0 +1,29 @@
+from app.services.financial_analyzer import FinancialAnalyzer
+from app.services.spending_analytics import SpendingAnalytics
+
+
+def recommendations(rows):
+    return FinancialAnalyzer(llm_service=object())._quick_recommendations(SpendingAnalytics(rows))
+
+
+def test_top_category_tip_skips_uncategorized_spending():
+    rows = [
+        {"description": "Card purchase", "amount": -900.0, "date": "2024-01-05"},
+        {"description": "Grocer", "amount": -400.0, "date": "2024-01-06", "category": "food"},
+        {"description": "Bus", "amount": -100.0, "date": "2024-01-07", "category": "transport"},
+    ]
+    assert not any("Uncategorized" in tip for tip in recommendations(rows))
+
+
+def test_top_category_tip_names_the_largest_real_category():
+    rows = [
+        {"description": "Card purchase", "amount": -100.0, "date": "2024-01-05"},
+        {"description": "Grocer", "amount": -600.0, "date": "2024-01-06", "category": "food"},
+        {"description": "Corner shop", "amount": -300.0, "date": "2024-01-07", "category": "other_expense"},
+    ]
+    assert "Food is 60% of spending; review it first for savings." in recommendations(rows)
+
+
+def test_no_top_category_tip_when_nothing_is_categorized():
+    rows = [{"description": "Card purchase", "amount": -500.0, "date": "2024-01-05"}]
+    assert not any("of spending" in tip for tip in recommendations(rows))
@@ -0,0 +1,64 @@
+import datetime
+
+from app.services.financial_analyzer import FinancialAnalyzer
+from app.services.goal_projection import GoalProjector
+
+TODAY = datetime.date(2024, 1, 31)
+
+
+def projector():
+    return GoalProjector(simulations=500, horizon_months=24, seed=7, cache_size=16)
+
+
+def test_steady_saver_reaches_the_goal_on_schedule():
+    goal = {"name": "Trip", "target_amount": 1000, "current_amount": 400}
+    [result] = projector().project([100.0] * 6, [goal], TODAY)
+    projection = result["projection"]
+    assert result["name"] == "Trip"
+    assert projection["probability"] == 1.0
+    # 600 left at 100 a month; the end of January clamps to the end of July
+    assert projection["p50"] == {"months": 6, "date": "2024-07-31"}
+    assert projection["p10"] == projection["p90"] == projection["p50"]
+
+
+def test_goals_split_the_monthly_net_and_met_goals_take_no_share():
+    goals = [
+        {"target_amount": 600, "current_amount": 0},
+        {"target_amount": 600, "current_amount": 0},
+        {"target_amount": 100, "current_amount": 100},
+    ]
+    first, second, met = projector().project([100.0] * 6, goals, TODAY)
+    assert first["projection"]["p50"]["months"] == second["projection"]["p50"]["months"] == 12
+    assert met["projection"]["p50"]["months"] == 0
+
+
+def test_negative_cash_flow_never_reaches_the_goal():
+    [result] = projector().project([-50.0, -20.0], [{"target_amount": 500}], TODAY)
+    assert result["projection"]["probability"] == 0.0
+    assert result["projection"]["p50"] is None
+
+
+def test_results_do_not_depend_on_batching_and_are_cached():
+    users = [([120.0, -30.0, 80.0], [{"target_amount": 900}]), ([50.0, 60.0], [{"target_amount": 300}])]
+    batched = projector().project_many(users, TODAY)
+    single = projector()
+    assert [single.project(*user, today=TODAY) for user in users] == batched
+    single.project(*users[0], today=TODAY)
+    assert single.stats()["hits"] == 1
+
+
+def test_without_history_goals_come_back_unprojected():
+    assert projector().project([], [{"target_amount": 100}], TODAY) == [{"target_amount": 100, "projection": None}]
+
+
+def test_chat_context_skips_goals_with_non_numeric_amounts():
+    context = {
+        "recent_transactions": [
+            {"description": "Payroll", "amount": 3000.0, "date": "2024-01-01", "category": "salary"},
+            {"description": "Rent", "amount": -1500.0, "date": "2024-01-02", "category": "housing"},
+        ],
+        "financial_goals": [{"name": "Bad", "target_amount": "lots"}, {"name": "Car", "target_amount": 5000}],
+    }
+    bad, car = FinancialAnalyzer(llm_service=object()).with_goal_projections(context)["financial_goals"]
+    assert bad == {"name": "Bad", "target_amount": "lots"}
+    assert car["projection"] is not None
@@ -0,0 +1,43 @@
+import asyncio
+
+from app.services.insights_store import InsightsStore
+
+
+def coffee(**fields):
+    return {"description": "Blue Bottle Coffee", "amount": -4.5, "date": "2024-03-01", "category": "food", **fields}
+
+
+def months(store, user_id):
+    return store._load(user_id)["aggregates"]["months"]
+
+
+def test_same_day_repeats_with_their_own_ids_both_count(tmp_path):
+    store = InsightsStore(str(tmp_path / "insights.db"))
+    asyncio.run(store.add_transactions("u1", [coffee(id="t1"), coffee(id="t2")]))
+    assert months(store, "u1")["2024-03"]["count"] == 2
+    assert months(store, "u1")["2024-03"]["categories"]["food"] == 9.0
+
+
+def test_resent_rows_are_folded_in_once(tmp_path):
+    store = InsightsStore(str(tmp_path / "insights.db"))
+    asyncio.run(store.add_transactions("u1", [coffee(id="t1"), coffee()]))
+    asyncio.run(store.add_transactions("u1", [coffee(id="t1"), coffee(), coffee(id="t3")]))
+    assert months(store, "u1")["2024-03"]["count"] == 3
+
+
+def test_failed_narrative_keeps_the_previous_one(tmp_path):
+    class FlakyLLM:
+        def __init__(self):
+            self.calls = 0
+
+        async def generate_financial_insights(self, *args, **kwargs):
+            self.calls += 1
+            if self.calls == 1:
+                return [{"type": "error", "title": "Insights unavailable"}]
+            return [{"type": "narrative", "title": "Spending is steady"}]
+
+    store, llm = InsightsStore(str(tmp_path / "insights.db")), FlakyLLM()
+    failed = asyncio.run(store.add_transactions("u1", [coffee(id="t1")], llm))
+    assert all(insight["type"] != "error" for insight in failed["insights"])
+    recovered = asyncio.run(store.add_transactions("u1", [coffee(id="t2")], llm))
+    assert {"type": "narrative", "title": "Spending is steady"} in recovered["insights"]
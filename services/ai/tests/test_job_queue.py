@@ -0,0 +1,77 @@
+import asyncio
+import time
+
+from app.config import settings
+from app.services.job_queue import JobQueue, QUEUED, RUNNING, SUCCEEDED
+
+
+def test_identical_submissions_share_a_job(tmp_path):
+    async def scenario():
+        queue = JobQueue({"analyze": _echo}, path=str(tmp_path / "jobs.db"), concurrency=1)
+        first = await queue.submit("analyze", "u1", {"period": "last_30_days"})
+        second = await queue.submit("analyze", "u1", {"period": "last_30_days"})
+        other = await queue.submit("analyze", "u1", {"period": "last_90_days"})
+        return first, second, other
+
+    first, second, other = asyncio.run(scenario())
+    assert second["job_id"] == first["job_id"] and second["deduplicated"]
+    assert other["job_id"] != first["job_id"] and not other["deduplicated"]
+
+
+def test_stopping_mid_job_requeues_it_for_the_next_start(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    started = asyncio.Event()
+
+    async def hang(payload):
+        started.set()
+        await asyncio.sleep(3600)
+
+    async def interrupted():
+        queue = JobQueue({"analyze": hang}, path=path, concurrency=1)
+        await queue.start()
+        job = await queue.submit("analyze", "u1", {"n": 1})
+        await started.wait()
+        await queue.stop()
+        return job["job_id"], (await queue.get(job["job_id"]))["status"]
+
+    async def restarted(job_id):
+        queue = JobQueue({"analyze": _echo}, path=path, concurrency=1)
+        await queue.start()
+        resubmitted = await queue.submit("analyze", "u1", {"n": 1})
+        await queue._queue.join()
+        await queue.stop()
+        return resubmitted, await queue.get(job_id)
+
+    job_id, status = asyncio.run(interrupted())
+    assert status == QUEUED
+    resubmitted, job = asyncio.run(restarted(job_id))
+    assert resubmitted["job_id"] == job_id
+    assert job["status"] == SUCCEEDED and job["result"] == {"n": 1}
+
+
+def test_expired_lease_is_not_reused_and_is_reclaimed(tmp_path):
+    queue = JobQueue({"analyze": _echo}, path=str(tmp_path / "jobs.db"), concurrency=1)
+    job = asyncio.run(queue.submit("analyze", "u1", {"n": 1}))
+    queue._claim(job["job_id"])
+    queue._connection.execute(
+        "UPDATE jobs SET started_at = ? WHERE id = ?",
+        (time.time() - settings.JOB_LEASE_SECONDS - 1, job["job_id"])
+    )
+
+    fresh = asyncio.run(queue.submit("analyze", "u1", {"n": 1}))
+    assert fresh["job_id"] != job["job_id"]
+    assert queue._expired() == [(job["job_id"], "interactive")]
+    assert queue._read(job["job_id"])["status"] == QUEUED
+    assert queue._expired() == []
+
+
+def test_running_job_within_its_lease_is_reused(tmp_path):
+    queue = JobQueue({"analyze": _echo}, path=str(tmp_path / "jobs.db"), concurrency=1)
+    job = asyncio.run(queue.submit("analyze", "u1", {"n": 1}))
+    queue._claim(job["job_id"])
+    again = asyncio.run(queue.submit("analyze", "u1", {"n": 1}))
+    assert again["job_id"] == job["job_id"] and again["status"] == RUNNING
+
+
+async def _echo(payload):
+    return payload
@@ -0,0 +1,48 @@
+import asyncio
+
+from app.services.llm_cache import LLMCache
+
+
+def test_key_changes_with_every_input_that_shapes_a_completion():
+    base = ("openai", "gpt-4", 0.3, 500, "Categorize: COFFEE")
+    key = LLMCache.make_key(*base)
+    assert LLMCache.make_key(*base) == key
+    for position, changed in enumerate(["anthropic", "gpt-4o", 0.7, 501, "Categorize: coffee"]):
+        variant = list(base)
+        variant[position] = changed
+        assert LLMCache.make_key(*variant) != key
+
+
+def test_key_does_not_collide_when_fields_run_together():
+    assert LLMCache.make_key("openai", "gpt-4", 0.3, 50, "0 tokens") != LLMCache.make_key(
+        "openai", "gpt-4", 0.3, 500, " tokens"
+    )
+
+
+def test_lru_keeps_recent_entries_and_counts_evictions():
+    cache = LLMCache(max_entries=2, ttl_seconds=60)
+
+    async def scenario():
+        await cache.set("a", "1")
+        await cache.set("b", "2")
+        assert await cache.get("a") == "1"
+        await cache.set("c", "3")
+        return [await cache.get(key) for key in ("a", "b", "c")]
+
+    assert asyncio.run(scenario()) == ["1", None, "3"]
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"], stats["size"]) == (3, 1, 1, 2)
+
+
+def test_expired_entries_miss(monkeypatch):
+    cache = LLMCache(max_entries=10, ttl_seconds=60)
+    clock = [1000.0]
+    monkeypatch.setattr("app.services.llm_cache.time.monotonic", lambda: clock[0])
+
+    async def scenario():
+        await cache.set("a", "1")
+        clock[0] += 61
+        return await cache.get("a")
+
+    assert asyncio.run(scenario()) is None
+    assert cache.stats()["expirations"] == 1
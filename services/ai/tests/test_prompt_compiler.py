@@ -0,0 +1,47 @@
+import math
+import sys
+import types
+
+import pytest
+
+from app.prompts import prompt_compiler as compiler_module
+from app.prompts.prompt_compiler import HEURISTIC_BUDGET_SHARE, PromptCompiler, count_tokens
+
+
+@pytest.fixture
+def offline_tokenizer(monkeypatch):
+    """tiktoken installed but unable to download its BPE file"""
+    def unreachable(*args, **kwargs):
+        raise ConnectionError("no network")
+
+    tiktoken = types.SimpleNamespace(encoding_for_model=unreachable, get_encoding=unreachable)
+    monkeypatch.setitem(sys.modules, "tiktoken", tiktoken)
+    compiler_module._get_encoding.cache_clear()
+    yield
+    compiler_module._get_encoding.cache_clear()
+
+
+def test_unloadable_encoding_falls_back_to_the_estimate(offline_tokenizer):
+    assert count_tokens("x" * 10) == math.ceil(10 / 4)
+
+
+def test_register_does_not_count_tokens(monkeypatch):
+    calls = []
+    monkeypatch.setattr(compiler_module, "count_tokens", lambda text: calls.append(text) or 1)
+    compiler = PromptCompiler(budget=100)
+    compiler.register("test", "Static prefix")
+    assert calls == []
+
+    compiler.compile("test", [lambda: "body"])
+    assert calls == ["Static prefix", "body"]
+
+
+def test_compile_falls_back_to_compact_bodies_within_the_estimated_budget(offline_tokenizer):
+    compiler = PromptCompiler(budget=100)
+    compiler.register("test", "p" * 40)
+    available = int(100 * HEURISTIC_BUDGET_SHARE) - 10
+    full, compact = "f" * (available * 4 + 4), "c" * 8
+
+    prompt = compiler.compile("test", [lambda: full, lambda: compact])
+    assert prompt.user == compact and prompt.compressed
+    assert prompt.input_tokens == 10 + 2
@@ -0,0 +1,134 @@
+import asyncio
+
+import pytest
+
+from app.config import settings
+from app.services.provider_router import CircuitBreaker, ProviderRouter, ProviderUnavailableError
+
+
+def _breaker(**overrides):
+    options = dict(
+        window_size=10, min_calls=4, error_rate_threshold=0.5,
+        p95_latency_threshold=5.0, cooldown_seconds=30.0
+    )
+    options.update(overrides)
+    return CircuitBreaker(**options)
+
+
+def _ok(text):
+    async def call():
+        return text
+    return call
+
+
+def _failing():
+    async def call():
+        raise ConnectionError("provider down")
+    return call
+
+
+def test_breaker_opens_on_error_rate_and_admits_one_probe_after_cooldown(monkeypatch):
+    clock = [0.0]
+    monkeypatch.setattr("app.services.provider_router.time.monotonic", lambda: clock[0])
+    breaker = _breaker()
+    for success in (True, False, False, False):
+        breaker.record(success, 0.1)
+    assert breaker.state == CircuitBreaker.OPEN and not breaker.allow()
+
+    clock[0] += 31
+    assert breaker.allow() and breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()
+    breaker.record(True, 0.1)
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.snapshot()["window_calls"] == 0
+
+
+def test_breaker_opens_on_tail_latency_and_a_failed_probe_reopens_it(monkeypatch):
+    clock = [0.0]
+    monkeypatch.setattr("app.services.provider_router.time.monotonic", lambda: clock[0])
+    breaker = _breaker()
+    for latency in (1.0, 1.0, 1.0, 9.0):
+        breaker.record(True, latency)
+    assert breaker.state == CircuitBreaker.OPEN
+
+    clock[0] += 31
+    assert breaker.allow()
+    breaker.record(False, 0.1)
+    assert breaker.state == CircuitBreaker.OPEN and not breaker.is_available()
+
+
+def test_call_fails_over_to_the_next_provider(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_HEDGING_ENABLED", False)
+    router = ProviderRouter(["openai", "anthropic"])
+    result = asyncio.run(router.call({"openai": _failing(), "anthropic": _ok("from anthropic")}))
+    assert result == "from anthropic"
+    assert router.decisions["failover"] == 1
+    assert router.breakers["openai"].error_rate() == 1.0
+
+
+def test_call_skips_an_open_breaker_and_rejects_when_all_are_open(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_HEDGING_ENABLED", False)
+    router = ProviderRouter(["openai", "anthropic"])
+    router.breakers["openai"]._trip()
+    providers = {"openai": _ok("from openai"), "anthropic": _ok("from anthropic")}
+    assert asyncio.run(router.call(providers)) == "from anthropic"
+    assert router.select(list(providers)) == "anthropic"
+
+    router.breakers["anthropic"]._trip()
+    with pytest.raises(ProviderUnavailableError):
+        asyncio.run(router.call(providers))
+    assert router.decisions["rejected"] == 1
+
+
+def test_a_provider_past_the_deadline_counts_as_failed(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_HEDGING_ENABLED", False)
+    monkeypatch.setattr(settings, "LLM_CALL_DEADLINE", 0.01)
+    router = ProviderRouter(["openai", "anthropic"])
+
+    async def slow():
+        await asyncio.sleep(1)
+        return "too late"
+
+    assert asyncio.run(router.call({"openai": slow, "anthropic": _ok("on time")})) == "on time"
+    assert router.breakers["openai"].snapshot()["error_rate"] == 1.0
+
+
+def test_hedged_call_returns_the_faster_provider(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_HEDGING_ENABLED", True)
+    monkeypatch.setattr(settings, "LLM_HEDGE_MIN_DELAY", 0.01)
+    router = ProviderRouter(["openai", "anthropic"])
+
+    async def slow():
+        await asyncio.sleep(1)
+        return "from openai"
+
+    result = asyncio.run(router.call({"openai": slow, "anthropic": _ok("from anthropic")}))
+    assert result == "from anthropic"
+    assert router.decisions["hedge_secondary_won"] == 1
+    # The losing request was cancelled, which says nothing about the provider
+    assert router.breakers["openai"].snapshot()["window_calls"] == 0
+
+
+def test_stream_fails_over_before_the_first_chunk_only(monkeypatch):
+    router = ProviderRouter(["openai", "anthropic"])
+
+    async def broken():
+        raise ConnectionError("provider down")
+        yield
+
+    async def chunks(*parts):
+        for part in parts:
+            yield part
+
+    async def read(providers):
+        return [pair async for pair in router.stream(providers)]
+
+    pairs = asyncio.run(read({"openai": broken, "anthropic": lambda: chunks("a", "b")}))
+    assert pairs == [("anthropic", "a"), ("anthropic", "b")]
+    assert router.decisions["failover"] == 1
+
+    async def cut_off():
+        yield "partial"
+        raise ConnectionError("dropped")
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(read({"openai": cut_off, "anthropic": lambda: chunks("never")}))
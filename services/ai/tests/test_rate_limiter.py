@@ -0,0 +1,34 @@
+import asyncio
+
+import pytest
+
+from app.services.rate_limiter import RateLimitExceeded, TokenBucketLimiter
+
+
+def test_burst_is_admitted_then_callers_queue_or_are_rejected():
+    limiter = TokenBucketLimiter(rate_per_second=100.0, burst=2)
+
+    async def scenario():
+        await limiter.acquire("u1")
+        await limiter.acquire("u1")
+        # The next token is 10ms away, within the wait allowed
+        await limiter.acquire("u1", max_wait=0.05)
+        with pytest.raises(RateLimitExceeded) as rejected:
+            await limiter.acquire("u1", max_wait=0.0)
+        return rejected.value.retry_after
+
+    retry_after = asyncio.run(scenario())
+    assert 0 < retry_after <= 0.02
+    assert (limiter.counters["admitted"], limiter.counters["queued"], limiter.counters["rejected"]) == (3, 1, 1)
+
+
+def test_prune_keeps_buckets_still_paying_off_reservations():
+    limiter = TokenBucketLimiter(rate_per_second=1.0, burst=10)
+    limiter._buckets = {
+        "refilled": (0.0, 0.0),
+        "reserved": (-20.0, 0.0),
+        "recent": (10.0, 9.0),
+    }
+    # 15 seconds on: the first has refilled, the second is at -5 and the third is full again
+    limiter._prune(15.0)
+    assert set(limiter._buckets) == {"reserved"}
@@ -0,0 +1,134 @@
+import asyncio
+
+import pytest
+
+from app.config import settings
+from app.services.statement_import import (
+    CSVStatementParser, OFXStatementParser, StatementParseError, categorize_statement,
+    create_parser, parse_amount
+)
+
+
+CSV = (
+    'Date;Payee;Debit;Credit;Reference\r\n'
+    '2024-03-01;"ACME ; PAYROLL";;2,500.00;r1\r\n'
+    '2024-03-02;"Corner ""Cafe""\nDowntown";4.50;;r2\r\n'
+    '2024-03-03;;9.99;;r3\r\n'
+    '2024-03-04;RENT;(1200.00);;\r\n'
+)
+
+OFX = """OFXHEADER:100
+DATA:OFXSGML
+
+<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>
+<STMTTRN>
+<TRNTYPE>DEBIT
+<DTPOSTED>20240305120000[-5:EST]
+<TRNAMT>-42.10
+<FITID>f1
+<NAME>GROCER &amp; SONS
+</STMTTRN>
+<STMTTRN>
+<TRNTYPE>CREDIT
+<DTPOSTED>20240306
+<TRNAMT>100.00
+<FITID>f2
+<MEMO>Refund
+</STMTTRN>
+<STMTTRN>
+<TRNAMT>oops
+<NAME>Broken
+</STMTTRN>
+</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>
+"""
+
+
+def _parse(parser, text, size):
+    rows = []
+    for start in range(0, len(text), size):
+        rows.extend(parser.feed(text[start:start + size]))
+    return rows + parser.close()
+
+
+@pytest.mark.parametrize("size", [1, 7, len(CSV)])
+def test_csv_rows_survive_any_chunking(size):
+    parser = CSVStatementParser(max_record_chars=1000)
+    rows = _parse(parser, CSV, size)
+    assert rows == [
+        {"description": "ACME ; PAYROLL", "amount": 2500.0, "date": "2024-03-01", "category": None, "id": "r1"},
+        {"description": 'Corner "Cafe"\nDowntown', "amount": -4.5, "date": "2024-03-02", "category": None, "id": "r2"},
+        {"description": "RENT", "amount": -1200.0, "date": "2024-03-04", "category": None}
+    ]
+    assert parser.skipped == 1
+
+
+def test_csv_rejects_unusable_headers_and_runaway_records():
+    with pytest.raises(StatementParseError):
+        _parse(CSVStatementParser(1000), "when,what\n2024-01-01,x\n", 100)
+    with pytest.raises(StatementParseError):
+        CSVStatementParser(10).feed('date,description,amount\n2024-01-01,"never closed')
+    with pytest.raises(StatementParseError):
+        _parse(CSVStatementParser(1000), 'date,description,amount\n2024-01-01,"open,1\n', 100)
+
+
+@pytest.mark.parametrize("size", [1, 13, len(OFX)])
+def test_ofx_transactions_survive_any_chunking(size):
+    parser = OFXStatementParser(max_record_chars=1000)
+    rows = _parse(parser, OFX, size)
+    assert rows == [
+        {"description": "GROCER & SONS", "amount": -42.1, "date": "2024-03-05", "category": None, "id": "f1"},
+        {"description": "Refund", "amount": 100.0, "date": "2024-03-06", "category": None, "id": "f2"}
+    ]
+    assert parser.skipped == 1
+
+
+def test_ofx_rejects_truncated_and_foreign_uploads():
+    with pytest.raises(StatementParseError):
+        _parse(OFXStatementParser(1000), OFX[:OFX.index("</STMTTRN>")], 100)
+    with pytest.raises(StatementParseError):
+        _parse(OFXStatementParser(1000), "date,description,amount\n", 100)
+
+
+def test_amounts_and_format_detection():
+    assert parse_amount("$1,234.56") == 1234.56
+    assert parse_amount("(12.00)") == -12.0
+    assert parse_amount("") is None and parse_amount("n/a") is None
+    assert isinstance(create_parser(None, None, b"\xef\xbb\xbfOFXHEADER:100"), OFXStatementParser)
+    assert isinstance(create_parser(None, "text/csv; charset=utf-8", b"OFXHEADER"), CSVStatementParser)
+    assert isinstance(create_parser("ofx", "text/csv", b""), OFXStatementParser)
+    with pytest.raises(StatementParseError):
+        create_parser("qif", None, b"")
+
+
+class _FakeLLMService:
+    def __init__(self):
+        self.batches = []
+
+    async def stream_categorizations(self, rows, user_id=None):
+        self.batches.append(len(rows))
+        for index in reversed(range(len(rows))):
+            yield index, {"category": "other", "confidence": 0.5}
+
+
+def test_categorize_statement_numbers_rows_across_chunks(monkeypatch):
+    monkeypatch.setattr(settings, "IMPORT_CHUNK_ROWS", 2)
+    service = _FakeLLMService()
+    admitted = []
+
+    async def upload():
+        data = CSV.encode("utf-8")
+        for start in range(0, len(data), 5):
+            yield data[start:start + 5]
+
+    async def admit(count):
+        admitted.append(count)
+
+    async def scenario():
+        parser = CSVStatementParser(1000)
+        return [event async for event in categorize_statement(upload(), parser, service, admit=admit)]
+
+    events = asyncio.run(scenario())
+    assert events[-1] == {"done": True, "rows": 3, "skipped": 1}
+    assert sorted(event["index"] for event in events[:-1]) == [0, 1, 2]
+    assert {event["index"]: event["description"] for event in events[:-1]}[2] == "RENT"
+    assert service.batches == admitted == [2, 1]
@@ -0,0 +1,27 @@
+import asyncio
+
+from app.services.transaction_categorizer import TIER_RULES, TransactionCategorizer
+
+
+def categorize(*transactions):
+    return asyncio.run(TransactionCategorizer(confidence_threshold=0.8).categorize(list(transactions)))
+
+
+def test_merchant_rule_labels_a_matching_expense():
+    [result] = categorize({"description": "AMAZON MKTPLACE PMTS", "amount": -45.0})
+    assert (result["category"], result["tier"]) == ("shopping", TIER_RULES)
+
+
+def test_credit_from_an_expense_merchant_falls_through():
+    assert categorize({"description": "AMAZON REFUND", "amount": 45.0}) == [None]
+
+
+def test_debit_matching_an_income_rule_falls_through():
+    assert categorize({"description": "PAYROLL CORRECTION", "amount": -120.0}) == [None]
+
+
+def test_explicit_type_wins_over_the_sign():
+    [result] = categorize({"description": "STARBUCKS 1234", "amount": 5.5, "type": "expense"})
+    assert result["category"] == "food"
+    [result] = categorize({"description": "ACME PAYROLL", "amount": 2500.0})
+    assert result["category"] == "salary"
@@ -0,0 +1,50 @@
+from app.services.transaction_index import TransactionIndex
+
+
+def coffee(date, **fields):
+    return {"description": "BLUE BOTTLE COFFEE #12", "amount": -4.5, "date": date, "account_id": "chk", **fields}
+
+
+def test_repeat_purchases_survive():
+    rows = [coffee(f"2024-03-0{day}") for day in range(1, 6)]
+    kept, dropped = TransactionIndex().deduplicate(rows)
+    assert kept == rows
+    assert dropped == 0
+
+
+def test_same_day_repeats_with_their_own_ids_survive():
+    rows = [coffee("2024-03-01", id="a"), coffee("2024-03-01", id="b")]
+    assert TransactionIndex().deduplicate(rows) == (rows, 0)
+
+
+def test_repeated_id_is_a_duplicate():
+    rows = [coffee("2024-03-01", id="a"), coffee("2024-03-02", id="a")]
+    assert TransactionIndex().deduplicate(rows) == (rows[:1], 1)
+
+
+def test_identical_row_without_id_is_a_duplicate():
+    rows = [coffee("2024-03-01"), coffee("2024-03-01")]
+    assert TransactionIndex().deduplicate(rows) == (rows[:1], 1)
+
+
+def test_pending_row_pairs_with_its_posted_copy():
+    pending = coffee("2024-03-01", id="p1", pending=True)
+    posted = coffee("2024-03-03", id="t1")
+    later = coffee("2024-03-04", id="t2")
+    kept, dropped = TransactionIndex().deduplicate([pending, posted, later])
+    assert kept == [posted, later]
+    assert dropped == 1
+
+
+def test_pending_row_does_not_pair_with_an_earlier_posting():
+    rows = [coffee("2024-03-01", id="t1"), coffee("2024-03-02", id="p1", pending=True)]
+    assert TransactionIndex().deduplicate(rows) == (rows, 0)
+
+
+def test_recurring_series_is_detected():
+    index = TransactionIndex()
+    index.deduplicate([
+        {"description": "NETFLIX.COM", "amount": -15.49, "date": f"2024-0{month}-05"}
+        for month in range(1, 6)
+    ])
+    assert [series["frequency"] for series in index.recurring()] == ["monthly"]
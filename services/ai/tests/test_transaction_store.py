@@ -0,0 +1,30 @@
+from app.services.transaction_store import TransactionStore
+
+
+def coffee(date, **fields):
+    return {"description": "BLUE BOTTLE COFFEE #12", "amount": -4.5, "date": date, "account_id": "chk", **fields}
+
+
+def test_sync_keeps_repeat_purchases_and_drops_known_ids(tmp_path):
+    store = TransactionStore(str(tmp_path))
+    first = store.append("u1", [coffee(f"2024-03-0{day}", id=f"t{day}") for day in range(1, 4)], None, "w1")
+    assert (first["appended"], first["duplicates"]) == (3, 0)
+
+    second = store.append(
+        "u1",
+        [coffee("2024-03-03", id="t3"), coffee("2024-03-04", id="t4"), coffee("2024-03-04", id="t4"),
+         coffee("2024-03-05"), coffee("2024-03-05"), coffee("2024-03-06", id="p1", pending=True)],
+        "w1",
+        "w2"
+    )
+    assert (second["appended"], second["duplicates"], second["pending"]) == (3, 2, 1)
+    assert len(store.read("u1")) == 6
+
+
+def test_ids_survive_compaction(tmp_path):
+    store = TransactionStore(str(tmp_path), max_segments=1)
+    store.append("u1", [coffee("2024-03-01", id="t1")], None, "w1")
+    store.append("u1", [coffee("2024-03-02", id="t2")], "w1", "w2")
+    assert store.state("u1")["segments"] == 1
+    assert store.append("u1", [coffee("2024-03-01", id="t1")], "w2", "w3")["appended"] == 0
+    assert sorted(store.read("u1").ids) == ["t1", "t2"]
@@ -0,0 +1,26 @@
+import numpy as np
+
+from app.services.vector_index import VectorIndex
+
+
+def test_instances_sharing_a_path_see_each_others_writes(tmp_path):
+    # Two instances over one directory stand in for two worker processes
+    first = VectorIndex(str(tmp_path), dimension=4, initial_capacity=2)
+    second = VectorIndex(str(tmp_path), dimension=4, initial_capacity=2)
+    rng = np.random.default_rng(0)
+
+    first.upsert(["a", "b"], rng.random((2, 4)), [{"n": 1}, {"n": 2}], "u1")
+    second.upsert(["c", "d", "e"], rng.random((3, 4)), [{"n": 3}, {"n": 4}, {"n": 5}], "u1")
+    first.upsert(["f"], rng.random((1, 4)), [{"n": 6}], "u2")
+
+    assert sorted(hit["n"] for hit in second.search(np.ones(4), k=10, owner="u1")) == [1, 2, 3, 4, 5]
+    assert [hit["n"] for hit in second.search(np.ones(4), k=10, owner="u2")] == [6]
+    assert VectorIndex(str(tmp_path), dimension=4).count == 6
+
+
+def test_upsert_overwrites_an_existing_id(tmp_path):
+    index = VectorIndex(str(tmp_path), dimension=2)
+    index.upsert(["a"], np.array([[1.0, 0.0]]), [{"v": 1}], "u1")
+    index.upsert(["a"], np.array([[0.0, 1.0]]), [{"v": 2}], "u1")
+    assert index.count == 1
+    assert index.search(np.array([0.0, 1.0]), k=1) == [{"v": 2, "score": 1.0}]